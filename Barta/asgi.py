@@ -2,6 +2,9 @@
 ASGI config for Barta project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the live event stream are answered by core.sse directly so
+long-lived connections never occupy a Django worker thread; everything else
+goes to the regular Django application.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +16,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Barta.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.urls import reverse  # noqa: E402  (needs the app registry loaded above)
+
+from core.sse import event_stream_app  # noqa: E402
+
+EVENT_STREAM_PATH = reverse('event_stream')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENT_STREAM_PATH:
+        return await event_stream_app(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -141,11 +141,86 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored once per distinct content and hard-linked under their names
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+MEDIA_BLOB_DIR = 'blobs'
+
+# Media serving: None streams from Django; 'x-accel-redirect' (nginx) or 'x-sendfile'
+# hands the transfer to the front proxy. The /media/ route is only mounted with
+# SERVE_MEDIA; message attachments are then checked against the conversation
+SERVE_MEDIA = DEBUG
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 7 * 24 * 3600
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Home feed
+# Posts by authors with more accepted followers than this are pulled at read time
+# instead of being fanned out to every follower's timeline (see classify_fanout).
+FEED_FANOUT_THRESHOLD = 10000
+TIMELINE_BACKFILL_LIMIT = 100
+FEED_PAGE_SIZE = 10
+
+# Comment threads on post_detail
+COMMENT_PAGE_SIZE = 20
+REPLY_PREVIEW_SIZE = 3
+REPLY_PAGE_SIZE = 20
+
+# Inbox
+INBOX_PAGE_SIZE = 20
+MESSAGE_PAGE_SIZE = 30
+
+# Reaction write buffer
+# When enabled, like/react clicks are merged in memory, journaled to a per-process
+# write-ahead file under REACTION_BUFFER_WAL_DIR and written to PostLike in batches.
+REACTION_BUFFER_ENABLED = False
+REACTION_BUFFER_INTERVAL = 0.5
+REACTION_BUFFER_MAX_PENDING = 1000
+REACTION_BUFFER_WAL_DIR = BASE_DIR / 'var' / 'reactions'
+
+# Notifications
+# Likes, comments and follows fold into one unread row per target (or per recipient
+# for follows) for this many seconds, e.g. "alice and 41 others liked your post".
+# 0 disables coalescing.
+NOTIFICATION_COALESCE_WINDOW = 24 * 60 * 60
+NOTIFICATION_RECENT_ACTORS = 3
+
+# Transactional outbox (drained by `manage.py process_outbox`)
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_WORKER_THREADS = 4
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_LEASE_SECONDS = 60
+
+# Live events (Server-Sent Events at /events/stream/, served by Barta.asgi)
+# EVENT_BROKER may point at a Broker subclass that relays events between workers.
+EVENT_BROKER = 'core.events.LocalBroker'
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MS = 3000
+SSE_FALLBACK_RETRY_MS = 30000
+
+# People search (find_friend)
+# Candidates are narrowed through the trigram index, then ranked with precomputed
+# social features; `manage.py refresh_search_features` ages old posts out daily.
+PEOPLE_SEARCH_CANDIDATES = 200
+PEOPLE_SEARCH_MIN_OVERLAP = 0.3
+SEARCH_RECENT_DAYS = 30
+SEARCH_FULL_ACTIVITY_POSTS = 20
+SEARCH_FEATURES_MAX_AGE = 24 * 3600
+# Typeahead (/find-friends/suggest) answers from an in-memory trie rebuilt in the background
+PEOPLE_SUGGEST_LIMIT = 8
+PEOPLE_SUGGEST_REBUILD_SECONDS = 300
+PEOPLE_SUGGEST_MAX_PREFIX = 32
+
+# Post search (/search/)
+# Posts are mirrored into the core_post_fts FTS5 table; `manage.py rebuild_post_index` refills it.
+POST_SEARCH_PAGE_SIZE = 10
+POST_SEARCH_SNIPPET_WORDS = 16
+POST_SEARCH_TITLE_WEIGHT = 2.0
+
 # Authentication URLs
 LOGIN_URL = 'signin'
 LOGIN_REDIRECT_URL = 'home'
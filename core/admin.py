@@ -1,13 +1,19 @@
 from django.contrib import admin
-from .models import Owner, Post, PostLike, PostComment, UserFollow, Notification, Message
+from django.db.models import Q
+from .conversations import set_read_watermark, unread_messages, with_read_watermarks
+from .counters import reconcile_owner_counters
+from .models import Owner, Post, PostLike, PostComment, UserFollow, Notification, Message, OutboxEvent
 
 
 @admin.register(Owner)
 class OwnerAdmin(admin.ModelAdmin):
-    list_display = ('user', 'is_verified', 'is_private', 'created_at')
-    list_filter = ('is_verified', 'is_private', 'created_at')
+    list_display = ('user', 'is_verified', 'is_private', 'follower_count', 'post_count', 'created_at')
+    list_filter = ('is_verified', 'is_private', 'is_high_fanout', 'created_at')
     search_fields = ('user__username', 'user__email', 'bio', 'location')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'follower_count', 'following_count', 'post_count',
+        'unread_message_count', 'unread_notification_count', 'created_at', 'updated_at'
+    )
     fieldsets = (
         ('User Information', {
             'fields': ('user', 'bio', 'location', 'website', 'phone_number', 'date_of_birth')
@@ -16,7 +22,10 @@ class OwnerAdmin(admin.ModelAdmin):
             'fields': ('profile_picture', 'cover_photo')
         }),
         ('Settings', {
-            'fields': ('is_verified', 'is_private')
+            'fields': ('is_verified', 'is_private', 'is_high_fanout')
+        }),
+        ('Statistics', {
+            'fields': ('follower_count', 'following_count', 'post_count', 'unread_message_count', 'unread_notification_count')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
@@ -26,10 +35,15 @@ class OwnerAdmin(admin.ModelAdmin):
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('owner', 'title', 'content_preview', 'location', 'is_pinned', 'created_at')
+    list_display = ('owner', 'title', 'content_preview', 'location', 'is_pinned', 'like_count', 'comment_count', 'created_at')
     list_filter = ('is_pinned', 'created_at', 'updated_at')
     search_fields = ('title', 'content', 'owner__user__username', 'location')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'like_count', 'comment_count',
+        'reaction_like_count', 'reaction_love_count', 'reaction_laugh_count',
+        'reaction_wow_count', 'reaction_sad_count', 'reaction_angry_count',
+        'created_at', 'updated_at',
+    )
     date_hierarchy = 'created_at'
     
     def content_preview(self, obj):
@@ -70,8 +84,8 @@ class UserFollowAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('owner', 'title', 'content_preview', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_display = ('owner', 'verb', 'actor', 'content_preview', 'is_read', 'created_at')
+    list_filter = ('verb', 'is_read', 'created_at')
     search_fields = ('owner__user__username', 'title', 'content')
     readonly_fields = ('created_at',)
     date_hierarchy = 'created_at'
@@ -82,32 +96,89 @@ class NotificationAdmin(admin.ModelAdmin):
     content_preview.short_description = 'Content'
     
     def mark_as_read(self, request, queryset):
+        # Collect the owners first: an is_read filter stops matching once the rows are updated
+        owner_ids = list(queryset.values_list('owner_id', flat=True).distinct())
         queryset.update(is_read=True)
+        reconcile_owner_counters(Owner.objects.filter(id__in=owner_ids))
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
+        owner_ids = list(queryset.values_list('owner_id', flat=True).distinct())
         queryset.update(is_read=False)
+        reconcile_owner_counters(Owner.objects.filter(id__in=owner_ids))
     mark_as_unread.short_description = "Mark selected notifications as unread"
 
 
+class ReadStateFilter(admin.SimpleListFilter):
+    """Read/unread filter for messages, derived from the receivers' read watermarks"""
+    title = 'read'
+    parameter_name = 'is_read'
+
+    def lookups(self, request, model_admin):
+        return (('1', 'Yes'), ('0', 'No'))
+
+    def queryset(self, request, queryset):
+        unread = unread_messages().values('pk')
+        if self.value() == '1':
+            return queryset.exclude(pk__in=unread)
+        if self.value() == '0':
+            return queryset.filter(pk__in=unread)
+        return queryset
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('sender', 'receiver', 'content_preview', 'is_read', 'read_at', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_filter = (ReadStateFilter, 'created_at')
     search_fields = ('sender__user__username', 'receiver__user__username', 'content')
     readonly_fields = ('created_at', 'updated_at', 'read_at')
     date_hierarchy = 'created_at'
     actions = ['mark_as_read', 'mark_as_unread']
     
+    def get_queryset(self, request):
+        # Read state comes from the annotated watermark instead of a query per row
+        return with_read_watermarks(super().get_queryset(request)).select_related(
+            'sender__user', 'receiver__user'
+        )
+    
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
     
+    def is_read(self, obj):
+        return obj.is_read
+    is_read.boolean = True
+    is_read.short_description = 'Read'
+    
+    def read_at(self, obj):
+        return obj.read_at
+    read_at.short_description = 'Read at'
+    
     def mark_as_read(self, request, queryset):
-        from django.utils import timezone
-        queryset.update(is_read=True, read_at=timezone.now())
+        # Move each receiver's watermark up to their newest selected message
+        latest = {}
+        for message in queryset.exclude(conversation=None).order_by('created_at', 'id'):
+            latest[(message.conversation_id, message.receiver_id)] = (message.created_at, message.pk)
+        for (conversation_id, receiver_id), position in latest.items():
+            set_read_watermark(conversation_id, receiver_id, position)
     mark_as_read.short_description = "Mark selected messages as read"
     
     def mark_as_unread(self, request, queryset):
-        queryset.update(is_read=False, read_at=None)
+        # Move each receiver's watermark back to just before their oldest selected message
+        earliest = {}
+        for message in queryset.exclude(conversation=None).order_by('-created_at', '-id'):
+            earliest[(message.conversation_id, message.receiver_id)] = message
+        for (conversation_id, receiver_id), message in earliest.items():
+            previous = Message.objects.filter(
+                Q(created_at__lt=message.created_at) | Q(created_at=message.created_at, id__lt=message.pk),
+                sender_id=message.sender_id, receiver_id=receiver_id
+            ).order_by('-created_at', '-id').values_list('created_at', 'id').first()
+            set_read_watermark(conversation_id, receiver_id, previous, forward_only=False)
     mark_as_unread.short_description = "Mark selected messages as unread"
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'attempts', 'available_at', 'created_at', 'last_error')
+    list_filter = ('kind', 'attempts')
+    readonly_fields = ('created_at',)
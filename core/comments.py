@@ -0,0 +1,87 @@
+"""
+Threaded comment loading for the Barta social media application.
+A post_detail render fetches one page of top-level comments (with their
+thread sizes) and the first few comments of every thread on that page in
+a fixed number of queries, however many comments the post has. Threads
+are read in materialized-path order, so replies to replies come out
+depth-first; further thread comments and older top-level comments are
+paged by cursor.
+"""
+
+import re
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+
+from .models import PostComment
+from .pagination import keyset_before, next_cursor
+
+
+# Top-level comments per page, newest first
+COMMENT_PAGE_SIZE = getattr(settings, 'COMMENT_PAGE_SIZE', 20)
+
+# Thread comments shown under each top-level comment before "load more replies"
+REPLY_PREVIEW_SIZE = getattr(settings, 'REPLY_PREVIEW_SIZE', 3)
+
+# Thread comments per "load more replies" page, in path order
+REPLY_PAGE_SIZE = getattr(settings, 'REPLY_PAGE_SIZE', 20)
+
+PATH_CURSOR_RE = re.compile(r'^[0-9a-z]+$')
+
+
+def load_comment_page(post, before=None, limit=COMMENT_PAGE_SIZE, preview_size=REPLY_PREVIEW_SIZE):
+    """
+    Return (comments, next_cursor) for a page of top-level comments.
+    Every comment gets preview_replies (the first preview_size comments of
+    its thread), thread_size and replies_cursor (None when all are shown).
+    """
+    comments = list(
+        keyset_before(
+            PostComment.objects.filter(post=post, parent_comment=None),
+            before
+        ).select_related('owner__user').annotate(
+            thread_size=Count('thread_comments')
+        ).order_by('-created_at', '-id')[:limit]
+    )
+    attach_reply_previews(comments, preview_size)
+    return comments, next_cursor(comments, limit)
+
+
+def attach_reply_previews(comments, preview_size=REPLY_PREVIEW_SIZE):
+    """Load the first preview_size comments of every thread in a single query"""
+    previews = {comment.id: [] for comment in comments}
+    if previews and preview_size > 0:
+        first_in_thread = PostComment.objects.filter(
+            thread_root=OuterRef('thread_root')
+        ).order_by('path').values('id')[:preview_size]
+
+        replies = PostComment.objects.filter(
+            thread_root_id__in=list(previews),
+            id__in=Subquery(first_in_thread)
+        ).select_related('owner__user').order_by('path')
+        for reply in replies:
+            previews[reply.thread_root_id].append(reply)
+
+    for comment in comments:
+        comment.preview_replies = previews[comment.id]
+        comment.replies_cursor = None
+        if comment.preview_replies and comment.thread_size > len(comment.preview_replies):
+            comment.replies_cursor = comment.preview_replies[-1].path
+
+
+def decode_path_cursor(cursor):
+    """Validate a thread cursor (a comment path); return None if it is malformed"""
+    if cursor and PATH_CURSOR_RE.match(cursor):
+        return cursor
+    return None
+
+
+def load_reply_page(comment, after=None, limit=REPLY_PAGE_SIZE):
+    """Return (replies, next_cursor) for the comments of a thread after a path cursor"""
+    replies = PostComment.objects.filter(thread_root=comment)
+    if after:
+        replies = replies.filter(path__gt=after)
+    replies = list(replies.select_related('owner__user').order_by('path')[:limit])
+
+    cursor = replies[-1].path if len(replies) == limit else None
+    return replies, cursor
@@ -1,65 +1,54 @@
 """
 Context processors for the Barta social media application.
 These functions provide common data to all templates.
+Values are lazy: nothing is queried unless a template actually uses them.
 """
 
-from django.contrib.auth.models import AnonymousUser
-from .models import Message, Notification, Owner
+from django.utils.functional import SimpleLazyObject
+
+from .models import Owner
 
 
 def unread_counts(request):
     """
     Add unread message and notification counts to template context.
+    Both come from the stored counters on Owner in a single query, made the
+    first time a template reads either of them.
     """
-    context = {
-        'unread_message_count': 0,
-        'unread_notification_count': 0,
-    }
-    
-    # Only process for authenticated users
     if not request.user.is_authenticated:
-        return context
+        return {
+            'unread_message_count': 0,
+            'unread_notification_count': 0,
+        }
+    
+    user_id = request.user.pk
+    cache = {}
     
-    try:
-        # Get the owner object for the current user
-        owner = request.user.owner
-        
-        # Count unread messages
-        unread_messages = Message.objects.filter(
-            receiver=owner,
-            is_read=False
-        ).count()
-        
-        # Count unread notifications
-        unread_notifications = Notification.objects.filter(
-            owner=owner,
-            is_read=False
-        ).count()
-        
-        context.update({
-            'unread_message_count': unread_messages,
-            'unread_notification_count': unread_notifications,
-        })
-        
-    except (Owner.DoesNotExist, AttributeError):
-        # Handle case where user doesn't have an owner profile
-        pass
+    def load(field):
+        if 'counts' not in cache:
+            cache['counts'] = Owner.objects.filter(user_id=user_id).values(
+                'unread_message_count', 'unread_notification_count'
+            ).first() or {}
+        return cache['counts'].get(field, 0)
     
-    return context
+    return {
+        'unread_message_count': SimpleLazyObject(lambda: load('unread_message_count')),
+        'unread_notification_count': SimpleLazyObject(lambda: load('unread_notification_count')),
+    }
 
 
 def user_profile(request):
     """
     Add current user's profile information to template context.
+    Reuses the owner cached on request.user, resolved on first use.
     """
-    context = {
-        'current_user_owner': None,
-    }
+    if not request.user.is_authenticated:
+        return {'current_user_owner': None}
     
-    if request.user.is_authenticated:
+    def load_owner():
         try:
-            context['current_user_owner'] = request.user.owner
+            return request.user.owner
         except (Owner.DoesNotExist, AttributeError):
-            pass
+            return None
     
-    return context
\ No newline at end of file
+    return {'current_user_owner': SimpleLazyObject(load_owner)}
@@ -0,0 +1,237 @@
+"""
+Conversation bookkeeping for the Barta social media application.
+Each one-to-one chat has a Conversation row pointing at its latest message
+and one ConversationParticipant row per side carrying that side's unread
+count and read watermark. Both are updated as messages are sent and read,
+so the inbox is a single ordered, keyset-paginated query instead of
+per-partner lookups, and reading a chat moves one watermark instead of
+updating every message in it.
+"""
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .counters import adjust_unread_messages
+from .models import Conversation, ConversationParticipant, Message
+from .pagination import keyset_before, next_cursor
+
+
+# Conversations per inbox page
+INBOX_PAGE_SIZE = getattr(settings, 'INBOX_PAGE_SIZE', 20)
+
+# Messages shown when a chat is opened and per "load older" page
+MESSAGE_PAGE_SIZE = getattr(settings, 'MESSAGE_PAGE_SIZE', 30)
+
+
+def get_conversation(owner_id, other_id, started_at=None):
+    """The conversation between two owners, created with both participant rows if needed"""
+    key = Conversation.key_for(owner_id, other_id)
+    conversation = Conversation.objects.filter(pair_key=key).first()
+    if conversation is not None:
+        return conversation
+
+    try:
+        with transaction.atomic():
+            started_at = started_at or timezone.now()
+            conversation = Conversation.objects.create(pair_key=key, last_activity_at=started_at)
+            # A note-to-self conversation has a single participant
+            sides = {(owner_id, other_id), (other_id, owner_id)}
+            ConversationParticipant.objects.bulk_create([
+                ConversationParticipant(
+                    conversation=conversation, owner_id=side, partner_id=partner,
+                    last_activity_at=started_at
+                )
+                for side, partner in sides
+            ])
+    except IntegrityError:
+        # Another request created it first
+        conversation = Conversation.objects.get(pair_key=key)
+    return conversation
+
+
+def after_position(position, created_field='created_at', id_field='id'):
+    """Q for rows strictly after a (created_at, id) position; None means from the beginning"""
+    if position is None or position[0] is None:
+        return Q()
+    created_at, pk = position
+    return (
+        Q(**{f'{created_field}__gt': created_at}) |
+        Q(**{created_field: created_at, f'{id_field}__gt': pk})
+    )
+
+
+def unread_messages():
+    """Messages their receiver's read watermark has not reached yet"""
+    watermark = 'conversation__participants__read_through_at'
+    return Message.objects.filter(
+        Q(**{f'{watermark}__isnull': True}) | after_position(
+            (F(watermark), F('conversation__participants__read_through_id'))
+        ),
+        conversation__participants__owner=F('receiver'),
+    )
+
+
+def with_read_watermarks(messages):
+    """Annotate a Message queryset with its receivers' watermarks, so is_read needs no query per row"""
+    participant = ConversationParticipant.objects.filter(
+        conversation_id=OuterRef('conversation_id'), owner_id=OuterRef('receiver_id')
+    )
+    return messages.annotate(
+        receiver_read_through_at=Subquery(participant.values('read_through_at')[:1]),
+        receiver_read_through_id=Subquery(participant.values('read_through_id')[:1]),
+        receiver_last_read_at=Subquery(participant.values('last_read_at')[:1]),
+    )
+
+
+def record_message(message):
+    """
+    Attach a new message to its conversation and move the conversation up both inboxes.
+    Returns True when the message counts as unread for its receiver.
+    """
+    conversation = get_conversation(message.sender_id, message.receiver_id, message.created_at)
+    Message.objects.filter(pk=message.pk).update(conversation=conversation)
+    message.conversation = conversation
+
+    # Messages backdated behind the latest one (imports, sample data) keep the pointer as is
+    Conversation.objects.filter(
+        pk=conversation.pk, last_activity_at__lte=message.created_at
+    ).update(last_message=message, last_activity_at=message.created_at)
+    ConversationParticipant.objects.filter(
+        conversation=conversation, last_activity_at__lte=message.created_at
+    ).update(last_activity_at=message.created_at)
+
+    # Unread unless it was backdated behind the receiver's watermark
+    return bool(ConversationParticipant.objects.filter(
+        Q(read_through_at__isnull=True) |
+        Q(read_through_at__lt=message.created_at) |
+        Q(read_through_at=message.created_at, read_through_id__lt=message.pk),
+        conversation=conversation, owner_id=message.receiver_id,
+    ).update(unread_count=F('unread_count') + 1))
+
+
+def mark_conversation_read_count(conversation_id, owner_id, count):
+    """Subtract count read messages from one side's unread count"""
+    if conversation_id is None or not count:
+        return
+    ConversationParticipant.objects.filter(
+        conversation_id=conversation_id, owner_id=owner_id
+    ).update(unread_count=Greatest(F('unread_count') - count, Value(0)))
+
+
+def set_read_watermark(conversation_id, owner_id, position, forward_only=True):
+    """
+    Move the owner's read watermark in a conversation to position, a (created_at, id)
+    pair or None for "nothing read". Their unread count is re-derived from the pair
+    index and the owner's badge adjusted by the difference. Returns that difference.
+    """
+    with transaction.atomic():
+        participant = ConversationParticipant.objects.select_for_update().filter(
+            conversation_id=conversation_id, owner_id=owner_id
+        ).first()
+        if participant is None:
+            return 0
+        current = (participant.read_through_at, participant.read_through_id)
+        if forward_only and current[0] is not None and (position is None or position <= current):
+            return 0
+
+        unread = Message.objects.filter(
+            after_position(position), sender_id=participant.partner_id, receiver_id=owner_id
+        ).count()
+        read_through_at, read_through_id = position or (None, 0)
+        ConversationParticipant.objects.filter(pk=participant.pk).update(
+            read_through_at=read_through_at, read_through_id=read_through_id,
+            last_read_at=timezone.now() if position else None, unread_count=unread
+        )
+        delta = unread - participant.unread_count
+        adjust_unread_messages(owner_id, delta)
+    return delta
+
+
+def mark_conversation_read(owner_id, other_id):
+    """Move the owner's watermark past the latest message other_id sent them"""
+    latest = Message.objects.filter(
+        sender_id=other_id, receiver_id=owner_id
+    ).order_by('-created_at', '-id').values_list('conversation_id', 'created_at', 'id').first()
+    if latest is None:
+        return 0
+    conversation_id, created_at, pk = latest
+    return set_read_watermark(conversation_id, owner_id, (created_at, pk))
+
+
+def load_inbox_page(owner, before=None, limit=INBOX_PAGE_SIZE):
+    """Return (participants, next_cursor) for a page of the owner's inbox, latest activity first"""
+    participants = list(
+        keyset_before(
+            ConversationParticipant.objects.filter(owner=owner),
+            before, created_field='last_activity_at'
+        ).select_related(
+            'partner__user', 'conversation__last_message'
+        ).order_by('-last_activity_at', '-id')[:limit]
+    )
+    for participant in participants:
+        participant.last_message = participant.conversation.last_message
+    return participants, next_cursor(participants, limit, created_field='last_activity_at')
+
+
+def load_message_page(owner, partner, before=None, limit=MESSAGE_PAGE_SIZE):
+    """
+    Return (messages, next_cursor) for a page of the chat between owner and partner.
+    The page is fetched newest first from the pair index and returned oldest first for display;
+    the cursor points further back in time. Read state comes from the two watermarks.
+    """
+    pair = (
+        Q(sender=owner, receiver=partner) |
+        Q(sender=partner, receiver=owner)
+    )
+    page = list(
+        keyset_before(Message.objects.filter(pair), before).select_related(
+            'sender__user'
+        ).order_by('-created_at', '-id')[:limit]
+    )
+    cursor = next_cursor(page, limit)
+    page.reverse()
+
+    # Both sides' watermarks in one query, so is_read needs no lookup per message
+    watermarks = {
+        owner_id: watermark
+        for owner_id, *watermark in ConversationParticipant.objects.filter(
+            conversation__pair_key=Conversation.key_for(owner.id, partner.id)
+        ).values_list('owner_id', 'read_through_at', 'read_through_id', 'last_read_at')
+    }
+    for message in page:
+        message._read_watermark = watermarks.get(message.receiver_id)
+    return page, cursor
+
+
+def reconcile_conversations():
+    """
+    Recompute last-message pointers and unread counts from Message.
+    Returns the number of participant rows that were repaired.
+    """
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id')
+    Conversation.objects.filter(pk__in=Message.objects.values('conversation_id')).update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_activity_at=Subquery(latest.values('created_at')[:1]),
+    )
+
+    unread = {
+        (conversation_id, receiver_id): total
+        for conversation_id, receiver_id, total in unread_messages().values_list(
+            'conversation_id', 'receiver_id'
+        ).annotate(total=Count('id')).order_by()
+    }
+
+    repaired = []
+    for participant in ConversationParticipant.objects.select_related('conversation'):
+        expected_unread = unread.get((participant.conversation_id, participant.owner_id), 0)
+        expected_activity = participant.conversation.last_activity_at
+        if (participant.unread_count, participant.last_activity_at) != (expected_unread, expected_activity):
+            participant.unread_count = expected_unread
+            participant.last_activity_at = expected_activity
+            repaired.append(participant)
+
+    ConversationParticipant.objects.bulk_update(repaired, ['unread_count', 'last_activity_at'], batch_size=500)
+    return len(repaired)
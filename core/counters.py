@@ -0,0 +1,182 @@
+"""
+Denormalized counters for the Barta social media application.
+Counters are adjusted with F() expressions inside the caller's transaction,
+so concurrent writers never lose an increment; the reconcile functions
+recompute them from the source tables to repair any drift.
+"""
+
+from collections import Counter
+
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from .events import publish, publish_notifications, unread_event
+from .models import Notification, Owner, Post, PostComment, PostLike, UserFollow
+
+
+def reaction_count_field(reaction_type):
+    """Name of the Post counter column for a reaction type"""
+    return f'reaction_{reaction_type}_count'
+
+
+def adjust_post_reactions(post_id, reaction_type, delta):
+    """Add delta to a post's total like count and its per-reaction count"""
+    field = reaction_count_field(reaction_type)
+    Post.objects.filter(pk=post_id).update(
+        like_count=F('like_count') + delta,
+        **{field: F(field) + delta}
+    )
+
+
+def switch_post_reaction(post_id, old_reaction, new_reaction):
+    """Move one reaction on a post from one type to another"""
+    if old_reaction == new_reaction:
+        return
+    old_field = reaction_count_field(old_reaction)
+    new_field = reaction_count_field(new_reaction)
+    Post.objects.filter(pk=post_id).update(**{
+        old_field: F(old_field) - 1,
+        new_field: F(new_field) + 1,
+    })
+
+
+def adjust_post_comments(post_id, delta):
+    """Add delta to a post's comment count"""
+    Post.objects.filter(pk=post_id).update(comment_count=F('comment_count') + delta)
+
+
+def adjust_owner_posts(owner_id, delta):
+    """Add delta to an owner's post count"""
+    Owner.objects.filter(pk=owner_id).update(post_count=F('post_count') + delta)
+
+
+def adjust_follow_counts(follower_id, following_id, delta):
+    """Add delta to the follower's following count and the followed owner's follower count"""
+    Owner.objects.filter(pk=follower_id).update(following_count=F('following_count') + delta)
+    Owner.objects.filter(pk=following_id).update(follower_count=F('follower_count') + delta)
+
+
+def adjust_unread_messages(owner_id, delta):
+    """Add delta to an owner's unread message count, never going below zero"""
+    Owner.objects.filter(pk=owner_id).update(
+        unread_message_count=Greatest(F('unread_message_count') + delta, Value(0))
+    )
+    publish(owner_id, 'unread', lambda: unread_event(owner_id))
+
+
+def adjust_unread_notifications(owner_id, delta):
+    """Add delta to an owner's unread notification count, never going below zero"""
+    Owner.objects.filter(pk=owner_id).update(
+        unread_notification_count=Greatest(F('unread_notification_count') + delta, Value(0))
+    )
+    publish(owner_id, 'unread', lambda: unread_event(owner_id))
+
+
+def count_bulk_notifications(notifications):
+    """Account for notifications inserted with bulk_create, which sends no post_save"""
+    per_owner = Counter(n.owner_id for n in notifications if not n.is_read)
+    for owner_id, total in per_owner.items():
+        adjust_unread_notifications(owner_id, total)
+    publish_notifications(notifications)
+
+
+def reconcile_post_counters(posts=None, batch_size=500):
+    """
+    Recompute engagement counters from PostLike/PostComment and fix drifted rows.
+    Returns the number of posts that were repaired.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+
+    reaction_fields = [reaction_count_field(reaction) for reaction, _ in PostLike.REACTION_CHOICES]
+    counter_fields = ['like_count', 'comment_count'] + reaction_fields
+    post_ids = posts.values('id')
+
+    reactions = {}
+    for post_id, reaction_type, total in PostLike.objects.filter(
+        post_id__in=post_ids
+    ).values_list('post_id', 'reaction_type').annotate(total=Count('id')).order_by():
+        reactions.setdefault(post_id, {})[reaction_type] = total
+
+    comments = dict(
+        PostComment.objects.filter(
+            post_id__in=post_ids
+        ).values_list('post_id').annotate(total=Count('id')).order_by()
+    )
+
+    repaired = []
+    for post in posts.only('id', *counter_fields).iterator():
+        by_type = reactions.get(post.id, {})
+        expected = {
+            'like_count': sum(by_type.values()),
+            'comment_count': comments.get(post.id, 0),
+        }
+        for reaction, _ in PostLike.REACTION_CHOICES:
+            expected[reaction_count_field(reaction)] = by_type.get(reaction, 0)
+
+        if any(getattr(post, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(post, field, value)
+            repaired.append(post)
+
+    Post.objects.bulk_update(repaired, counter_fields, batch_size=batch_size)
+    return len(repaired)
+
+
+def reconcile_owner_counters(owners=None, batch_size=500):
+    """
+    Recompute follower/following/post and unread counts from UserFollow, Post,
+    Message and Notification and fix drifted rows.
+    Returns the number of owners that were repaired.
+    """
+    # core.conversations imports this module for the badge helpers
+    from . import conversations
+
+    if owners is None:
+        owners = Owner.objects.all()
+
+    counter_fields = [
+        'follower_count', 'following_count', 'post_count',
+        'unread_message_count', 'unread_notification_count',
+    ]
+    owner_ids = owners.values('id')
+    accepted = UserFollow.objects.filter(status='accepted')
+
+    followers = dict(
+        accepted.filter(following_id__in=owner_ids)
+        .values_list('following_id').annotate(total=Count('id')).order_by()
+    )
+    following = dict(
+        accepted.filter(follower_id__in=owner_ids)
+        .values_list('follower_id').annotate(total=Count('id')).order_by()
+    )
+    posts = dict(
+        Post.objects.filter(owner_id__in=owner_ids)
+        .values_list('owner_id').annotate(total=Count('id')).order_by()
+    )
+
+    unread_messages = dict(
+        conversations.unread_messages().filter(receiver_id__in=owner_ids)
+        .values_list('receiver_id').annotate(total=Count('id')).order_by()
+    )
+    unread_notifications = dict(
+        Notification.objects.filter(owner_id__in=owner_ids, is_read=False)
+        .values_list('owner_id').annotate(total=Count('id')).order_by()
+    )
+
+    repaired = []
+    for owner in owners.only('id', *counter_fields).iterator():
+        expected = {
+            'follower_count': followers.get(owner.id, 0),
+            'following_count': following.get(owner.id, 0),
+            'post_count': posts.get(owner.id, 0),
+            'unread_message_count': unread_messages.get(owner.id, 0),
+            'unread_notification_count': unread_notifications.get(owner.id, 0),
+        }
+        if any(getattr(owner, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(owner, field, value)
+            repaired.append(owner)
+
+    Owner.objects.bulk_update(repaired, counter_fields, batch_size=batch_size)
+    return len(repaired)
@@ -0,0 +1,146 @@
+"""
+Live event publishing for the Barta social media application.
+Writes publish small per-owner events (new notifications, unread count
+changes, incoming messages) once their transaction commits; the SSE
+endpoint in core.sse subscribes to them. The default LocalBroker only
+reaches subscribers in the same process; a broker that spans workers
+(Redis, a local socket relay...) plugs in through settings.EVENT_BROKER by
+subclassing Broker.
+"""
+
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Owner
+
+
+# Dotted path of the Broker class used by publish()/subscribe()
+EVENT_BROKER = getattr(settings, 'EVENT_BROKER', 'core.events.LocalBroker')
+
+# Events a slow client may fall behind by before older ones are dropped
+EVENT_QUEUE_SIZE = getattr(settings, 'EVENT_QUEUE_SIZE', 100)
+
+
+class Broker(ABC):
+    """Interface every event broker implements"""
+
+    @abstractmethod
+    def publish(self, owner_id, event):
+        """Deliver event to the owner's subscribers; may be called from any thread"""
+
+    @abstractmethod
+    def subscribe(self, owner_id):
+        """Return an asyncio.Queue receiving the owner's events; call from the event loop"""
+
+    @abstractmethod
+    def unsubscribe(self, owner_id, queue):
+        """Stop delivering to a queue returned by subscribe()"""
+
+    def has_subscribers(self, owner_id):
+        """Whether building an event for owner_id is worth it; brokers that cannot tell say True"""
+        return True
+
+
+class LocalBroker(Broker):
+    """
+    In-process fan-out to asyncio queues.
+    publish() may be called from any thread; delivery is scheduled on the
+    loop that owns each subscriber's queue.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, owner_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(owner_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    def subscribe(self, owner_id):
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(owner_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, owner_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(owner_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(owner_id, None)
+
+    def has_subscribers(self, owner_id):
+        with self._lock:
+            return owner_id in self._subscribers
+
+    @staticmethod
+    def _deliver(queue, event):
+        if queue.full():
+            # Drop the oldest event rather than block the publisher
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(EVENT_BROKER)()
+    return _broker
+
+
+def publish(owner_id, kind, build):
+    """
+    Publish a kind event to owner_id after the current transaction commits.
+    build() returns the event data and is only called if someone is listening.
+    """
+    broker = get_broker()
+
+    def send():
+        if broker.has_subscribers(owner_id):
+            broker.publish(owner_id, {'event': kind, 'data': build()})
+
+    transaction.on_commit(send)
+
+
+def publish_notifications(notifications):
+    """Publish notifications that were written without post_save (bulk_create)"""
+    for notification in notifications:
+        publish(notification.owner_id, 'notification', lambda n=notification: notification_event(n))
+
+
+def notification_event(notification):
+    return {
+        'id': notification.pk,
+        'verb': notification.verb,
+        'content': notification.content,
+        'actor_count': notification.actor_count,
+        'related_post': notification.related_post_id,
+    }
+
+
+def unread_event(owner_id):
+    return Owner.objects.filter(pk=owner_id).values(
+        'unread_message_count', 'unread_notification_count'
+    ).first() or {}
+
+
+def message_event(message):
+    sender = Owner.objects.filter(pk=message.sender_id).values_list('user__username', flat=True).first()
+    return {
+        'id': message.pk,
+        'sender': sender,
+        'preview': message.content[:100],
+        'has_attachment': bool(message.attachment),
+    }
@@ -0,0 +1,72 @@
+import random
+import string
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import scoring
+
+
+WORDS = [
+    'alice', 'bob', 'carol', 'dhaka', 'photography', 'runner', 'coffee', 'developer',
+    'music', 'travel', 'wonder', 'builder', 'sylhet', 'chittagong', 'design', 'football',
+]
+
+
+def synthetic_people(count, seed):
+    """In-memory owner stand-ins shaped like the ones find_friend scores"""
+    rng = random.Random(seed)
+
+    def word():
+        if rng.random() < 0.5:
+            return rng.choice(WORDS)
+        return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+    return [
+        SimpleNamespace(
+            id=i,
+            user=SimpleNamespace(
+                first_name=word().title(), last_name=word().title(), username=f'{word()}{i}'
+            ),
+            location=word().title() if rng.random() < 0.6 else '',
+            bio=' '.join(word() for _ in range(rng.randint(0, 30))),
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare the scalar and vectorized people search scorers on synthetic candidates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=10000)
+        parser.add_argument('--query', default='alice wonder')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if scoring.np is None:
+            raise CommandError('NumPy is not installed; only the scalar scorer is available')
+
+        people = synthetic_people(options['candidates'], options['seed'])
+        query = options['query']
+
+        start = time.perf_counter()
+        reference = scoring.score_people(people, query, vectorized=False)
+        scalar_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = scoring.score_people(people, query)
+        vector_seconds = time.perf_counter() - start
+
+        drift = max((abs(a - b) for a, b in zip(reference, batch)), default=0.0)
+        rank = lambda scores: sorted(range(len(scores)), key=lambda i: (-round(scores[i], 9), i))
+        if drift > 1e-9 or rank(reference) != rank(batch):
+            raise CommandError(f'Vectorized scores diverge from the reference (max drift {drift:.2e})')
+
+        self.stdout.write(f"{len(people)} candidates, query {query!r}")
+        self.stdout.write(f"scalar:     {scalar_seconds * 1000:9.1f} ms")
+        self.stdout.write(f"vectorized: {vector_seconds * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"{scalar_seconds / vector_seconds:.1f}x faster, identical ranking"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Owner
+from core.timeline import FEED_FANOUT_THRESHOLD, set_fanout_mode
+
+
+class Command(BaseCommand):
+    help = 'Re-classify authors between pushed (fan-out) and pulled home feed delivery'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=int, default=FEED_FANOUT_THRESHOLD,
+            help='Accepted follower count above which an author is pulled at read time'
+        )
+        parser.add_argument(
+            '--hysteresis', type=float, default=0.9,
+            help='Pulled authors are only demoted once they drop below threshold * hysteresis'
+        )
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        demote_below = int(threshold * options['hysteresis'])
+
+        to_promote = Owner.objects.filter(is_high_fanout=False, follower_count__gt=threshold)
+        to_demote = Owner.objects.filter(is_high_fanout=True, follower_count__lt=demote_below)
+
+        promoted = demoted = 0
+        for owner in list(to_promote):
+            with transaction.atomic():
+                promoted += set_fanout_mode(owner, True)
+        for owner in list(to_demote):
+            with transaction.atomic():
+                demoted += set_fanout_mode(owner, False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Promoted {promoted} authors to pull delivery, demoted {demoted} to push delivery"
+        ))
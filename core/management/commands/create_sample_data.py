@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 import random
+from core.counters import reconcile_owner_counters, reconcile_post_counters
 from core.models import Owner, Post, Message, UserFollow, Notification, PostComment, PostLike
 
 class Command(BaseCommand):
@@ -24,6 +25,10 @@ class Command(BaseCommand):
         posts = self.create_sample_posts(users)
         self.create_social_connections(users)
         
+        # Rows above are created directly, so bring the stored counters in line
+        reconcile_post_counters()
+        reconcile_owner_counters()
+        
         self.stdout.write("=" * 50)
         self.stdout.write(self.style.SUCCESS("✅ Sample data creation completed!"))
         self.stdout.write(f"📊 Created {len(users)} users")
@@ -233,7 +238,9 @@ class Command(BaseCommand):
         
         # Create notifications
         self.stdout.write("Creating notifications...")
-        notification_types = ['follow', 'like', 'comment', 'message']
+        notification_types = [
+            Notification.FOLLOW, Notification.LIKE, Notification.COMMENT, Notification.MESSAGE
+        ]
         
         for user in users:
             # Create 2-4 notifications for each user
@@ -242,17 +249,8 @@ class Command(BaseCommand):
                 other_user = random.choice([u for u in users if u != user])
                 notification_type = random.choice(notification_types)
                 
-                if notification_type == 'follow':
-                    message = f"{other_user.user.username} started following you"
-                elif notification_type == 'like':
-                    message = f"{other_user.user.username} liked your post"
-                elif notification_type == 'comment':
-                    message = f"{other_user.user.username} commented on your post"
-                else:  # message
-                    message = f"{other_user.user.username} sent you a message"
-                
-                Notification.objects.create(
-                    owner=user,
-                    content=message,
+                notification = Notification.build(user, notification_type, actor=other_user)
+                notification.save()
+                Notification.objects.filter(pk=notification.pk).update(
                     created_at=timezone.now() - timedelta(days=random.randint(0, 5))
                 )
\ No newline at end of file
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Message, Owner, Post
+from core.storage import ContentAddressedStorage
+
+
+MEDIA_FIELDS = [
+    (Owner, 'profile_picture'),
+    (Owner, 'cover_photo'),
+    (Post, 'image'),
+    (Message, 'attachment'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Move media uploaded before deduplication into the content-addressed blob store'
+
+    def handle(self, *args, **options):
+        adopted = 0
+        for model, field_name in MEDIA_FIELDS:
+            storage = model._meta.get_field(field_name).storage
+            if not isinstance(storage, ContentAddressedStorage):
+                continue
+            names = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list(field_name, flat=True).distinct()
+            for name in names.iterator():
+                adopted += storage.adopt(name)
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {adopted} files into the blob store"))
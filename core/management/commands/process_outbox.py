@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import OUTBOX_BATCH_SIZE, OUTBOX_WORKER_THREADS, drain
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued side effects (notifications) from the transactional outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+            help='Events claimed per round'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=OUTBOX_WORKER_THREADS,
+            help='Worker threads each claimed batch is split across'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to sleep when the outbox is empty'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain what is pending and exit instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = drain(options['batch_size'], options['threads'])
+            if delivered:
+                self.stdout.write(f"Delivered {delivered} outbox events")
+            if options['once']:
+                break
+            if not delivered:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS("Outbox drained"))
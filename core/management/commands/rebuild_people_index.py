@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.people_search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram index behind people search'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} profiles"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.post_search import rebuild_post_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text index behind post search'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_post_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} posts"))
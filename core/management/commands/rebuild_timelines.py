@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Owner
+from core.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home timelines from posts and accepted follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild timelines for these users')
+
+    def handle(self, *args, **options):
+        owners = Owner.objects.select_related('user')
+        if options['usernames']:
+            owners = owners.filter(user__username__in=options['usernames'])
+
+        rebuilt = 0
+        for owner in owners.iterator():
+            with transaction.atomic():
+                rebuild_timeline(owner)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.conversations import reconcile_conversations
+from core.counters import reconcile_owner_counters, reconcile_post_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized post, profile and conversation counters and repair any drift'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired_posts = reconcile_post_counters()
+            repaired_owners = reconcile_owner_counters()
+            repaired_conversations = reconcile_conversations()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired counters on {repaired_posts} posts, {repaired_owners} profiles "
+            f"and {repaired_conversations} conversations"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.people_search import refresh_stale_features
+
+
+class Command(BaseCommand):
+    help = 'Recount recent posts in people search features older than SEARCH_FEATURES_MAX_AGE'
+
+    def handle(self, *args, **options):
+        refreshed = refresh_stale_features()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed search features of {refreshed} profiles"))
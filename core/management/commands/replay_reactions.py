@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.reaction_buffer import REACTION_BUFFER_WAL_DIR, recover_wal_files
+
+
+class Command(BaseCommand):
+    help = 'Replay reaction write-ahead files left behind by crashed processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wal-dir',
+            default=REACTION_BUFFER_WAL_DIR,
+            help='Directory holding the reaction write-ahead files'
+        )
+
+    def handle(self, *args, **options):
+        changed = recover_wal_files(options['wal_dir'])
+        self.stdout.write(self.style.SUCCESS(f"Replayed {changed} buffered reactions"))
@@ -0,0 +1,165 @@
+"""
+Media file serving for the Barta social media application.
+Uploads are served with byte-range support (seeking in videos and audio),
+ETag/Last-Modified validators and long-lived cache headers. Full files
+stream through FileResponse so WSGI servers can use sendfile; with
+MEDIA_OFFLOAD set, Django only checks the request and hands the transfer
+to the front proxy through X-Accel-Redirect (nginx) or X-Sendfile (Apache).
+The deduplicated blob store is never served directly; uploads are only
+reachable under the names they were stored with.
+"""
+
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .storage import MEDIA_BLOB_DIR
+
+
+# None (stream from Django), 'x-accel-redirect' or 'x-sendfile'
+MEDIA_OFFLOAD = getattr(settings, 'MEDIA_OFFLOAD', None)
+
+# Internal nginx location aliased to MEDIA_ROOT, used with 'x-accel-redirect'
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Seconds browsers and proxies may reuse a media response
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 7 * 24 * 3600)
+
+OFFLOAD_HEADERS = ('x-accel-redirect', 'x-sendfile')
+
+
+def normalize_name(name):
+    """A media name with "." and ".." segments resolved, so prefix checks see the real directory"""
+    return posixpath.normpath('/' + name).lstrip('/')
+
+
+def media_path(name):
+    """Absolute path of a media file, or Http404 if it is outside MEDIA_ROOT, in the blob store or missing"""
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        blob_root = safe_join(settings.MEDIA_ROOT, MEDIA_BLOB_DIR)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    if os.path.commonpath([path, blob_root]) == blob_root:
+        raise Http404('Media file not found')
+    if not os.path.isfile(path):
+        raise Http404('Media file not found')
+    return path
+
+
+def file_etag(stat):
+    # Size and mtime, like nginx; uploads are never rewritten in place
+    return quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=" range against a file of size bytes.
+    Returns (start, end) inclusive, None to serve the whole file (absent,
+    malformed or multi-range header) or False if it cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, sep, end = header[len('bytes='):].strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not start:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return False
+    return start, min(end, size - 1)
+
+
+class RangeFile:
+    """File-like view of bytes [start, start + length) of an open file"""
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def serve_file(request, name, private=False):
+    """
+    Serve the media file stored under name, honouring Range and conditional headers.
+    private files may only be cached by the requesting browser.
+    """
+    path = media_path(name)
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Cache-Control'] = f"{'private' if private else 'public'}, max-age={MEDIA_CACHE_MAX_AGE}"
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    # 304 Not Modified / 412 Precondition Failed
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if conditional is not None:
+        return finish(conditional)
+
+    if MEDIA_OFFLOAD in OFFLOAD_HEADERS:
+        # The proxy does ranges and the transfer itself
+        response = HttpResponse(content_type=content_type)
+        if MEDIA_OFFLOAD == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + name.lstrip('/')
+        else:
+            response['X-Sendfile'] = path
+        return finish(response)
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range and if_range and if_range != etag and parse_http_date_safe(if_range) != int(stat.st_mtime):
+        # The client's copy is stale; it gets the whole file
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(response)
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        # A bounded wrapper has no fileno(), so servers cannot sendfile past the range
+        response = FileResponse(RangeFile(open(path, 'rb'), start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return finish(response)
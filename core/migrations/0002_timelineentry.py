@@ -0,0 +1,65 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_timelines(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    UserFollow = apps.get_model('core', 'UserFollow')
+    TimelineEntry = apps.get_model('core', 'TimelineEntry')
+
+    followers_by_author = {}
+    for follower_id, following_id in UserFollow.objects.filter(
+        status='accepted'
+    ).values_list('follower_id', 'following_id'):
+        followers_by_author.setdefault(following_id, []).append(follower_id)
+
+    entries = []
+    for post_id, owner_id, created_at in Post.objects.values_list('id', 'owner_id', 'created_at'):
+        for viewer_id in [owner_id] + followers_by_author.get(owner_id, []):
+            entries.append(TimelineEntry(
+                owner_id=viewer_id,
+                post_id=post_id,
+                author_id=owner_id,
+                created_at=created_at
+            ))
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.owner')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='core.owner')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='core.post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-created_at'], name='timeline_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('owner', 'post')},
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
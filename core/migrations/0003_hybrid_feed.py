@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='is_high_fanout',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['owner', '-created_at'], name='post_owner_created_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_post_counters(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    PostLike = apps.get_model('core', 'PostLike')
+    PostComment = apps.get_model('core', 'PostComment')
+
+    reactions = {}
+    for post_id, reaction_type, total in PostLike.objects.values_list(
+        'post_id', 'reaction_type'
+    ).annotate(total=Count('id')).order_by():
+        reactions.setdefault(post_id, {})[reaction_type] = total
+    comments = dict(
+        PostComment.objects.values_list('post_id').annotate(total=Count('id')).order_by()
+    )
+
+    posts = list(Post.objects.all())
+    for post in posts:
+        by_type = reactions.get(post.id, {})
+        post.like_count = sum(by_type.values())
+        post.comment_count = comments.get(post.id, 0)
+        for reaction_type in ('like', 'love', 'laugh', 'wow', 'sad', 'angry'):
+            setattr(post, f'reaction_{reaction_type}_count', by_type.get(reaction_type, 0))
+
+    Post.objects.bulk_update(posts, [
+        'like_count', 'comment_count',
+        'reaction_like_count', 'reaction_love_count', 'reaction_laugh_count',
+        'reaction_wow_count', 'reaction_sad_count', 'reaction_angry_count',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_angry_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_laugh_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_love_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_sad_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_wow_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_post_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_owner_counters(apps, schema_editor):
+    Owner = apps.get_model('core', 'Owner')
+    Post = apps.get_model('core', 'Post')
+    UserFollow = apps.get_model('core', 'UserFollow')
+
+    accepted = UserFollow.objects.filter(status='accepted')
+    followers = dict(accepted.values_list('following_id').annotate(total=Count('id')).order_by())
+    following = dict(accepted.values_list('follower_id').annotate(total=Count('id')).order_by())
+    posts = dict(Post.objects.values_list('owner_id').annotate(total=Count('id')).order_by())
+
+    owners = list(Owner.objects.all())
+    for owner in owners:
+        owner.follower_count = followers.get(owner.id, 0)
+        owner.following_count = following.get(owner.id, 0)
+        owner.post_count = posts.get(owner.id, 0)
+    Owner.objects.bulk_update(owners, ['follower_count', 'following_count', 'post_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_post_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='owner',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='owner',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_owner_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_owner_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', 'parent_comment', '-created_at', '-id'], name='comment_post_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['parent_comment', 'created_at', 'id'], name='comment_replies_idx'),
+        ),
+    ]
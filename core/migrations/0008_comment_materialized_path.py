@@ -0,0 +1,71 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def encode_path_segment(pk, width=8):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    segment = ''
+    while pk:
+        pk, remainder = divmod(pk, 36)
+        segment = digits[remainder] + segment
+    return segment.rjust(width, '0')
+
+
+def backfill_comment_paths(apps, schema_editor):
+    PostComment = apps.get_model('core', 'PostComment')
+
+    parents = dict(PostComment.objects.values_list('id', 'parent_comment_id'))
+    resolved = {}
+
+    def resolve(comment_id):
+        # (path, depth, thread_root_id), walking up the adjacency list once per comment
+        if comment_id not in resolved:
+            parent_id = parents[comment_id]
+            segment = encode_path_segment(comment_id)
+            if parent_id is None:
+                resolved[comment_id] = (segment, 0, None)
+            else:
+                parent_path, parent_depth, parent_root = resolve(parent_id)
+                resolved[comment_id] = (parent_path + segment, parent_depth + 1, parent_root or parent_id)
+        return resolved[comment_id]
+
+    comments = list(PostComment.objects.only('id'))
+    for comment in comments:
+        comment.path, comment.depth, comment.thread_root_id = resolve(comment.id)
+    PostComment.objects.bulk_update(comments, ['path', 'depth', 'thread_root'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_comment_thread_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postcomment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=168),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='thread_root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='core.postcomment'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['thread_root', 'path'], name='comment_thread_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(backfill_comment_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# One-time classification of legacy free-text notifications, most specific first
+LEGACY_VERBS = [
+    ('replied to', 'reply'),
+    ('commented on', 'comment'),
+    ('liked your', 'like'),
+    ('removed you from their followers', 'follower_removed'),
+    ('started following you', 'follow'),
+    ('message', 'message'),
+]
+
+
+def backfill_notification_verbs(apps, schema_editor):
+    Notification = apps.get_model('core', 'Notification')
+    Owner = apps.get_model('core', 'Owner')
+    owner_ids = dict(Owner.objects.values_list('user__username', 'id'))
+
+    batch = []
+    for notification in Notification.objects.only('id', 'content').iterator():
+        content = notification.content or ''
+        notification.verb = next(
+            (verb for phrase, verb in LEGACY_VERBS if phrase in content.lower()), 'system'
+        )
+        if content.startswith('New message from '):
+            username = content[len('New message from '):].strip()
+        else:
+            username = content.split(' ', 1)[0]
+        notification.actor_id = owner_ids.get(username)
+        batch.append(notification)
+        if len(batch) >= 500:
+            Notification.objects.bulk_update(batch, ['verb', 'actor'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['verb', 'actor'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0008_comment_materialized_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sent_notifications', to='core.owner'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_content_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_object_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='verb',
+            field=models.CharField(choices=[('like', 'Liked your post'), ('comment', 'Commented on your post'), ('reply', 'Replied to a comment'), ('follow', 'Followed you'), ('follower_removed', 'Removed you as a follower'), ('message', 'Sent you a message'), ('system', 'System')], default='system', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['owner', 'verb', 'is_read', '-created_at'], name='notif_owner_verb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['owner', 'is_read', '-created_at'], name='notif_owner_unread_idx'),
+        ),
+        migrations.RunPython(backfill_notification_verbs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+def backfill_recent_actors(apps, schema_editor):
+    Notification = apps.get_model('core', 'Notification')
+    batch = []
+    for notification in Notification.objects.exclude(actor=None).only('id', 'actor_id').iterator():
+        notification.recent_actor_ids = [notification.actor_id]
+        batch.append(notification)
+    Notification.objects.bulk_update(batch, ['recent_actor_ids'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_notification_verbs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_recent_actors, migrations.RunPython.noop),
+    ]
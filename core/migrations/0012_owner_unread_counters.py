@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_unread_counters(apps, schema_editor):
+    Owner = apps.get_model('core', 'Owner')
+    Message = apps.get_model('core', 'Message')
+    Notification = apps.get_model('core', 'Notification')
+
+    messages = dict(
+        Message.objects.filter(is_read=False).values_list('receiver_id').annotate(total=Count('id')).order_by()
+    )
+    notifications = dict(
+        Notification.objects.filter(is_read=False).values_list('owner_id').annotate(total=Count('id')).order_by()
+    )
+
+    owners = list(Owner.objects.all())
+    for owner in owners:
+        owner.unread_message_count = messages.get(owner.id, 0)
+        owner.unread_notification_count = notifications.get(owner.id, 0)
+    Owner.objects.bulk_update(owners, ['unread_message_count', 'unread_notification_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='unread_message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='owner',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
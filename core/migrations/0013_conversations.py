@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_conversations(apps, schema_editor):
+    Conversation = apps.get_model('core', 'Conversation')
+    ConversationParticipant = apps.get_model('core', 'ConversationParticipant')
+    Message = apps.get_model('core', 'Message')
+
+    pairs = {}
+    for message in Message.objects.order_by('created_at', 'id').only(
+        'id', 'sender_id', 'receiver_id', 'is_read', 'created_at'
+    ).iterator():
+        low, high = sorted((message.sender_id, message.receiver_id))
+        pair = pairs.setdefault((low, high), {'ids': [], 'unread': {low: 0, high: 0}})
+        pair['ids'].append(message.id)
+        pair['last'] = message
+        if not message.is_read:
+            pair['unread'][message.receiver_id] += 1
+
+    for (low, high), pair in pairs.items():
+        last = pair['last']
+        conversation = Conversation.objects.create(
+            pair_key=f"{low}:{high}", last_message_id=last.id, last_activity_at=last.created_at
+        )
+        ConversationParticipant.objects.bulk_create([
+            ConversationParticipant(
+                conversation=conversation, owner_id=owner_id, partner_id=partner_id,
+                unread_count=pair['unread'][owner_id], last_activity_at=last.created_at
+            )
+            for owner_id, partner_id in {(low, high), (high, low)}
+        ])
+        Message.objects.filter(id__in=pair['ids']).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_owner_unread_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pair_key', models.CharField(max_length=50, unique=True)),
+                ('last_activity_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.message')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConversationParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='core.conversation')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to='core.owner')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.owner')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='core.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationparticipant',
+            index=models.Index(fields=['owner', '-last_activity_at', '-id'], name='participant_inbox_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversationparticipant',
+            unique_together={('conversation', 'owner')},
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_conversations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', '-created_at', '-id'], name='message_pair_created_idx'),
+        ),
+    ]
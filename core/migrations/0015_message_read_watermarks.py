@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:03
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    ConversationParticipant = apps.get_model('core', 'ConversationParticipant')
+    Message = apps.get_model('core', 'Message')
+    Owner = apps.get_model('core', 'Owner')
+
+    for participant in ConversationParticipant.objects.iterator():
+        received = Message.objects.filter(
+            conversation_id=participant.conversation_id, receiver_id=participant.owner_id
+        )
+        # Everything before the oldest unread message counts as read
+        read = received.order_by('-created_at', '-id')
+        first_unread = received.filter(is_read=False).order_by('created_at', 'id').first()
+        if first_unread is not None:
+            read = read.filter(
+                Q(created_at__lt=first_unread.created_at) |
+                Q(created_at=first_unread.created_at, id__lt=first_unread.id)
+            )
+        last_read = read.first()
+        if last_read is None:
+            continue
+
+        unread = received.filter(
+            Q(created_at__gt=last_read.created_at) |
+            Q(created_at=last_read.created_at, id__gt=last_read.id)
+        ).count()
+        ConversationParticipant.objects.filter(pk=participant.pk).update(
+            read_through_at=last_read.created_at, read_through_id=last_read.id,
+            last_read_at=last_read.read_at, unread_count=unread
+        )
+        if unread != participant.unread_count:
+            Owner.objects.filter(pk=participant.owner_id).update(
+                unread_message_count=F('unread_message_count') + unread - participant.unread_count
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_message_pair_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='read_through_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='read_through_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='read_at',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    from core.people_search import trigrams
+
+    Owner = apps.get_model('core', 'Owner')
+    SearchTrigram = apps.get_model('core', 'SearchTrigram')
+
+    rows = []
+    for owner in Owner.objects.select_related('user').iterator():
+        user = owner.user
+        rows.extend(
+            SearchTrigram(owner_id=owner.id, trigram=gram)
+            for gram in trigrams(user.username, user.first_name, user.last_name, owner.location, owner.bio)
+        )
+    SearchTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to='core.owner')),
+            ],
+            options={
+                'unique_together': {('trigram', 'owner')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_search_features(apps, schema_editor):
+    from datetime import timedelta
+
+    from django.db.models import Count
+    from django.utils import timezone
+
+    Owner = apps.get_model('core', 'Owner')
+    Post = apps.get_model('core', 'Post')
+    SearchFeatures = apps.get_model('core', 'SearchFeatures')
+
+    now = timezone.now()
+    recent = dict(
+        Post.objects.filter(created_at__gte=now - timedelta(days=30))
+        .values_list('owner_id').annotate(total=Count('id')).order_by()
+    )
+    SearchFeatures.objects.bulk_create([
+        SearchFeatures(
+            owner_id=owner_id, recent_post_count=recent.get(owner_id, 0),
+            activity_score=min(recent.get(owner_id, 0) / 20, 1.0), refreshed_at=now
+        )
+        for owner_id in Owner.objects.values_list('id', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_search_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchFeatures',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_features', serialize=False, to='core.owner')),
+                ('recent_post_count', models.PositiveIntegerField(default=0)),
+                ('activity_score', models.FloatField(default=0.0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(backfill_search_features, migrations.RunPython.noop),
+    ]
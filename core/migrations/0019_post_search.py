@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_post_search(apps, schema_editor):
+    # FTS5 is SQLite only; other databases use core.post_search's icontains fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS core_post_fts USING fts5("
+        "title, content, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_post_fts (rowid, title, content) "
+        "SELECT id, COALESCE(title, ''), content FROM core_post"
+    )
+
+
+def drop_post_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS core_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_search_features'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_post_search, drop_post_search),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_notification_actors(apps, schema_editor):
+    # Only the recent actors of rows that are still unread are known; older ones were counted already
+    Notification = apps.get_model('core', 'Notification')
+    NotificationActor = apps.get_model('core', 'NotificationActor')
+    rows = []
+    for pk, actor_ids in Notification.objects.filter(
+        is_read=False, verb__in=['like', 'comment', 'follow']
+    ).values_list('pk', 'recent_actor_ids').iterator():
+        rows.extend(NotificationActor(notification_id=pk, actor_id=actor_id) for actor_id in actor_ids or [])
+    NotificationActor.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.owner')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folded_actors', to='core.notification')),
+            ],
+            options={
+                'unique_together': {('notification', 'actor')},
+            },
+        ),
+        migrations.RunPython(backfill_notification_actors, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
@@ -14,6 +19,15 @@ class Owner(models.Model):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     is_verified = models.BooleanField(default=False)
     is_private = models.BooleanField(default=False)
+    # Authors above FEED_FANOUT_THRESHOLD followers are pulled at read time instead of fanned out
+    is_high_fanout = models.BooleanField(default=False, db_index=True)
+    # Denormalized profile counters (accepted follows only), maintained by core.counters
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
+    # Unread badges for the navbar, maintained by core.counters and core.signals
+    unread_message_count = models.PositiveIntegerField(default=0)
+    unread_notification_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -31,12 +45,34 @@ class Post(models.Model):
     tags = models.ForeignKey(Owner, on_delete=models.SET_NULL, null=True, blank=True)
     location = models.CharField(max_length=100, blank=True, null=True)
     is_pinned = models.BooleanField(default=False)
+    # Denormalized engagement counters, maintained by core.counters
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    reaction_like_count = models.PositiveIntegerField(default=0)
+    reaction_love_count = models.PositiveIntegerField(default=0)
+    reaction_laugh_count = models.PositiveIntegerField(default=0)
+    reaction_wow_count = models.PositiveIntegerField(default=0)
+    reaction_sad_count = models.PositiveIntegerField(default=0)
+    reaction_angry_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-id'], name='post_owner_created_idx'),
+        ]
+
     def __str__(self):
         return f"Post by {self.owner.user.username} at {self.created_at}"
 
+    @property
+    def reaction_counts(self):
+        """Stored count for each reaction type, keyed by PostLike.REACTION_CHOICES code"""
+        return {
+            reaction: getattr(self, f'reaction_{reaction}_count')
+            for reaction, _ in PostLike.REACTION_CHOICES
+        }
+
 
 
 class PostLike(models.Model):
@@ -64,9 +100,17 @@ class PostLike(models.Model):
 
 
 class PostComment(models.Model):
+    # Materialized path: each level adds a fixed-width base-36 segment of the comment id,
+    # so a subtree is one indexed range scan on path and path order is thread order.
+    PATH_SEGMENT_WIDTH = 8
+    MAX_DEPTH = 20
+
     owner = models.ForeignKey(Owner, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     parent_comment = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    thread_root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='thread_comments')
+    path = models.CharField(max_length=PATH_SEGMENT_WIDTH * (MAX_DEPTH + 1), blank=True, default='')
+    depth = models.PositiveSmallIntegerField(default=0)
     content = models.TextField()
     is_edited = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -74,10 +118,60 @@ class PostComment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'parent_comment', '-created_at', '-id'], name='comment_post_parent_idx'),
+            models.Index(fields=['parent_comment', 'created_at', 'id'], name='comment_replies_idx'),
+            models.Index(fields=['thread_root', 'path'], name='comment_thread_path_idx'),
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.owner.user.username} on {self.post}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            self._assign_path()
+
+    def _assign_path(self):
+        """Derive path, depth and thread root from the parent once the id is known"""
+        segment = self.encode_path_segment(self.id)
+        parent = self.parent_comment
+        if parent is None:
+            self.path, self.depth, self.thread_root_id = segment, 0, None
+        else:
+            self.path = parent.path + segment
+            self.depth = parent.depth + 1
+            self.thread_root_id = parent.thread_root_id or parent.id
+        PostComment.objects.filter(pk=self.pk).update(
+            path=self.path,
+            depth=self.depth,
+            thread_root_id=self.thread_root_id
+        )
+
+    @classmethod
+    def encode_path_segment(cls, pk):
+        """Fixed-width base-36 encoding of an id, so string order matches numeric order"""
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+        segment = ''
+        while pk:
+            pk, remainder = divmod(pk, 36)
+            segment = digits[remainder] + segment
+        return segment.rjust(cls.PATH_SEGMENT_WIDTH, '0')
+
+    @staticmethod
+    def path_range(prefix):
+        """Lookup kwargs selecting every path strictly below prefix as an index range"""
+        # '~' sorts after every base-36 digit
+        return {'path__gt': prefix, 'path__lt': prefix + '~'}
+
+    def subtree(self):
+        """All descendants of this comment in thread (depth-first) order"""
+        return PostComment.objects.filter(
+            post_id=self.post_id,
+            **self.path_range(self.path)
+        ).order_by('path')
+
     @property
     def is_reply(self):
         return self.parent_comment is not None
@@ -112,30 +206,253 @@ class UserFollow(models.Model):
 
 
 class Notification(models.Model):
+    LIKE = 'like'
+    COMMENT = 'comment'
+    REPLY = 'reply'
+    FOLLOW = 'follow'
+    FOLLOWER_REMOVED = 'follower_removed'
+    MESSAGE = 'message'
+    SYSTEM = 'system'
+
+    VERB_CHOICES = [
+        (LIKE, 'Liked your post'),
+        (COMMENT, 'Commented on your post'),
+        (REPLY, 'Replied to a comment'),
+        (FOLLOW, 'Followed you'),
+        (FOLLOWER_REMOVED, 'Removed you as a follower'),
+        (MESSAGE, 'Sent you a message'),
+        (SYSTEM, 'System'),
+    ]
+
+    # Display text per verb; {actor} is the acting user's username
+    VERB_TEMPLATES = {
+        LIKE: '{actor} liked your post',
+        COMMENT: '{actor} commented on your post',
+        REPLY: '{actor} replied to your comment',
+        FOLLOW: '{actor} started following you',
+        FOLLOWER_REMOVED: '{actor} removed you from their followers',
+        MESSAGE: 'New message from {actor}',
+    }
+
+    # Verbs folded into one unread row per (owner, verb, key) inside COALESCE_WINDOW;
+    # follows are grouped per recipient, the others per target (the post, for comments)
+    COALESCE_BY_TARGET = {LIKE, COMMENT}
+    COALESCE_BY_OWNER = {FOLLOW}
+    COALESCE_WINDOW = timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 24 * 60 * 60))
+    RECENT_ACTORS = getattr(settings, 'NOTIFICATION_RECENT_ACTORS', 3)
+
     owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='notifications')
+    verb = models.CharField(max_length=20, choices=VERB_CHOICES, default=SYSTEM)
+    # Most recent actor; coalesced rows also count every actor folded in
+    actor = models.ForeignKey(
+        Owner, on_delete=models.CASCADE, null=True, blank=True, related_name='sent_notifications'
+    )
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actor_ids = models.JSONField(default=list, blank=True)
+    # What the notification is about: a post, comment, follow or message
+    target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    target_object_id = models.PositiveBigIntegerField(null=True, blank=True)
+    target = GenericForeignKey('target_content_type', 'target_object_id')
     title = models.CharField(max_length=200, blank=True, null=True)
     content = models.TextField()
     is_read = models.BooleanField(default=False)
     related_post = models.ForeignKey(Post, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Tab filters: one index range per (owner, verb, is_read)
+            models.Index(fields=['owner', 'verb', 'is_read', '-created_at'], name='notif_owner_verb_idx'),
+            # "All" and "Unread" tabs and unread badges
+            models.Index(fields=['owner', 'is_read', '-created_at'], name='notif_owner_unread_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.owner.user.username}"
-    
-    
+
+    @classmethod
+    def render(cls, verb, actor_names, actor_count=1):
+        """Display text, e.g. "alice liked your post" or "alice and 41 others liked your post"."""
+        if not actor_names:
+            phrase = ''
+        elif actor_count <= 1:
+            phrase = actor_names[0]
+        elif actor_count == 2 and len(actor_names) > 1:
+            phrase = f"{actor_names[0]} and {actor_names[1]}"
+        else:
+            others = actor_count - 1
+            phrase = f"{actor_names[0]} and {others} other{'s' if others > 1 else ''}"
+        return cls.VERB_TEMPLATES.get(verb, '{actor}').format(actor=phrase)
+
+    @classmethod
+    def build(cls, owner, verb, actor=None, target=None, related_post=None, content=None):
+        """Unsaved structured notification; content defaults to the verb's template"""
+        if content is None:
+            content = cls.render(verb, [actor.user.username] if actor is not None else [])
+        notification = cls(
+            owner=owner, verb=verb, actor=actor, related_post=related_post, content=content,
+            recent_actor_ids=[actor.pk] if actor is not None else []
+        )
+        if target is not None:
+            notification.target_content_type = ContentType.objects.get_for_model(target)
+            notification.target_object_id = target.pk
+        return notification
+
+    @classmethod
+    def send(cls, owner, verb, actor=None, target=None, related_post=None, content=None):
+        """
+        Notify owner, unless the actor is notifying themselves.
+        Coalescing verbs fold into the owner's matching unread row when there is one.
+        """
+        if actor is not None and actor.pk == owner.pk:
+            return None
+        if content is None and actor is not None and cls.coalesces(verb):
+            return cls.coalesce(owner, verb, [actor], target, related_post)[0]
+        notification = cls.build(owner, verb, actor, target, related_post, content)
+        notification.save()
+        return notification
+
+    @classmethod
+    def coalesces(cls, verb):
+        return cls.COALESCE_WINDOW.total_seconds() > 0 and (
+            verb in cls.COALESCE_BY_TARGET or verb in cls.COALESCE_BY_OWNER
+        )
+
+    @classmethod
+    def coalesce(cls, owner, verb, actors, target=None, related_post=None):
+        """
+        Fold actors (newest last) into the owner's unread (verb, target) row from
+        the last COALESCE_WINDOW, or start one. Returns (notification, created).
+        Every actor folded into a row is kept in NotificationActor, so an actor who
+        comes back (unlike and like again, re-follow) is not counted twice.
+        """
+        actors = [actor for actor in actors if actor.pk != owner.pk]
+        if not actors:
+            return None, False
+
+        with transaction.atomic():
+            existing = cls.objects.select_for_update().filter(
+                owner=owner, verb=verb, is_read=False,
+                created_at__gte=timezone.now() - cls.COALESCE_WINDOW
+            )
+            if verb in cls.COALESCE_BY_TARGET and target is not None:
+                existing = existing.filter(
+                    target_content_type=ContentType.objects.get_for_model(target),
+                    target_object_id=target.pk
+                )
+            notification = existing.order_by('-created_at').first()
+
+            if notification is None:
+                notification = cls.build(owner, verb, actors[0], target, related_post)
+                notification.actor_count = 0
+                notification.recent_actor_ids = []
+                created, counted = True, set()
+            else:
+                created = False
+                counted = set(NotificationActor.objects.filter(
+                    notification=notification, actor_id__in=[actor.pk for actor in actors]
+                ).values_list('actor_id', flat=True))
+
+            recent = list(notification.recent_actor_ids)
+            added = []
+            for actor in actors:
+                if actor.pk not in counted:
+                    counted.add(actor.pk)
+                    added.append(actor.pk)
+                    notification.actor_count += 1
+                if actor.pk in recent:
+                    recent.remove(actor.pk)
+                recent.insert(0, actor.pk)
+                notification.actor = actor
+            notification.recent_actor_ids = recent[:cls.RECENT_ACTORS]
+
+            names = dict(
+                Owner.objects.filter(pk__in=notification.recent_actor_ids).values_list('pk', 'user__username')
+            )
+            notification.content = cls.render(
+                verb, [names[pk] for pk in notification.recent_actor_ids if pk in names], notification.actor_count
+            )
+            if not created:
+                # Bump the folded row to the top of the list
+                notification.created_at = timezone.now()
+            notification.save()
+            NotificationActor.objects.bulk_create(
+                [NotificationActor(notification=notification, actor_id=pk) for pk in added],
+                ignore_conflicts=True
+            )
+        return notification, created
+
+
+class NotificationActor(models.Model):
+    """An actor folded into a coalesced notification, so each one is counted once"""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='folded_actors')
+    actor = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('notification', 'actor')
+
+
+class Conversation(models.Model):
+    """A one-to-one chat, kept up to date by core.conversations as messages are sent and read"""
+    # "<lower owner id>:<higher owner id>", so each pair has exactly one conversation
+    pair_key = models.CharField(max_length=50, unique=True)
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Conversation {self.pair_key}"
+
+    @staticmethod
+    def key_for(owner_id, other_id):
+        low, high = sorted((owner_id, other_id))
+        return f"{low}:{high}"
+
+
+class ConversationParticipant(models.Model):
+    """One owner's side of a conversation: their inbox row and unread count"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='participants')
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='conversation_memberships')
+    # The other side of the one-to-one chat, so an inbox row needs no extra lookup
+    partner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='+')
+    unread_count = models.PositiveIntegerField(default=0)
+    # Copy of Conversation.last_activity_at so the inbox is a single index range per owner
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    # Read watermark: every message received up to (read_through_at, read_through_id) is read
+    read_through_at = models.DateTimeField(null=True, blank=True)
+    read_through_id = models.BigIntegerField(default=0)
+    # When the watermark last moved forward
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('conversation', 'owner')
+        indexes = [
+            models.Index(fields=['owner', '-last_activity_at', '-id'], name='participant_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} in {self.conversation}"
+
 
 class Message(models.Model):
     sender = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='received_messages')
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name='messages'
+    )
     content = models.TextField(blank=True)
     attachment = models.FileField(upload_to='message_attachments/', blank=True, null=True)
-    is_read = models.BooleanField(default=False)
-    read_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Chat history: each direction of a pair is one index range, newest first
+            models.Index(fields=['sender', 'receiver', '-created_at', '-id'], name='message_pair_created_idx'),
+        ]
 
     def __str__(self):
         return f"From {self.sender.user.username} to {self.receiver.user.username} at {self.created_at}"
@@ -156,12 +473,40 @@ class Message(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
         
+    def read_watermark(self):
+        """The receiver's (read_through_at, read_through_id, last_read_at), loaded once per instance"""
+        if not hasattr(self, '_read_watermark'):
+            if hasattr(self, 'receiver_read_through_at'):
+                # Annotated by conversations.with_read_watermarks()
+                self._read_watermark = (
+                    self.receiver_read_through_at, self.receiver_read_through_id, self.receiver_last_read_at
+                )
+            else:
+                self._read_watermark = ConversationParticipant.objects.filter(
+                    conversation_id=self.conversation_id, owner_id=self.receiver_id
+                ).values_list('read_through_at', 'read_through_id', 'last_read_at').first()
+        return self._read_watermark
+
+    @property
+    def is_read(self):
+        """Whether the receiver's read watermark has passed this message"""
+        watermark = self.read_watermark()
+        if self.pk is None or not watermark or watermark[0] is None:
+            return False
+        return (self.created_at, self.pk) <= (watermark[0], watermark[1])
+
+    @property
+    def read_at(self):
+        """When the receiver's watermark last moved, if it covers this message"""
+        return self.read_watermark()[2] if self.is_read else None
+
     def mark_as_read(self):
-        """Mark message as read and set read timestamp"""
+        """Move the receiver's read watermark up to this message"""
+        from .conversations import set_read_watermark
+
         if not self.is_read:
-            self.is_read = True
-            self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            set_read_watermark(self.conversation_id, self.receiver_id, (self.created_at, self.pk))
+            del self._read_watermark
         
     @classmethod
     def start_chat(cls, sender, receiver, initial_message):
@@ -174,13 +519,126 @@ class Message(models.Model):
             receiver=receiver,
             content=initial_message
         )
-        message.save()
-        
-        # Create a notification for the receiver
-        Notification.objects.create(
-            owner=receiver,
-            content=f"New message from {sender.user.username}",
-            is_read=False
-        )
+        with transaction.atomic():
+            message.save()
+            
+            # Queue a notification for the receiver
+            OutboxEvent.notify(receiver.pk, Notification.MESSAGE, actor_id=sender.pk, target=message)
         
-        return message
\ No newline at end of file
+        return message
+
+
+class TimelineEntry(models.Model):
+    """Materialized home feed row: one per (viewer, post) pushed on write."""
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of {self.owner_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Side effect recorded in the same transaction as the write that caused it
+    and carried out later by the process_outbox worker (see core.outbox).
+    """
+    NOTIFICATION = 'notification'
+
+    KIND_CHOICES = [
+        (NOTIFICATION, 'Notification'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Not handed to a worker before this time: leases while claimed, backoff after failures
+    available_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+            models.Index(fields=['claim_token'], name='outbox_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} event {self.pk}"
+
+    @classmethod
+    def notify(cls, owner_id, verb, actor_id=None, target=None, related_post_id=None, content=None):
+        """
+        Queue a Notification for owner_id; call inside the write's transaction.
+        Only ids go into the payload, so producers never touch related rows.
+        """
+        if actor_id is not None and actor_id == owner_id:
+            return None
+        payload = {
+            'owner': owner_id,
+            'verb': verb,
+            'actor': actor_id,
+            'related_post': related_post_id,
+            'content': content,
+        }
+        if target is not None:
+            payload['target_type'] = ContentType.objects.get_for_model(target).pk
+            payload['target_id'] = target.pk
+        return cls.objects.create(kind=cls.NOTIFICATION, payload=payload)
+
+
+class SearchTrigram(models.Model):
+    """
+    Inverted index row for people search: owner's username, name, location or
+    bio contains trigram. Maintained by core.people_search.
+    """
+    trigram = models.CharField(max_length=3)
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='search_trigrams')
+
+    class Meta:
+        unique_together = ('trigram', 'owner')
+
+    def __str__(self):
+        return f"{self.trigram!r} -> {self.owner_id}"
+
+
+class SearchFeatures(models.Model):
+    """
+    Precomputed people search ranking inputs for one owner, maintained by
+    core.people_search as posts are created and deleted. Follower and
+    following counts are the Owner counters.
+    """
+    owner = models.OneToOneField(Owner, on_delete=models.CASCADE, primary_key=True, related_name='search_features')
+    # Posts in the last SEARCH_RECENT_DAYS days
+    recent_post_count = models.PositiveIntegerField(default=0)
+    # Activity term of the ranking, min(recent posts / SEARCH_FULL_ACTIVITY_POSTS, 1)
+    activity_score = models.FloatField(default=0.0)
+    # Posts age out of the window, so rows older than SEARCH_FEATURES_MAX_AGE are recounted
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Search features of {self.owner_id}"
+
+
+class MediaBlob(models.Model):
+    """
+    One stored copy of an uploaded file's bytes, shared by every upload with the
+    same content (see core.storage). ref_count is the number of media names
+    linked to it; the blob is removed when the last one is deleted.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.ref_count} refs)"
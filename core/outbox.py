@@ -0,0 +1,169 @@
+"""
+Transactional outbox worker for the Barta social media application.
+Write views only insert OutboxEvent rows inside their own transaction; the
+process_outbox command claims pending events in batches, hands disjoint
+slices to a thread pool and carries them out with bulk writes. Delivered
+events are deleted, failed ones are retried with backoff until
+OUTBOX_MAX_ATTEMPTS.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .counters import count_bulk_notifications
+from .models import Notification, OutboxEvent, Owner, Post
+
+
+logger = logging.getLogger(__name__)
+
+# Events claimed per round
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 500)
+
+# Worker threads a claimed batch is split across
+OUTBOX_WORKER_THREADS = getattr(settings, 'OUTBOX_WORKER_THREADS', 4)
+
+# Failed events are retried with exponential backoff this many times
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+
+# Seconds a claimed event stays hidden from other workers
+OUTBOX_LEASE_SECONDS = getattr(settings, 'OUTBOX_LEASE_SECONDS', 60)
+
+
+def pending_events():
+    return OutboxEvent.objects.filter(
+        available_at__lte=timezone.now(), attempts__lt=OUTBOX_MAX_ATTEMPTS
+    )
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, lease_seconds=OUTBOX_LEASE_SECONDS):
+    """
+    Lease up to batch_size pending events to this worker and return them.
+    The lease is a conditional UPDATE, so concurrent workers never share an event.
+    """
+    now = timezone.now()
+    ids = list(
+        pending_events().order_by('available_at', 'id').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    OutboxEvent.objects.filter(id__in=ids, available_at__lte=now).update(
+        available_at=now + timedelta(seconds=lease_seconds), claim_token=token
+    )
+    return list(OutboxEvent.objects.filter(claim_token=token).order_by('id'))
+
+
+def deliver_notifications(events):
+    """
+    Create the notifications for a list of events with a fixed number of queries.
+    Coalescing verbs are folded per (owner, verb, target); the rest are bulk inserted.
+    """
+    payloads = [event.payload for event in events]
+    owner_ids = {p['owner'] for p in payloads} | {p['actor'] for p in payloads if p.get('actor')}
+    owners = Owner.objects.select_related('user').in_bulk(owner_ids)
+    posts = Post.objects.in_bulk({p['related_post'] for p in payloads if p.get('related_post')})
+
+    target_ids = defaultdict(set)
+    for p in payloads:
+        if p.get('target_type'):
+            target_ids[p['target_type']].add(p['target_id'])
+    targets = {}
+    for type_id, ids in target_ids.items():
+        model = ContentType.objects.get_for_id(type_id).model_class()
+        for pk, obj in model.objects.in_bulk(ids).items():
+            targets[(type_id, pk)] = obj
+
+    singles, folds = [], defaultdict(list)
+    for p in payloads:
+        owner = owners.get(p['owner'])
+        actor = owners.get(p.get('actor'))
+        if owner is None:
+            continue
+        target = targets.get((p.get('target_type'), p.get('target_id')))
+        related_post = posts.get(p.get('related_post'))
+        if actor is not None and p.get('content') is None and Notification.coalesces(p['verb']):
+            key = (owner.pk, p['verb'], p.get('target_type'), p.get('target_id'))
+            folds[key].append((owner, actor, target, related_post))
+        else:
+            singles.append(Notification.build(owner, p['verb'], actor, target, related_post, p.get('content')))
+
+    Notification.objects.bulk_create(singles)
+    count_bulk_notifications(singles)
+    for (_, verb, _, _), entries in folds.items():
+        owner, _, target, related_post = entries[0]
+        Notification.coalesce(owner, verb, [actor for _, actor, _, _ in entries], target, related_post)
+
+
+HANDLERS = {
+    OutboxEvent.NOTIFICATION: deliver_notifications,
+}
+
+
+def process_events(events):
+    """Carry out a slice of claimed events; returns the number delivered"""
+    by_kind = defaultdict(list)
+    for event in events:
+        by_kind[event.kind].append(event)
+
+    delivered = 0
+    for kind, kind_events in by_kind.items():
+        ids = [event.id for event in kind_events]
+        try:
+            with transaction.atomic():
+                HANDLERS[kind](kind_events)
+                OutboxEvent.objects.filter(id__in=ids).delete()
+            delivered += len(ids)
+        except Exception as e:
+            logger.exception("Outbox %s events failed", kind)
+            # Back off 2, 4, 8... seconds per failed attempt
+            for event in kind_events:
+                OutboxEvent.objects.filter(pk=event.pk).update(
+                    attempts=F('attempts') + 1,
+                    available_at=timezone.now() + timedelta(seconds=2 ** (event.attempts + 1)),
+                    claim_token='',
+                    last_error=repr(e)
+                )
+    return delivered
+
+
+def _process_in_thread(events):
+    try:
+        return process_events(events)
+    finally:
+        close_old_connections()
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE, threads=OUTBOX_WORKER_THREADS, max_batches=None):
+    """
+    Process pending events until none are left (or max_batches rounds).
+    Events for one recipient stay on one thread so coalescing never races.
+    Returns the number of events delivered.
+    """
+    delivered = 0
+    rounds = 0
+    while max_batches is None or rounds < max_batches:
+        events = claim_batch(batch_size)
+        if not events:
+            break
+        rounds += 1
+
+        if threads <= 1:
+            delivered += process_events(events)
+            continue
+
+        slices = defaultdict(list)
+        for event in events:
+            slices[hash(event.payload.get('owner')) % threads].append(event)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            delivered += sum(executor.map(_process_in_thread, slices.values()))
+    return delivered
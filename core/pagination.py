@@ -0,0 +1,53 @@
+"""
+Keyset (cursor) pagination helpers for the Barta social media application.
+Pages are keyed on (created_at, id) so fetching an older page is an index
+seek rather than an OFFSET scan, no matter how deep the user scrolls.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+# Number of posts per home feed / profile page
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 10)
+
+
+def encode_cursor(created_at, pk):
+    """Encode a (created_at, id) position as an opaque URL-safe cursor"""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (created_at, id); return None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_before(queryset, position, created_field='created_at', id_field='id'):
+    """Restrict a newest-first queryset to rows strictly older than position"""
+    if position is None:
+        return queryset
+    created_at, pk = position
+    return queryset.filter(
+        Q(**{f'{created_field}__lt': created_at}) |
+        Q(**{created_field: created_at, f'{id_field}__lt': pk})
+    )
+
+
+def next_cursor(items, page_size, created_field='created_at', id_field='id'):
+    """Return the cursor for the page after items, or None when it is the last one"""
+    if len(items) < page_size:
+        return None
+    last = items[-1]
+    return encode_cursor(getattr(last, created_field), getattr(last, id_field))
@@ -0,0 +1,230 @@
+"""
+People search for the Barta social media application.
+A persistent trigram inverted index (SearchTrigram) covers each owner's
+username, full name, location and bio and is kept current by signals on
+User and Owner. A query first looks up owners sharing enough trigrams with
+it, a handful of indexed rows, and only those candidates are fuzzy-scored
+in one batch by core.scoring. Their social ranking inputs come from the
+Owner counters and SearchFeatures rows plus one grouped mutual-follow
+query, so a search costs the same few queries however many match.
+"""
+
+import math
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Value
+from django.db.models.functions import Cast, Greatest, Least
+from django.utils import timezone
+
+from .models import Owner, Post, SearchFeatures, SearchTrigram, UserFollow
+from .scoring import score_people
+
+
+# Owners handed to the fuzzy scorer per query
+PEOPLE_SEARCH_CANDIDATES = getattr(settings, 'PEOPLE_SEARCH_CANDIDATES', 200)
+
+# Share of the query's trigrams a candidate must contain; low enough to survive a typo or two
+PEOPLE_SEARCH_MIN_OVERLAP = getattr(settings, 'PEOPLE_SEARCH_MIN_OVERLAP', 0.3)
+
+# Window of the recent post count
+SEARCH_RECENT_DAYS = getattr(settings, 'SEARCH_RECENT_DAYS', 30)
+
+# Recent posts at which the activity score reaches 1
+SEARCH_FULL_ACTIVITY_POSTS = getattr(settings, 'SEARCH_FULL_ACTIVITY_POSTS', 20)
+
+# Seconds before a feature row is recounted so old posts leave the window
+SEARCH_FEATURES_MAX_AGE = getattr(settings, 'SEARCH_FEATURES_MAX_AGE', 24 * 3600)
+
+WORD_RE = re.compile(r'\w+')
+
+
+def trigrams(*texts):
+    """
+    The set of trigrams of the words in texts, lowercased.
+    Words are padded like pg_trgm ("  ab", " ab ") so short words and word
+    starts get trigrams of their own.
+    """
+    grams = set()
+    for text in texts:
+        for word in WORD_RE.findall((text or '').lower()):
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def owner_trigrams(owner):
+    user = owner.user
+    return trigrams(user.username, user.first_name, user.last_name, owner.location, owner.bio)
+
+
+def index_owner(owner):
+    """Bring the owner's index rows in line with their profile; only the difference is written"""
+    wanted = owner_trigrams(owner)
+    with transaction.atomic():
+        stored = set(SearchTrigram.objects.filter(owner=owner).values_list('trigram', flat=True))
+        if stored - wanted:
+            SearchTrigram.objects.filter(owner=owner, trigram__in=stored - wanted).delete()
+        SearchTrigram.objects.bulk_create(
+            [SearchTrigram(owner=owner, trigram=gram) for gram in wanted - stored],
+            ignore_conflicts=True
+        )
+
+
+def rebuild_index(owners=None, batch_size=1000):
+    """Rebuild the whole index (or the given owners'); returns the number of owners indexed"""
+    if owners is None:
+        owners = Owner.objects.all()
+    indexed = 0
+    with transaction.atomic():
+        SearchTrigram.objects.filter(owner__in=owners).delete()
+        rows = []
+        for owner in owners.select_related('user').iterator():
+            rows.extend(SearchTrigram(owner=owner, trigram=gram) for gram in owner_trigrams(owner))
+            indexed += 1
+            if len(rows) >= batch_size:
+                SearchTrigram.objects.bulk_create(rows)
+                rows = []
+        SearchTrigram.objects.bulk_create(rows)
+    return indexed
+
+
+def activity_score(recent_post_count):
+    return min(recent_post_count / SEARCH_FULL_ACTIVITY_POSTS, 1.0)
+
+
+def adjust_recent_posts(owner_id, created_at, delta):
+    """Count a post created (delta=1) or deleted (delta=-1) in the owner's search features"""
+    if created_at < timezone.now() - timedelta(days=SEARCH_RECENT_DAYS):
+        return
+    recent = Greatest(F('recent_post_count') + delta, Value(0))
+    updated = SearchFeatures.objects.filter(owner_id=owner_id).update(
+        recent_post_count=recent,
+        activity_score=Least(
+            Cast(recent, FloatField()) / Value(float(SEARCH_FULL_ACTIVITY_POSTS)), Value(1.0)
+        ),
+    )
+    if not updated:
+        refresh_features([owner_id])
+
+
+def refresh_features(owner_ids):
+    """
+    Recount the recent posts of the given owners in one grouped query and store them.
+    Returns {owner_id: SearchFeatures}.
+    """
+    owner_ids = list(owner_ids)
+    now = timezone.now()
+    recent = dict(
+        Post.objects.filter(owner_id__in=owner_ids, created_at__gte=now - timedelta(days=SEARCH_RECENT_DAYS))
+        .values_list('owner_id').annotate(total=Count('id')).order_by()
+    )
+    features = SearchFeatures.objects.in_bulk(owner_ids)
+    existing = list(features.values())
+    missing = []
+    for owner_id in owner_ids:
+        row = features.get(owner_id)
+        if row is None:
+            row = features[owner_id] = SearchFeatures(owner_id=owner_id)
+            missing.append(row)
+        row.recent_post_count = recent.get(owner_id, 0)
+        row.activity_score = activity_score(row.recent_post_count)
+        row.refreshed_at = now
+
+    SearchFeatures.objects.bulk_create(missing, ignore_conflicts=True)
+    SearchFeatures.objects.bulk_update(
+        existing, ['recent_post_count', 'activity_score', 'refreshed_at'], batch_size=500
+    )
+    return features
+
+
+def refresh_stale_features(batch_size=1000):
+    """Recount every feature row older than SEARCH_FEATURES_MAX_AGE; returns how many were refreshed"""
+    cutoff = timezone.now() - timedelta(seconds=SEARCH_FEATURES_MAX_AGE)
+    stale = Owner.objects.exclude(search_features__refreshed_at__gte=cutoff).values_list('id', flat=True)
+    refreshed = 0
+    ids = list(stale)
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            refreshed += len(refresh_features(ids[start:start + batch_size]))
+    return refreshed
+
+
+def candidate_ids(query, exclude_ids=(), limit=PEOPLE_SEARCH_CANDIDATES):
+    """Ids of the owners sharing the most trigrams with query, best first"""
+    grams = trigrams(query)
+    if not grams:
+        return []
+    min_hits = max(1, math.ceil(len(grams) * PEOPLE_SEARCH_MIN_OVERLAP))
+    return list(
+        SearchTrigram.objects.filter(trigram__in=grams).exclude(owner_id__in=exclude_ids)
+        .values_list('owner_id', flat=True).annotate(hits=Count('id'))
+        .filter(hits__gte=min_hits).order_by('-hits', 'owner_id')[:limit]
+    )
+
+
+def load_social_features(viewer_following, candidates):
+    """
+    {owner_id: (follows, mutuals, activity)} for the candidates, which must have
+    search_features selected. Stale or missing feature rows are recounted together
+    and mutual counts come from one grouped query. Also sets person.mutual_count
+    and person.recent_post_count for display.
+    """
+    cutoff = timezone.now() - timedelta(seconds=SEARCH_FEATURES_MAX_AGE)
+    features = {}
+    stale = []
+    for person in candidates:
+        try:
+            row = person.search_features
+        except SearchFeatures.DoesNotExist:
+            row = None
+        if row is None or row.refreshed_at < cutoff:
+            stale.append(person.id)
+        else:
+            features[person.id] = row
+    if stale:
+        features.update(refresh_features(stale))
+
+    mutuals = {}
+    if viewer_following and candidates:
+        mutuals = dict(
+            UserFollow.objects.filter(
+                following_id__in=[person.id for person in candidates], follower_id__in=viewer_following
+            ).values_list('following_id').annotate(total=Count('id')).order_by()
+        )
+
+    social = {}
+    for person in candidates:
+        row = features[person.id]
+        person.mutual_count = mutuals.get(person.id, 0)
+        person.recent_post_count = row.recent_post_count
+        social[person.id] = (
+            person.follower_count + person.following_count, person.mutual_count, row.activity_score
+        )
+    return social
+
+
+def search_people(viewer, query):
+    """
+    Return [(owner, score)] for the people matching query that viewer does not
+    follow yet, best first. Only owners found through the trigram index are scored;
+    each returned owner carries mutual_count and recent_post_count.
+    """
+    viewer_following = set(UserFollow.objects.filter(
+        follower=viewer
+    ).values_list('following_id', flat=True))
+    
+    ids = candidate_ids(query, exclude_ids=viewer_following | {viewer.id})
+    candidates = list(Owner.objects.filter(id__in=ids).select_related('user', 'search_features'))
+    
+    # The whole candidate set is scored in one batch (core.scoring)
+    scores = score_people(candidates, query, load_social_features(viewer_following, candidates))
+    scored_users = [
+        (person, score) for person, score in zip(candidates, scores)
+        if score > 0.1  # Only include users with meaningful similarity
+    ]
+    
+    scored_users.sort(key=lambda x: x[1], reverse=True)
+    return scored_users
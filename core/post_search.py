@@ -0,0 +1,186 @@
+"""
+Post search for the Barta social media application.
+Post titles and contents are mirrored into an SQLite FTS5 table
+(core_post_fts, rowid = post id) by signals on Post, so a search is one
+indexed MATCH ranked by BM25 with a highlighted snippet per hit instead of a
+LIKE '%x%' scan. Private authors' posts only show up for their accepted
+followers. Pages are keyed on (rank, id) like the feeds are on
+(created_at, id). Databases without FTS5 fall back to a newest-first
+icontains search.
+"""
+
+import base64
+import binascii
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post, UserFollow
+
+
+# Results per search page
+POST_SEARCH_PAGE_SIZE = getattr(settings, 'POST_SEARCH_PAGE_SIZE', 10)
+
+# Words of context around the matches in a result snippet
+POST_SEARCH_SNIPPET_WORDS = getattr(settings, 'POST_SEARCH_SNIPPET_WORDS', 16)
+
+# BM25 weight of a title match relative to a content match
+POST_SEARCH_TITLE_WEIGHT = getattr(settings, 'POST_SEARCH_TITLE_WEIGHT', 2.0)
+
+FTS_TABLE = 'core_post_fts'
+
+TERM_RE = re.compile(r'\w+')
+
+# Highlight markers FTS5 puts around matches; swapped for <mark> after escaping
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    """Write the post's current title and content to the search table"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)',
+            [post.pk, post.title or '', post.content]
+        )
+
+
+def unindex_post(post_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild_post_index():
+    """Refill the search table from Post; returns the number of posts indexed"""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content) "
+            "SELECT id, COALESCE(title, ''), content FROM core_post"
+        )
+        return cursor.rowcount
+
+
+def match_expression(query):
+    """
+    An FTS5 MATCH expression finding posts with every word of query.
+    Words are quoted so user input can never be read as FTS5 syntax; the last one
+    also matches as a prefix. Returns '' when query has no words.
+    """
+    terms = TERM_RE.findall(query.lower())
+    if not terms:
+        return ''
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def encode_rank_cursor(rank, pk):
+    raw = f"{rank!r}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    """Decode a search cursor back into (rank, id); return None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        rank, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    """Escape an FTS5 snippet and turn its match markers into <mark> tags"""
+    return mark_safe(escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+def search_posts(viewer, query, after=None, limit=POST_SEARCH_PAGE_SIZE):
+    """
+    Return (posts, next_cursor) for a page of the posts matching query that viewer
+    may see, best match first. Each post carries search_rank (BM25, lower is better)
+    and search_snippet (safe HTML). after is a decoded cursor from the previous page.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    if not fts_available():
+        return fallback_search(viewer, query, after, limit)
+
+    position = after or (float('-inf'), 0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT hit.id, hit.rank, hit.snippet
+            FROM (
+                SELECT rowid AS id,
+                       bm25({FTS_TABLE}, %s, 1.0) AS rank,
+                       snippet({FTS_TABLE}, -1, %s, %s, '…', %s) AS snippet
+                FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH %s
+            ) AS hit
+            JOIN core_post AS post ON post.id = hit.id
+            JOIN core_owner AS author ON author.id = post.owner_id
+            WHERE (hit.rank > %s OR (hit.rank = %s AND hit.id > %s))
+              AND (author.is_private = 0 OR author.id = %s OR EXISTS (
+                  SELECT 1 FROM core_userfollow AS follow
+                  WHERE follow.follower_id = %s AND follow.following_id = author.id
+                    AND follow.status = 'accepted'
+              ))
+            ORDER BY hit.rank, hit.id
+            LIMIT %s
+            """,
+            [
+                POST_SEARCH_TITLE_WEIGHT, MATCH_START, MATCH_END, POST_SEARCH_SNIPPET_WORDS,
+                expression, position[0], position[0], position[1], viewer.id, viewer.id, limit,
+            ]
+        )
+        hits = cursor.fetchall()
+
+    posts = Post.objects.select_related('owner__user').in_bulk([pk for pk, _, _ in hits])
+    page = []
+    for pk, rank, snippet in hits:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.search_rank = rank
+        post.search_snippet = highlight(snippet)
+        page.append(post)
+
+    cursor = None
+    if len(hits) == limit:
+        pk, rank, _ = hits[-1]
+        cursor = encode_rank_cursor(rank, pk)
+    return page, cursor
+
+
+def fallback_search(viewer, query, after, limit):
+    """icontains search for databases without FTS5; every hit ranks 0, newest first"""
+    visible = Post.objects.filter(
+        Q(owner__is_private=False) | Q(owner=viewer) |
+        Q(owner__in=UserFollow.objects.filter(follower=viewer, status='accepted').values('following_id'))
+    )
+    for term in TERM_RE.findall(query):
+        visible = visible.filter(Q(title__icontains=term) | Q(content__icontains=term))
+    if after is not None:
+        visible = visible.filter(id__lt=after[1])
+    page = list(visible.select_related('owner__user').order_by('-id')[:limit])
+    for post in page:
+        post.search_rank = 0.0
+        post.search_snippet = escape(post.content[:200])
+    cursor = encode_rank_cursor(0.0, page[-1].id) if len(page) == limit else None
+    return page, cursor
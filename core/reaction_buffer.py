@@ -0,0 +1,368 @@
+"""
+Write-coalescing reaction buffer for the Barta social media application.
+During a burst of like/unlike clicks each click only records the owner's
+desired final reaction in memory (and in a write-ahead file), so repeated
+flips by the same owner collapse into a single row change. Every
+REACTION_BUFFER_INTERVAL seconds the pending reactions are written to
+PostLike, the post counters and one coalesced notification per post in a
+single batched transaction. A write-ahead file per process is replayed on startup, so a
+crash loses nothing that was acknowledged to the client.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .counters import count_bulk_notifications, reaction_count_field
+from .models import Notification, Owner, Post, PostLike
+from .reactions import REACTION_TYPES
+
+
+logger = logging.getLogger(__name__)
+
+# Buffering is off unless a deployment opts in; reactions are then written inline
+REACTION_BUFFER_ENABLED = getattr(settings, 'REACTION_BUFFER_ENABLED', False)
+
+# Seconds between flushes while reactions are pending
+REACTION_BUFFER_INTERVAL = getattr(settings, 'REACTION_BUFFER_INTERVAL', 0.5)
+
+# Flush early once this many (owner, post) pairs are pending
+REACTION_BUFFER_MAX_PENDING = getattr(settings, 'REACTION_BUFFER_MAX_PENDING', 1000)
+
+# Directory holding one write-ahead file per process
+REACTION_BUFFER_WAL_DIR = getattr(
+    settings, 'REACTION_BUFFER_WAL_DIR', os.path.join(settings.BASE_DIR, 'var', 'reactions')
+)
+
+
+def write_reactions(desired):
+    """
+    Apply {(owner_id, post_id): reaction_type or None} in one transaction.
+    Rows are created, switched and deleted in bulk, each post's counters get a
+    single F() update and new reactions notify the post owner.
+    Returns the number of reactions that actually changed.
+    """
+    if not desired:
+        return 0
+
+    owner_ids = {owner_id for owner_id, _ in desired}
+    post_ids = {post_id for _, post_id in desired}
+
+    with transaction.atomic():
+        existing = {
+            (like.owner_id, like.post_id): like
+            for like in PostLike.objects.filter(
+                owner_id__in=owner_ids, post_id__in=post_ids
+            ).only('id', 'owner_id', 'post_id', 'reaction_type')
+        }
+        post_owners = dict(
+            Post.objects.filter(id__in=post_ids).values_list('id', 'owner_id')
+        )
+
+        creates, deletes = [], []
+        switches = defaultdict(list)
+        deltas = defaultdict(lambda: defaultdict(int))
+        for (owner_id, post_id), target in desired.items():
+            if post_id not in post_owners:
+                continue
+            like = existing.get((owner_id, post_id))
+            current = like.reaction_type if like else None
+            if current == target:
+                continue
+
+            if current is None:
+                creates.append(PostLike(owner_id=owner_id, post_id=post_id, reaction_type=target))
+                deltas[post_id]['like_count'] += 1
+            elif target is None:
+                deletes.append(like.id)
+                deltas[post_id]['like_count'] -= 1
+            else:
+                switches[target].append(like.id)
+            if current is not None:
+                deltas[post_id][reaction_count_field(current)] -= 1
+            if target is not None:
+                deltas[post_id][reaction_count_field(target)] += 1
+
+        PostLike.objects.bulk_create(creates)
+        PostLike.objects.filter(id__in=deletes).delete()
+        now = timezone.now()
+        for reaction_type, like_ids in switches.items():
+            PostLike.objects.filter(id__in=like_ids).update(reaction_type=reaction_type, updated_at=now)
+
+        for post_id, fields in deltas.items():
+            changes = {field: F(field) + delta for field, delta in fields.items() if delta}
+            if changes:
+                Post.objects.filter(pk=post_id).update(**changes)
+
+        notify = defaultdict(list)
+        for like in creates:
+            notify[like.post_id].append(like.owner_id)
+        if notify:
+            actors = Owner.objects.select_related('user').in_bulk(
+                {owner_id for owner_ids in notify.values() for owner_id in owner_ids}
+            )
+            posts = Post.objects.select_related('owner').in_bulk(list(notify))
+            for post_id, owner_ids in notify.items():
+                post = posts[post_id]
+                post_actors = [actors[owner_id] for owner_id in owner_ids]
+                if Notification.coalesces(Notification.LIKE):
+                    # One folded "alice and N others liked your post" row per post
+                    Notification.coalesce(post.owner, Notification.LIKE, post_actors, post, post)
+                else:
+                    notifications = Notification.objects.bulk_create([
+                        Notification.build(post.owner, Notification.LIKE, actor, post, post)
+                        for actor in post_actors if actor.pk != post.owner_id
+                    ])
+                    count_bulk_notifications(notifications)
+
+    return len(creates) + len(deletes) + sum(len(ids) for ids in switches.values())
+
+
+def read_wal(path):
+    """Collapse a write-ahead file into {(owner_id, post_id): reaction}, last write wins"""
+    desired = {}
+    with open(path) as wal:
+        for line in wal:
+            try:
+                record = json.loads(line)
+                desired[(record['o'], record['p'])] = record['r']
+            except (ValueError, KeyError, TypeError):
+                # A torn final line from a crash mid-append is skipped
+                continue
+    return desired
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Journals of one process, oldest records first: the batch being flushed, an
+# interrupted rewrite of the pending state, then clicks made after both
+WAL_SUFFIXES = ('.wal.flushing', '.wal.tmp', '.wal')
+
+
+def recover_wal_files(wal_dir=None, include_live=False):
+    """
+    Replay the write-ahead files left behind by processes that are gone.
+    A process's journals are merged oldest first so its newest record for each
+    (owner, post) wins, and written in one batch before they are removed.
+    Returns the number of reactions that changed.
+    """
+    wal_dir = wal_dir or REACTION_BUFFER_WAL_DIR
+    journals = defaultdict(dict)
+    for path in glob.glob(os.path.join(wal_dir, 'reactions-*.wal*')):
+        name = os.path.basename(path)
+        try:
+            pid = int(name.split('-')[1].split('.')[0])
+            suffix = name[name.index('.'):]
+        except ValueError:
+            continue
+        if suffix in WAL_SUFFIXES:
+            journals[pid][suffix] = path
+
+    changed = 0
+    for pid, paths in sorted(journals.items()):
+        if pid == os.getpid() or (not include_live and pid_alive(pid)):
+            continue
+        desired = {}
+        for suffix in WAL_SUFFIXES:
+            if suffix in paths:
+                desired.update(read_wal(paths[suffix]))
+        changed += write_reactions(desired)
+        for path in paths.values():
+            os.remove(path)
+    return changed
+
+
+class ReactionBuffer:
+    """
+    Coalesces reaction writes for one process.
+    submit() records the desired end state of an (owner, post) pair; flush()
+    writes everything pending in one batch. Every submit is appended and
+    fsynced to the write-ahead file before it is acknowledged.
+    """
+
+    def __init__(self, wal_dir=None, interval=REACTION_BUFFER_INTERVAL,
+                 max_pending=REACTION_BUFFER_MAX_PENDING, autoflush=True):
+        self.wal_dir = wal_dir or REACTION_BUFFER_WAL_DIR
+        self.interval = interval
+        self.max_pending = max_pending
+        self.autoflush = autoflush
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self.wal_path = os.path.join(self.wal_dir, f'reactions-{os.getpid()}.wal')
+
+        # (owner_id, post_id) -> [stored reaction when first buffered, desired reaction]
+        self._pending = {}
+        # The batch flush() is writing, still visible to submit() and pending_summary()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._wal = open(self.wal_path, 'a')
+
+    def submit(self, owner, post, reaction_type, toggle=True):
+        """
+        Buffer a set/switch/clear of the owner's reaction, same semantics as
+        apply_reaction. Returns (previous_reaction, new_reaction).
+        """
+        if reaction_type is not None and reaction_type not in REACTION_TYPES:
+            raise ValueError(f"Unknown reaction type: {reaction_type}")
+
+        key = (owner.id, post.id)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None and key in self._inflight:
+                # The in-flight batch has not committed yet; its target is what will be stored
+                stored = self._inflight[key][1]
+                entry = [stored, stored]
+            elif entry is None:
+                stored = PostLike.objects.filter(
+                    owner_id=owner.id, post_id=post.id
+                ).values_list('reaction_type', flat=True).first()
+                entry = [stored, stored]
+            current = entry[1]
+
+            target = reaction_type
+            if toggle and current is not None and current == reaction_type:
+                target = None
+            if current == target:
+                return current, target
+
+            self._wal.write(json.dumps({'o': key[0], 'p': key[1], 'r': target}) + '\n')
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            entry[1] = target
+            self._pending[key] = entry
+            pending = len(self._pending)
+            self._schedule()
+
+        if self.autoflush and pending >= self.max_pending:
+            self.flush()
+        return current, target
+
+    def pending_summary(self, post_id, summary):
+        """Adjust a reaction_summary() payload by the reactions still buffered or being written for the post"""
+        with self._lock:
+            entries = [
+                entry for batch in (self._inflight, self._pending)
+                for (_, pid), entry in batch.items() if pid == post_id
+            ]
+
+        counts = dict(summary['reaction_counts'])
+        like_count = summary['like_count']
+        for stored, desired in entries:
+            if stored == desired:
+                continue
+            if stored is not None:
+                counts[stored] -= 1
+                like_count -= 1
+            if desired is not None:
+                counts[desired] += 1
+                like_count += 1
+        return {'like_count': like_count, 'reaction_counts': counts}
+
+    def flush(self):
+        """Write all pending reactions; returns the number that changed"""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                # New submits go to a fresh file while this batch is written
+                self._wal.close()
+                flushing_path = self.wal_path + '.flushing'
+                os.replace(self.wal_path, flushing_path)
+                self._wal = open(self.wal_path, 'a')
+
+            try:
+                changed = write_reactions({key: entry[1] for key, entry in batch.items()})
+            except Exception:
+                logger.exception("Reaction flush failed; %d reactions kept for retry", len(batch))
+                with self._lock:
+                    self._inflight = {}
+                    for key, entry in batch.items():
+                        if key in self._pending:
+                            # Newer clicks were based on the failed batch; the stored state is the batch's
+                            self._pending[key][0] = entry[0]
+                        else:
+                            self._pending[key] = entry
+                    self._rewrite_wal()
+                    os.remove(flushing_path)
+                    self._schedule()
+                return 0
+
+            with self._lock:
+                self._inflight = {}
+            os.remove(flushing_path)
+            return changed
+
+    def close(self):
+        """Flush what is pending and stop the background timer"""
+        self.flush()
+        with self._lock:
+            self._wal.close()
+        if os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) == 0:
+            os.remove(self.wal_path)
+
+    def _rewrite_wal(self):
+        # Caller holds self._lock; the journal becomes exactly the pending state
+        tmp_path = self.wal_path + '.tmp'
+        with open(tmp_path, 'w') as wal:
+            for (owner_id, post_id), (_, desired) in self._pending.items():
+                wal.write(json.dumps({'o': owner_id, 'p': post_id, 'r': desired}) + '\n')
+            wal.flush()
+            os.fsync(wal.fileno())
+        self._wal.close()
+        os.replace(tmp_path, self.wal_path)
+        self._wal = open(self.wal_path, 'a')
+
+    def _schedule(self):
+        # Caller holds self._lock
+        if self.autoflush and self._timer is None and self._pending:
+            self._timer = threading.Timer(self.interval, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_reaction_buffer():
+    """The process-wide buffer, or None when buffering is disabled"""
+    global _buffer
+    if not REACTION_BUFFER_ENABLED:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            recover_wal_files()
+            _buffer = ReactionBuffer()
+            atexit.register(_buffer.close)
+    return _buffer
@@ -0,0 +1,80 @@
+"""
+Reaction writes for the Barta social media application.
+Every change is a single conditional INSERT, UPDATE or DELETE against the
+(owner, post) unique constraint, applied only if the row is still in the
+state we read. A writer that loses a race simply re-reads and retries, so
+concurrent clicks can neither duplicate a reaction nor skew the counters.
+"""
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .counters import adjust_post_reactions, reaction_count_field, switch_post_reaction
+from .models import Post, PostLike
+
+
+REACTION_TYPES = {reaction for reaction, _ in PostLike.REACTION_CHOICES}
+
+# Conflicting writers re-read at most this many times before giving up
+MAX_ATTEMPTS = 5
+
+
+class ReactionConflict(Exception):
+    """Raised when a reaction could not be applied after MAX_ATTEMPTS"""
+
+
+def apply_reaction(owner, post, reaction_type, toggle=True):
+    """
+    Set, switch or clear the owner's reaction on a post.
+    reaction_type None clears it; with toggle, repeating the current reaction
+    clears it too. Returns (previous_reaction, new_reaction).
+    """
+    if reaction_type is not None and reaction_type not in REACTION_TYPES:
+        raise ValueError(f"Unknown reaction type: {reaction_type}")
+
+    for _ in range(MAX_ATTEMPTS):
+        current = PostLike.objects.filter(
+            owner=owner, post=post
+        ).values_list('reaction_type', flat=True).first()
+
+        target = reaction_type
+        if toggle and current is not None and current == reaction_type:
+            target = None
+        if current == target:
+            return current, target
+
+        with transaction.atomic():
+            if current is None:
+                try:
+                    with transaction.atomic():
+                        PostLike.objects.create(owner=owner, post=post, reaction_type=target)
+                except IntegrityError:
+                    continue
+                adjust_post_reactions(post.id, target, 1)
+            elif target is None:
+                deleted, _ = PostLike.objects.filter(
+                    owner=owner, post=post, reaction_type=current
+                ).delete()
+                if not deleted:
+                    continue
+                adjust_post_reactions(post.id, current, -1)
+            else:
+                updated = PostLike.objects.filter(
+                    owner=owner, post=post, reaction_type=current
+                ).update(reaction_type=target, updated_at=timezone.now())
+                if not updated:
+                    continue
+                switch_post_reaction(post.id, current, target)
+        return current, target
+
+    raise ReactionConflict(f"Could not apply reaction to post {post.id}")
+
+
+def reaction_summary(post_id):
+    """Current stored counters for a post, for JSON responses"""
+    fields = {reaction: reaction_count_field(reaction) for reaction in REACTION_TYPES}
+    counts = Post.objects.values('like_count', *fields.values()).get(pk=post_id)
+    return {
+        'like_count': counts['like_count'],
+        'reaction_counts': {reaction: counts[field] for reaction, field in fields.items()},
+    }
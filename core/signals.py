@@ -1,8 +1,19 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Owner
+from .conversations import mark_conversation_read_count, record_message
+from .counters import adjust_unread_messages, adjust_unread_notifications
+from .events import message_event, notification_event, publish
+from .people_search import adjust_recent_posts, index_owner
+from .post_search import index_post, unindex_post
+from .models import Message, Notification, Owner, Post, UserFollow
+from .timeline import backfill_timeline, fan_out_post, trim_timeline
+
+
+SEARCHABLE_USER_FIELDS = {'username', 'first_name', 'last_name'}
+SEARCHABLE_OWNER_FIELDS = {'bio', 'location'}
 
 
 @receiver(post_save, sender=User)
@@ -11,4 +22,143 @@ def create_owner_profile(sender, instance, created, **kwargs):
     if created:
         Owner.objects.create(user=instance)
     else:
-        Owner.objects.get_or_create(user=instance)
+        owner, _ = Owner.objects.get_or_create(user=instance)
+        update_fields = kwargs.get('update_fields')
+        # Logins only touch last_login; anything else may have changed a name
+        if update_fields is None or SEARCHABLE_USER_FIELDS & set(update_fields):
+            index_owner(owner)
+
+
+@receiver(post_save, sender=Owner)
+def index_owner_profile(sender, instance, created, **kwargs):
+    """Keep the people search index in line with the profile."""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or SEARCHABLE_OWNER_FIELDS & set(update_fields):
+        index_owner(instance)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    """Fan a new post out to the author's and followers' home timelines."""
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_recent_post(sender, instance, created, **kwargs):
+    """Count a new post in the author's search features."""
+    if created:
+        adjust_recent_posts(instance.owner_id, instance.created_at, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_recent_post(sender, instance, **kwargs):
+    """Drop a deleted post from the author's search features."""
+    adjust_recent_posts(instance.owner_id, instance.created_at, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, **kwargs):
+    """Mirror a created or edited post into the full-text search table."""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or {'title', 'content'} & set(update_fields):
+        index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    """Drop a deleted post from the full-text search table."""
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=UserFollow)
+def sync_timeline_on_follow(sender, instance, created, **kwargs):
+    """Backfill the follower's timeline on an accepted follow, trim it otherwise."""
+    if instance.status == 'accepted':
+        if created:
+            backfill_timeline(instance.follower, instance.following)
+    else:
+        trim_timeline(instance.follower_id, instance.following_id)
+
+
+@receiver(post_delete, sender=UserFollow)
+def trim_timeline_on_unfollow(sender, instance, **kwargs):
+    """Drop the unfollowed author's posts from the former follower's timeline."""
+    trim_timeline(instance.follower_id, instance.following_id)
+
+
+@receiver(post_save, sender=Message)
+def count_unread_message(sender, instance, created, **kwargs):
+    """Bump the receiver's unread message badge for a new message."""
+    if created and record_message(instance):
+        adjust_unread_messages(instance.receiver_id, 1)
+    if created:
+        publish(instance.receiver_id, 'message', lambda: message_event(instance))
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    """Bump the owner's unread notification badge for a new notification."""
+    if created and not instance.is_read:
+        adjust_unread_notifications(instance.owner_id, 1)
+    if not instance.is_read:
+        # New or freshly coalesced notifications are pushed to live clients
+        publish(instance.owner_id, 'notification', lambda: notification_event(instance))
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    """Drop a deleted unread message from the receiver's badge."""
+    if not instance.is_read:
+        adjust_unread_messages(instance.receiver_id, -1)
+        mark_conversation_read_count(instance.conversation_id, instance.receiver_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """Drop a deleted unread notification from the owner's badge."""
+    if not instance.is_read:
+        adjust_unread_notifications(instance.owner_id, -1)
+
+
+MEDIA_FIELDS = {
+    Owner: ('profile_picture', 'cover_photo'),
+    Post: ('image',),
+    Message: ('attachment',),
+}
+
+
+def release_files(storage_names):
+    """Delete stored files once the transaction that dropped them commits."""
+    def release():
+        for storage, name in storage_names:
+            storage.delete(name)
+    if storage_names:
+        transaction.on_commit(release)
+
+
+def release_replaced_media(sender, instance, **kwargs):
+    """Release the old file when a new upload replaces a media field."""
+    if instance.pk is None:
+        return
+    changed = [name for name in MEDIA_FIELDS[sender] if not getattr(instance, name)._committed]
+    if not changed:
+        return
+    old = sender.objects.filter(pk=instance.pk).values(*changed).first() or {}
+    release_files([
+        (instance._meta.get_field(name).storage, old[name])
+        for name in changed if old.get(name)
+    ])
+
+
+def release_deleted_media(sender, instance, **kwargs):
+    """Release the files of a deleted row."""
+    release_files([
+        (getattr(instance, name).storage, getattr(instance, name).name)
+        for name in MEDIA_FIELDS[sender] if getattr(instance, name)
+    ])
+
+
+for media_model in MEDIA_FIELDS:
+    pre_save.connect(release_replaced_media, sender=media_model)
+    post_delete.connect(release_deleted_media, sender=media_model)
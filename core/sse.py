@@ -0,0 +1,105 @@
+"""
+Server-Sent Events stream for the Barta social media application.
+Served straight from the ASGI entry point (Barta.asgi) so that an open
+stream costs one coroutine and one queue, not a worker thread. The client
+first receives its current unread counts, then every event published for
+its owner through core.events, with periodic keepalive comments.
+"""
+
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+
+from .events import get_broker, unread_event
+from .models import Owner
+
+
+# Seconds between keepalive comments on an idle stream
+SSE_KEEPALIVE_SECONDS = getattr(settings, 'SSE_KEEPALIVE_SECONDS', 15)
+
+# Milliseconds the browser waits before reconnecting a dropped stream
+SSE_RETRY_MS = getattr(settings, 'SSE_RETRY_MS', 3000)
+
+# Reconnect delay handed out by the WSGI fallback view, which cannot hold streams open
+SSE_FALLBACK_RETRY_MS = getattr(settings, 'SSE_FALLBACK_RETRY_MS', 30000)
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    # Stop nginx from buffering the stream
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def format_event(kind, data):
+    """Encode one SSE frame"""
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@sync_to_async
+def owner_for_scope(scope):
+    """Resolve the session cookie of an ASGI scope to an owner id, or None"""
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+
+    engine = import_module(settings.SESSION_ENGINE)
+    user = get_user(SimpleNamespace(session=engine.SessionStore(morsel.value)))
+    if not user.is_authenticated:
+        return None
+    return Owner.objects.filter(user=user).values_list('id', flat=True).first()
+
+
+async def event_stream_app(scope, receive, send):
+    """ASGI application streaming the authenticated owner's live events"""
+    owner_id = await owner_for_scope(scope)
+    if owner_id is None:
+        await send({'type': 'http.response.start', 'status': 403, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    broker = get_broker()
+    queue = broker.subscribe(owner_id)
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+        snapshot = await sync_to_async(unread_event)(owner_id)
+        await send({
+            'type': 'http.response.body',
+            'body': f"retry: {SSE_RETRY_MS}\n\n".encode() + format_event('unread', snapshot),
+            'more_body': True,
+        })
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected}, timeout=SSE_KEEPALIVE_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_event in done:
+                event = next_event.result()
+                body = format_event(event['event'], event['data'])
+            else:
+                next_event.cancel()
+                body = b": keepalive\n\n"
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        broker.unsubscribe(owner_id, queue)
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
@@ -0,0 +1,178 @@
+"""
+Content-addressed media storage for the Barta social media application.
+Every upload is hashed in one streaming pass; its bytes are stored once under
+MEDIA_ROOT/<MEDIA_BLOB_DIR>/<aa>/<bb>/<sha256> and only written when that
+digest is new. The name a FileField keeps (profile_pics/me.jpg...) is a hard
+link to the blob, so URLs, .path and static serving are unchanged while a meme
+sent to a hundred people takes the disk space and write I/O of one.
+MediaBlob rows count the names linked to each blob.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import MediaBlob
+
+
+logger = logging.getLogger(__name__)
+
+# Directory under MEDIA_ROOT holding the blobs
+MEDIA_BLOB_DIR = getattr(settings, 'MEDIA_BLOB_DIR', 'blobs')
+
+# Bytes read per chunk while hashing
+MEDIA_HASH_CHUNK_SIZE = getattr(settings, 'MEDIA_HASH_CHUNK_SIZE', 256 * 1024)
+
+
+def file_digest(chunks):
+    """Return (sha256 hex digest, size) of an iterable of byte chunks"""
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        hasher.update(chunk)
+        size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def read_chunks(path, chunk_size=MEDIA_HASH_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield chunk
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that deduplicates file contents by SHA-256"""
+
+    def blob_name(self, digest):
+        return os.path.join(MEDIA_BLOB_DIR, digest[:2], digest[2:4], digest)
+
+    def _save(self, name, content):
+        # Hash first: a duplicate then costs a read pass and a link, no data write
+        digest, size = file_digest(content.chunks(MEDIA_HASH_CHUNK_SIZE))
+        blob_name = self.blob_name(digest)
+
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                digest=digest, defaults={'size': size}
+            )
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            if not self.exists(blob_name):
+                self._write_blob(content, self.path(blob_name))
+
+        return self._link(self.path(blob_name), name)
+
+    def _write_blob(self, content, blob_path):
+        """
+        Write content to blob_path through a temporary file linked into place, so two
+        uploads of the same new digest never leave a second, suffixed copy behind.
+        """
+        directory = os.path.dirname(blob_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # chunks() rewinds the upload before it is written out
+                for chunk in content.chunks(MEDIA_HASH_CHUNK_SIZE):
+                    f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            try:
+                os.link(tmp_path, blob_path)
+            except FileExistsError:
+                # Another upload of the same bytes stored it first
+                pass
+            except OSError:
+                # No hard links: the bytes are identical, so replacing a concurrent copy is harmless
+                os.replace(tmp_path, blob_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _link(self, blob_path, name):
+        """Expose the blob under name, picking a free name if another upload took it meanwhile"""
+        while True:
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                os.link(blob_path, full_path)
+            except FileExistsError:
+                name = self.get_available_name(name)
+                continue
+            except OSError:
+                # No hard links on this filesystem: fall back to a plain copy
+                logger.warning("Hard link to %s failed; storing a copy", blob_path)
+                shutil.copyfile(blob_path, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+            return name.replace('\\', '/')
+
+    def delete(self, name):
+        """
+        Remove name and release its reference on the blob. Only a name linked to
+        the blob holds a reference; a legacy file that merely has the same bytes
+        (or a copy made where hard links failed) leaves the blob alone.
+        """
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        path = self.path(name)
+        try:
+            digest, _ = file_digest(read_chunks(path))
+            blob_path = self.path(self.blob_name(digest))
+            linked = os.path.exists(blob_path) and os.path.samefile(path, blob_path)
+        except FileNotFoundError:
+            return
+        super().delete(name)
+        if linked:
+            self.release(digest)
+
+    def release(self, digest):
+        """Drop one reference to a blob, removing it with the last one"""
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(digest=digest).first()
+            if blob is None:
+                # Files stored before deduplication have no blob
+                return
+            if blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            super().delete(self.blob_name(digest))
+
+    def adopt(self, name):
+        """
+        Move an existing non-deduplicated file under name into the blob store,
+        replacing it with a link. Returns True if the file was adopted.
+        """
+        path = self.path(name)
+        if not os.path.isfile(path) or os.stat(path).st_nlink > 1:
+            return False
+        digest, size = file_digest(read_chunks(path))
+        blob_name = self.blob_name(digest)
+        blob_path = self.path(blob_name)
+
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                digest=digest, defaults={'size': size}
+            )
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.link(path, blob_path)
+                return True
+
+            # Swap the file for a link to the existing blob in one rename
+            tmp_path = path + '.dedupe'
+            os.link(blob_path, tmp_path)
+            os.replace(tmp_path, path)
+        return True
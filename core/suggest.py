@@ -0,0 +1,152 @@
+"""
+Typeahead suggestions for the Barta social media application.
+An in-process prefix trie over every username, display name and name word
+answers /find-friends/suggest without touching the database. Each trie node
+keeps the entries of its best PEOPLE_SUGGEST_LIMIT owners by follower count, so
+a lookup is one walk down the query's characters plus a slice. The trie is
+rebuilt in a background thread once it is PEOPLE_SUGGEST_REBUILD_SECONDS old,
+while the previous one keeps serving.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import reverse
+
+from .models import Owner
+
+
+logger = logging.getLogger(__name__)
+
+# Suggestions returned per lookup, and kept per trie node
+PEOPLE_SUGGEST_LIMIT = getattr(settings, 'PEOPLE_SUGGEST_LIMIT', 8)
+
+# Seconds before the trie is rebuilt to pick up new people and follower counts
+PEOPLE_SUGGEST_REBUILD_SECONDS = getattr(settings, 'PEOPLE_SUGGEST_REBUILD_SECONDS', 300)
+
+# Longest prefix that is indexed; longer queries are cut to it
+PEOPLE_SUGGEST_MAX_PREFIX = getattr(settings, 'PEOPLE_SUGGEST_MAX_PREFIX', 32)
+
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return SPACE_RE.sub(' ', (text or '').lower()).strip()[:PEOPLE_SUGGEST_MAX_PREFIX]
+
+
+def suggest_keys(username, full_name):
+    """The strings an owner can be found by: username, full name and each name word"""
+    keys = {normalize(username), normalize(full_name)}
+    keys.update(normalize(word) for word in full_name.split())
+    keys.discard('')
+    return keys
+
+
+class SuggestIndex:
+    """
+    Prefix trie of owner names. A node is a (children, top) pair of a dict keyed by
+    character and a list of entry indexes, best first. Entries are inserted in
+    descending follower order, so each node's top list is filled by the first
+    PEOPLE_SUGGEST_LIMIT owners that reach it and never needs sorting.
+    """
+
+    def __init__(self, rows, limit=PEOPLE_SUGGEST_LIMIT):
+        self.limit = limit
+        self.entries = []
+        self.root = ({}, [])
+        self.built_at = time.monotonic()
+        for row in sorted(rows, key=lambda row: (-row['followers'], row['username'])):
+            self._add(row)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _add(self, row):
+        index = len(self.entries)
+        self.entries.append(row)
+        for key in suggest_keys(row['username'], row['name']):
+            node = self.root
+            for char in key:
+                children = node[0]
+                node = children.get(char)
+                if node is None:
+                    node = children[char] = ({}, [])
+                top = node[1]
+                # One owner reaches a node once even through several of their keys
+                if len(top) < self.limit and (not top or top[-1] != index):
+                    top.append(index)
+
+    def lookup(self, query, exclude_username=None, limit=None):
+        """Entries whose username or a name word starts with query, most followed first"""
+        limit = min(limit or self.limit, self.limit)
+        node = self.root
+        for char in normalize(query):
+            node = node[0].get(char)
+            if node is None:
+                return []
+        if node is self.root:
+            return []
+        return [
+            entry for entry in (self.entries[index] for index in node[1])
+            if entry['username'] != exclude_username
+        ][:limit]
+
+
+def load_rows():
+    """One row per owner with everything a suggestion shows, from a single query"""
+    storage = Owner._meta.get_field('profile_picture').storage
+    rows = []
+    for username, first_name, last_name, followers, picture in Owner.objects.values_list(
+        'user__username', 'user__first_name', 'user__last_name', 'follower_count', 'profile_picture'
+    ).iterator():
+        rows.append({
+            'username': username,
+            'name': f'{first_name} {last_name}'.strip(),
+            'followers': followers,
+            'url': reverse('profile_user', args=[username]),
+            'avatar': storage.url(picture) if picture else None,
+        })
+    return rows
+
+
+def build_index():
+    return SuggestIndex(load_rows())
+
+
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = False
+
+
+def get_suggest_index(rebuild=False):
+    """
+    The process-wide trie. The first call (or rebuild=True) builds it inline; after
+    that a stale trie keeps answering while a background thread replaces it.
+    """
+    global _index, _rebuilding
+    with _index_lock:
+        if _index is None or rebuild:
+            _index = build_index()
+        elif not _rebuilding and time.monotonic() - _index.built_at > PEOPLE_SUGGEST_REBUILD_SECONDS:
+            _rebuilding = True
+            thread = threading.Thread(target=_rebuild_in_background, daemon=True)
+            thread.start()
+        return _index
+
+
+def _rebuild_in_background():
+    global _index, _rebuilding
+    try:
+        index = build_index()
+        with _index_lock:
+            _index = index
+    except Exception:
+        logger.exception("People suggest index rebuild failed; keeping the previous one")
+    finally:
+        with _index_lock:
+            _rebuilding = False
+        close_old_connections()
@@ -1,3 +1,1358 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from io import StringIO
+
+from core.comments import REPLY_PREVIEW_SIZE, load_comment_page
+from core.context_processors import unread_counts
+from core.conversations import load_inbox_page, load_message_page, mark_conversation_read, reconcile_conversations
+from core.counters import reconcile_owner_counters, reconcile_post_counters
+from core.events import Broker, LocalBroker, publish, unread_event
+from core.models import Conversation, ConversationParticipant, MediaBlob, Message, Notification, OutboxEvent, Owner, Post, PostComment, PostLike, SearchFeatures, SearchTrigram, UserFollow, TimelineEntry
+from core.outbox import OUTBOX_MAX_ATTEMPTS, claim_batch, drain
+from core.pagination import FEED_PAGE_SIZE, decode_cursor, encode_cursor, next_cursor
+from core.people_search import candidate_ids, refresh_features
+from core.post_search import decode_rank_cursor, match_expression, rebuild_post_index, search_posts
+from core.reaction_buffer import ReactionBuffer, recover_wal_files
+from core.reactions import ReactionConflict, reaction_summary
+from core.scoring import edit_distance, encode_block, fuzzy_match_batch, fuzzy_string_match, myers_distance_block
+from core.sse import event_stream_app
+from core.storage import ContentAddressedStorage
+from core.suggest import SuggestIndex, get_suggest_index
+from core.timeline import get_timeline_posts
+from core.viewer import annotate_viewer_reactions
+
+
+class TimelineTestCase(TestCase):
+    """Test the fan-out-on-write home timeline"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='viewer', password='testpass123')
+        self.author_user = User.objects.create_user(username='author', password='testpass123')
+        self.viewer = self.user.owner
+        self.author = self.author_user.owner
+
+    def test_post_is_pushed_to_followers(self):
+        UserFollow.objects.create(follower=self.viewer, following=self.author)
+        post = Post.objects.create(owner=self.author, content='Fresh post')
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.viewer, post=post).exists())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.author, post=post).exists())
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        post = Post.objects.create(owner=self.author, content='Older post')
+        follow = UserFollow.objects.create(follower=self.viewer, following=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.viewer, post=post).exists())
+
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.viewer, author=self.author).exists())
+
+    def test_home_reads_timeline(self):
+        UserFollow.objects.create(follower=self.viewer, following=self.author)
+        Post.objects.create(owner=self.author, content='Followed author post')
+        stranger = User.objects.create_user(username='stranger', password='testpass123').owner
+        Post.objects.create(owner=stranger, content='Stranger post')
+
+        self.client.login(username='viewer', password='testpass123')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Followed author post')
+        self.assertNotContains(response, 'Stranger post')
+
+    def test_high_fanout_author_is_pulled_and_merged(self):
+        UserFollow.objects.create(follower=self.viewer, following=self.author)
+        regular = User.objects.create_user(username='regular', password='testpass123').owner
+        UserFollow.objects.create(follower=self.viewer, following=regular)
+        UserFollow.objects.create(follower=regular, following=self.author)
+        reconcile_owner_counters()
+        call_command('classify_fanout', threshold=1, stdout=StringIO())
+        self.author.refresh_from_db()
+        regular.refresh_from_db()
+        self.assertTrue(self.author.is_high_fanout)
+        self.assertFalse(regular.is_high_fanout)
+
+        first = Post.objects.create(owner=regular, content='Pushed post')
+        second = Post.objects.create(owner=self.author, content='Pulled post')
+
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.viewer, post=second).exists())
+        self.assertEqual(get_timeline_posts(self.viewer), [second, first])
+
+
+class FeedPaginationTestCase(TestCase):
+    """Test keyset pagination of the home feed and profile posts"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='scroller', password='testpass123')
+        self.owner = self.user.owner
+        self.posts = [
+            Post.objects.create(owner=self.owner, content=f'Post number {i}')
+            for i in range(FEED_PAGE_SIZE + 3)
+        ]
+        self.client.login(username='scroller', password='testpass123')
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        self.assertEqual(decode_cursor(encode_cursor(post.created_at, post.id)), (post.created_at, post.id))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+
+    def test_home_feed_pages_do_not_overlap(self):
+        first_page = get_timeline_posts(self.owner, limit=FEED_PAGE_SIZE)
+        cursor = next_cursor(first_page, FEED_PAGE_SIZE)
+        self.assertIsNotNone(cursor)
+
+        response = self.client.get(reverse('home_feed_page'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIsNone(data['next_cursor'])
+        for post in self.posts[:3]:
+            self.assertIn(f'{post.content}</p>', data['html'])
+        self.assertNotIn(f'{first_page[-1].content}</p>', data['html'])
+
+    def test_profile_posts_page(self):
+        response = self.client.get(reverse('profile'))
+        cursor = response.context['next_cursor']
+        response = self.client.get(reverse('profile_posts_page', args=['scroller']), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Post number 0', response.json()['html'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('home_feed_page'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PostCounterTestCase(TestCase):
+    """Test the denormalized engagement counters on Post"""
+
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username='poster', password='testpass123').owner
+        User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(owner=self.author, content='Count me')
+        self.client.login(username='fan', password='testpass123')
+
+    def test_like_and_unlike_update_counters(self):
+        self.client.post(reverse('like_post', args=[self.post.id]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.post.reaction_counts['like'], 1)
+
+        self.client.post(reverse('like_post', args=[self.post.id]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertEqual(self.post.reaction_like_count, 0)
+
+    def test_comments_and_replies_update_counter(self):
+        self.client.post(reverse('comment_post', args=[self.post.id]), {'content': 'Nice'})
+        comment = PostComment.objects.get(post=self.post)
+        self.client.post(reverse('reply_comment', args=[self.post.id, comment.id]), {'content': 'Thanks'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_reconcile_repairs_drift(self):
+        PostLike.objects.create(owner=self.author, post=self.post, reaction_type='love')
+        self.assertEqual(reconcile_post_counters(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.post.reaction_love_count, 1)
+        self.assertEqual(reconcile_post_counters(), 0)
+
+
+class ViewerReactionTestCase(TestCase):
+    """Test the batched viewer-state loader for feed cards"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='reader', password='testpass123').owner
+        self.posts = [Post.objects.create(owner=self.viewer, content=f'Card {i}') for i in range(3)]
+        PostLike.objects.create(owner=self.viewer, post=self.posts[1], reaction_type='wow')
+
+    def test_reactions_loaded_in_one_query(self):
+        with self.assertNumQueries(1):
+            posts = annotate_viewer_reactions(self.posts, self.viewer)
+        self.assertEqual([post.viewer_reaction for post in posts], [None, 'wow', None])
+
+    def test_anonymous_viewer_has_no_reactions(self):
+        with self.assertNumQueries(0):
+            posts = annotate_viewer_reactions(self.posts, None)
+        self.assertTrue(all(post.viewer_reaction is None for post in posts))
+
+
+class OwnerCounterTestCase(TestCase):
+    """Test the denormalized profile counters on Owner"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='counted', password='testpass123')
+        self.other_user = User.objects.create_user(username='followed', password='testpass123')
+        self.client.login(username='counted', password='testpass123')
+
+    def test_follow_and_unfollow_update_counters(self):
+        self.client.post(reverse('follow_user', args=['followed']))
+        self.user.owner.refresh_from_db()
+        self.other_user.owner.refresh_from_db()
+        self.assertEqual(self.user.owner.following_count, 1)
+        self.assertEqual(self.other_user.owner.follower_count, 1)
+
+        self.client.post(reverse('follow_user', args=['followed']))
+        self.other_user.owner.refresh_from_db()
+        self.assertEqual(self.other_user.owner.follower_count, 0)
+
+    def test_create_and_delete_post_update_counter(self):
+        self.client.post(reverse('create_post'), {'content': 'Counted post'})
+        self.user.owner.refresh_from_db()
+        self.assertEqual(self.user.owner.post_count, 1)
+
+        post = Post.objects.get(content='Counted post')
+        self.client.post(reverse('delete_post', args=[post.id]))
+        self.user.owner.refresh_from_db()
+        self.assertEqual(self.user.owner.post_count, 0)
+
+    def test_reconcile_repairs_owner_drift(self):
+        UserFollow.objects.create(follower=self.user.owner, following=self.other_user.owner)
+        self.assertEqual(reconcile_owner_counters(), 2)
+        self.other_user.owner.refresh_from_db()
+        self.assertEqual(self.other_user.owner.follower_count, 1)
+
+
+class CommentThreadTestCase(TestCase):
+    """Test the bounded-query comment thread loader"""
+
+    def setUp(self):
+        self.client = Client()
+        self.owner = User.objects.create_user(username='threader', password='testpass123').owner
+        self.post = Post.objects.create(owner=self.owner, content='Discuss')
+        self.comments = [
+            PostComment.objects.create(owner=self.owner, post=self.post, content=f'Comment {i}')
+            for i in range(5)
+        ]
+        for comment in self.comments:
+            for j in range(REPLY_PREVIEW_SIZE + 2):
+                PostComment.objects.create(
+                    owner=self.owner, post=self.post, parent_comment=comment, content=f'Reply {j}'
+                )
+        self.client.login(username='threader', password='testpass123')
+
+    def test_page_loads_in_constant_queries(self):
+        with self.assertNumQueries(2):
+            comments, cursor = load_comment_page(self.post)
+        self.assertIsNone(cursor)
+        self.assertEqual(comments[0], self.comments[-1])
+        for comment in comments:
+            self.assertEqual(len(comment.preview_replies), REPLY_PREVIEW_SIZE)
+            self.assertEqual(comment.thread_size, REPLY_PREVIEW_SIZE + 2)
+            self.assertIsNotNone(comment.replies_cursor)
+
+    def test_reply_page_continues_after_preview(self):
+        comments, _ = load_comment_page(self.post)
+        comment = comments[0]
+        response = self.client.get(
+            reverse('reply_page', args=[self.post.id, comment.id]),
+            {'cursor': comment.replies_cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+        html = response.json()['html']
+        self.assertIn(f'Reply {REPLY_PREVIEW_SIZE}', html)
+        self.assertNotIn('Reply 0', html)
+
+    def test_nested_replies_use_materialized_path(self):
+        root = self.comments[0]
+        first_reply = root.replies.order_by('id').first()
+        self.client.post(
+            reverse('reply_comment', args=[self.post.id, first_reply.id]),
+            {'content': 'Reply to a reply'}
+        )
+        nested = PostComment.objects.get(content='Reply to a reply')
+        self.assertEqual(nested.depth, 2)
+        self.assertEqual(nested.thread_root, root)
+        self.assertTrue(nested.path.startswith(first_reply.path))
+
+        thread = list(root.subtree())
+        self.assertEqual(len(thread), REPLY_PREVIEW_SIZE + 3)
+        # Depth-first: the nested reply directly follows its parent
+        self.assertEqual(thread[thread.index(first_reply) + 1], nested)
+
+    def test_post_detail_renders(self):
+        response = self.client.get(reverse('post_detail', args=[self.post.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'View more replies')
+
+
+class ReactionApiTestCase(TestCase):
+    """Test the JSON reaction endpoint and its conditional writes"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.viewer = User.objects.create_user('viewer', password='pass12345')
+        self.post = Post.objects.create(owner=self.author.owner, content='React to me')
+        self.client = Client()
+        self.client.login(username='viewer', password='pass12345')
+
+    def react(self, reaction, **extra):
+        return self.client.post(
+            reverse('react_post', args=[self.post.id]),
+            {'reaction': reaction, **extra}
+        )
+
+    def test_set_switch_and_clear(self):
+        data = self.react('love').json()
+        self.assertEqual(data['reaction'], 'love')
+        self.assertEqual(data['like_count'], 1)
+        self.assertEqual(data['reaction_counts']['love'], 1)
+
+        data = self.react('wow').json()
+        self.assertEqual(data['reaction'], 'wow')
+        self.assertEqual(data['like_count'], 1)
+        self.assertEqual(data['reaction_counts']['love'], 0)
+        self.assertEqual(data['reaction_counts']['wow'], 1)
+
+        data = self.react('none').json()
+        self.assertIsNone(data['reaction'])
+        self.assertEqual(data['like_count'], 0)
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_repeat_toggles_unless_disabled(self):
+        self.react('like')
+        self.assertEqual(self.react('like', toggle='0').json()['like_count'], 1)
+        self.assertEqual(self.react('like').json()['like_count'], 0)
+        self.assertEqual(reconcile_post_counters(), 0)
+
+    def test_rejects_unknown_reaction_and_get(self):
+        self.assertEqual(self.react('meh').status_code, 400)
+        response = self.client.get(reverse('react_post', args=[self.post.id]))
+        self.assertEqual(response.status_code, 405)
+
+    def test_like_post_returns_json_for_ajax(self):
+        response = self.client.post(
+            reverse('like_post', args=[self.post.id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json()['reaction'], 'like')
+        response = self.client.post(reverse('like_post', args=[self.post.id]))
+        self.assertEqual(response.status_code, 302)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_like_post_conflict_is_not_a_server_error(self):
+        with mock.patch('core.views.apply_reaction', side_effect=ReactionConflict):
+            response = self.client.post(
+                reverse('like_post', args=[self.post.id]),
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+            self.assertEqual(response.status_code, 409)
+            response = self.client.post(reverse('like_post', args=[self.post.id]))
+        self.assertRedirects(response, reverse('post_detail', args=[self.post.id]), fetch_redirect_response=False)
+
+
+class ReactionBufferTestCase(TestCase):
+    """Test write coalescing and write-ahead recovery of buffered reactions"""
+
+    def setUp(self):
+        self.wal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.wal_dir, True)
+        self.author = User.objects.create_user(username='viral', password='testpass123').owner
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', password='testpass123').owner
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(owner=self.author, content='Going viral')
+        self.buffer = ReactionBuffer(wal_dir=self.wal_dir, autoflush=False)
+        self.addCleanup(self.buffer.close)
+
+    def test_flips_coalesce_into_one_write(self):
+        for _ in range(5):
+            self.buffer.submit(self.fans[0], self.post, 'like')
+        self.buffer.submit(self.fans[1], self.post, 'love')
+        self.buffer.submit(self.fans[1], self.post, 'love')
+        self.buffer.submit(self.fans[2], self.post, 'wow')
+        self.assertFalse(PostLike.objects.exists())
+
+        summary = self.buffer.pending_summary(self.post.id, reaction_summary(self.post.id))
+        self.assertEqual(summary['like_count'], 2)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+        self.assertEqual(self.post.reaction_counts['like'], 1)
+        self.assertEqual(self.post.reaction_counts['wow'], 1)
+        notification = Notification.objects.get(owner=self.author)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(reconcile_post_counters(), 0)
+
+    def test_switch_and_clear_existing_reactions(self):
+        PostLike.objects.create(owner=self.fans[0], post=self.post, reaction_type='like')
+        PostLike.objects.create(owner=self.fans[1], post=self.post, reaction_type='like')
+        reconcile_post_counters()
+
+        self.assertEqual(self.buffer.submit(self.fans[0], self.post, 'sad'), ('like', 'sad'))
+        self.assertEqual(self.buffer.submit(self.fans[1], self.post, 'like'), ('like', None))
+        self.buffer.flush()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.post.reaction_counts['sad'], 1)
+        self.assertEqual(reconcile_post_counters(), 0)
+
+    def test_submit_during_flush_sees_inflight_batch(self):
+        from core import reaction_buffer
+        write = reaction_buffer.write_reactions
+        seen = {}
+
+        def write_with_click(desired):
+            # A click arriving while the batch is being written
+            seen['before'] = self.buffer.pending_summary(self.post.id, reaction_summary(self.post.id))['like_count']
+            seen['toggle'] = self.buffer.submit(self.fans[0], self.post, 'like')
+            seen['after'] = self.buffer.pending_summary(self.post.id, reaction_summary(self.post.id))['like_count']
+            return write(desired)
+
+        self.buffer.submit(self.fans[0], self.post, 'like')
+        with mock.patch('core.reaction_buffer.write_reactions', side_effect=write_with_click):
+            self.buffer.flush()
+        self.assertEqual(seen, {'before': 1, 'toggle': ('like', None), 'after': 0})
+        self.assertEqual(self.buffer.pending_summary(self.post.id, reaction_summary(self.post.id))['like_count'], 0)
+
+        self.buffer.flush()
+        self.assertFalse(PostLike.objects.exists())
+        self.assertEqual(reconcile_post_counters(), 0)
+
+    def test_write_ahead_file_survives_crash(self):
+        self.buffer.submit(self.fans[0], self.post, 'like')
+        self.buffer.submit(self.fans[1], self.post, 'angry')
+        # Simulate a crashed process: its journal is left behind under another pid
+        os.rename(self.buffer.wal_path, os.path.join(self.wal_dir, 'reactions-999999999.wal'))
+        self.buffer._pending.clear()
+
+        self.assertEqual(recover_wal_files(self.wal_dir), 2)
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), 2)
+        self.assertEqual(os.listdir(self.wal_dir), [])
+
+    def test_recovery_prefers_newer_journal(self):
+        # Crashed mid-flush: the batch being written liked, a later click unliked
+        journal = os.path.join(self.wal_dir, 'reactions-999999999.wal')
+        with open(journal + '.flushing', 'w') as wal:
+            wal.write(json.dumps({'o': self.fans[0].id, 'p': self.post.id, 'r': 'like'}) + '\n')
+            wal.write(json.dumps({'o': self.fans[1].id, 'p': self.post.id, 'r': 'love'}) + '\n')
+        with open(journal, 'w') as wal:
+            wal.write(json.dumps({'o': self.fans[0].id, 'p': self.post.id, 'r': None}) + '\n')
+
+        self.assertEqual(recover_wal_files(self.wal_dir), 1)
+        self.assertEqual(
+            list(PostLike.objects.filter(post=self.post).values_list('owner_id', 'reaction_type')),
+            [(self.fans[1].id, 'love')]
+        )
+        self.assertEqual(os.listdir(self.wal_dir), [os.path.basename(self.buffer.wal_path)])
+
+
+class NotificationSchemaTestCase(TestCase):
+    """Test that producers write typed notifications and tabs filter on verb"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='poster', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(owner=self.author.owner, content='Hello')
+        self.client = Client()
+        self.client.login(username='fan', password='testpass123')
+
+    def test_producers_record_verb_actor_and_target(self):
+        self.client.post(reverse('like_post', args=[self.post.id]))
+        self.client.post(reverse('comment_post', args=[self.post.id]), {'content': 'Nice'})
+        self.client.post(reverse('follow_user', args=['poster']))
+        self.assertFalse(Notification.objects.exists())
+        drain(threads=1)
+
+        notifications = {n.verb: n for n in Notification.objects.filter(owner=self.author.owner)}
+        self.assertEqual(set(notifications), {Notification.LIKE, Notification.COMMENT, Notification.FOLLOW})
+        self.assertTrue(all(n.actor == self.fan.owner for n in notifications.values()))
+        self.assertEqual(notifications[Notification.LIKE].target, self.post)
+        # Comment notifications are keyed on the post so they can fold
+        self.assertEqual(notifications[Notification.COMMENT].target, self.post)
+        self.assertEqual(notifications[Notification.FOLLOW].target, UserFollow.objects.get())
+
+    def test_own_actions_do_not_notify(self):
+        self.assertIsNone(Notification.send(self.fan.owner, Notification.LIKE, actor=self.fan.owner))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_tabs_filter_by_verb(self):
+        Notification.send(self.author.owner, Notification.LIKE, actor=self.fan.owner, content='liked comment')
+        Notification.send(self.author.owner, Notification.REPLY, actor=self.fan.owner)
+        self.client.login(username='poster', password='testpass123')
+
+        response = self.client.get(reverse('notifications'), {'filter': 'comments'})
+        self.assertEqual([n.verb for n in response.context['notifications']], [Notification.REPLY])
+        response = self.client.get(reverse('notifications'), {'filter': 'likes'})
+        self.assertEqual([n.verb for n in response.context['notifications']], [Notification.LIKE])
+
+
+class NotificationCoalescingTestCase(TestCase):
+    """Test folding of likes/follows into one aggregated notification"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='star', password='testpass123').owner
+        self.fans = [
+            User.objects.create_user(username=f'follower{i}', password='testpass123').owner
+            for i in range(4)
+        ]
+        self.post = Post.objects.create(owner=self.author, content='Popular')
+
+    def like(self, fan):
+        return Notification.send(self.author, Notification.LIKE, actor=fan, target=self.post, related_post=self.post)
+
+    def test_likes_fold_into_one_row(self):
+        for fan in self.fans:
+            self.like(fan)
+        notification = Notification.objects.get(owner=self.author)
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual(notification.content, 'follower3 and 3 others liked your post')
+        self.assertEqual(len(notification.recent_actor_ids), Notification.RECENT_ACTORS)
+
+    def test_repeat_actor_is_not_counted_twice(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.like(self.fans[0])
+        notification = Notification.objects.get(owner=self.author)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.content, 'follower0 and follower1 liked your post')
+
+    def test_actor_outside_recent_list_is_not_counted_twice(self):
+        for fan in self.fans:
+            self.like(fan)
+        # follower0 has dropped out of the recent actors, then likes again
+        self.like(self.fans[0])
+        notification = Notification.objects.get(owner=self.author)
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.content, 'follower0 and 3 others liked your post')
+
+    def test_read_rows_and_other_targets_start_new_rows(self):
+        self.like(self.fans[0])
+        Notification.objects.update(is_read=True)
+        self.like(self.fans[1])
+        other = Post.objects.create(owner=self.author, content='Another')
+        Notification.send(self.author, Notification.LIKE, actor=self.fans[2], target=other)
+        self.assertEqual(Notification.objects.filter(owner=self.author).count(), 3)
+
+    def test_follows_fold_per_recipient(self):
+        for fan in self.fans[:2]:
+            follow = UserFollow.objects.create(follower=fan, following=self.author)
+            Notification.send(self.author, Notification.FOLLOW, actor=fan, target=follow)
+        notification = Notification.objects.get(owner=self.author)
+        self.assertEqual(notification.content, 'follower1 and follower0 started following you')
+
+
+class OutboxTestCase(TestCase):
+    """Test the transactional outbox and its batch worker"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', password='testpass123').owner
+        self.readers = [
+            User.objects.create_user(username=f'reader{i}', password='testpass123').owner
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(owner=self.author, content='Queued')
+
+    def queue_comments(self):
+        for reader in self.readers:
+            PostComment.objects.create(owner=reader, post=self.post, content='Hi')
+            OutboxEvent.notify(
+                self.author.id, Notification.COMMENT, actor_id=reader.id, target=self.post,
+                related_post_id=self.post.id
+            )
+
+    def test_drain_delivers_in_batches(self):
+        self.queue_comments()
+        OutboxEvent.notify(self.readers[0].id, Notification.FOLLOWER_REMOVED, actor_id=self.author.id)
+        with self.assertNumQueries(0):
+            OutboxEvent.notify(self.author.id, Notification.LIKE, actor_id=self.author.id)
+
+        self.assertEqual(drain(batch_size=2, threads=1), 4)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(Notification.objects.filter(owner=self.readers[0]).count(), 1)
+        # Comments on one post fold into one row
+        notification = Notification.objects.get(owner=self.author)
+        self.assertEqual(notification.verb, Notification.COMMENT)
+        self.assertEqual(notification.actor_count, 3)
+
+    def test_claimed_events_are_leased(self):
+        self.queue_comments()
+        self.assertEqual(len(claim_batch()), 3)
+        self.assertEqual(claim_batch(), [])
+
+    def test_failures_back_off_and_give_up(self):
+        self.queue_comments()
+        failing = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict('core.outbox.HANDLERS', {OutboxEvent.NOTIFICATION: failing}), \
+                self.assertLogs('core.outbox', 'ERROR'):
+            for _ in range(OUTBOX_MAX_ATTEMPTS):
+                self.assertEqual(drain(threads=1), 0)
+                OutboxEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(failing.call_count, OUTBOX_MAX_ATTEMPTS)
+        self.assertTrue(all(e.attempts == OUTBOX_MAX_ATTEMPTS for e in OutboxEvent.objects.all()))
+        self.assertIn('boom', OutboxEvent.objects.first().last_error)
+        self.assertFalse(Notification.objects.exists())
+
+
+class UnreadCounterTestCase(TestCase):
+    """Test stored unread badges and the lazy context processor"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.client = Client()
+        self.client.login(username='alice', password='testpass123')
+
+    def counts(self):
+        owner = Owner.objects.get(user=self.alice)
+        return owner.unread_message_count, owner.unread_notification_count
+
+    def test_admin_actions_reconcile_filtered_owners(self):
+        from django.contrib import admin
+        from core.admin import NotificationAdmin
+
+        for text in ('One', 'Two'):
+            Notification.send(self.alice.owner, Notification.SYSTEM, content=text)
+        self.assertEqual(self.counts(), (0, 2))
+
+        # As from the changelist with the "unread" filter applied
+        notification_admin = NotificationAdmin(Notification, admin.site)
+        notification_admin.mark_as_read(None, Notification.objects.filter(is_read=False))
+        self.assertEqual(self.counts(), (0, 0))
+        notification_admin.mark_as_unread(None, Notification.objects.filter(is_read=True))
+        self.assertEqual(self.counts(), (0, 2))
+
+    def test_counters_follow_creates_and_reads(self):
+        Message.start_chat(self.bob.owner, self.alice.owner, 'Hi')
+        Message.start_chat(self.bob.owner, self.alice.owner, 'Still there?')
+        drain(threads=1)
+        self.assertEqual(self.counts(), (2, 2))
+
+        self.client.get(reverse('conversation', args=['bob']))
+        self.assertEqual(self.counts(), (0, 2))
+
+        notification = Notification.objects.filter(owner=self.alice.owner).first()
+        self.client.post(reverse('mark_notification_read', args=[notification.id]))
+        self.client.post(reverse('mark_notification_read', args=[notification.id]))
+        self.assertEqual(self.counts(), (0, 1))
+
+        self.client.post(reverse('mark_all_notifications_read'))
+        self.assertEqual(self.counts(), (0, 0))
+        self.assertEqual(reconcile_owner_counters(), 0)
+
+    def test_context_processor_is_lazy(self):
+        request = RequestFactory().get('/')
+        request.user = self.alice
+        with self.assertNumQueries(0):
+            context = unread_counts(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(int(str(context['unread_message_count'])), 0)
+            self.assertFalse(context['unread_notification_count'] > 0)
+
+
+class LiveEventTestCase(TestCase):
+    """Test the in-process event broker and the SSE endpoints"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123').owner
+        self.bob = User.objects.create_user(username='bob', password='testpass123').owner
+        self.broker = LocalBroker()
+        patcher = mock.patch('core.events._broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, owner):
+        async def subscribe():
+            return self.broker.subscribe(owner.id)
+        return self.loop.run_until_complete(subscribe())
+
+    def test_brokers_must_implement_the_interface(self):
+        class PublishOnly(Broker):
+            def publish(self, owner_id, event):
+                pass
+
+        with self.assertRaises(TypeError):
+            PublishOnly()
+
+    def test_events_are_published_after_commit(self):
+        queue = self.subscribe(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.send(self.alice, Notification.FOLLOW, actor=self.bob)
+            self.assertTrue(queue.empty())
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+        self.assertEqual({e['event'] for e in events}, {'notification', 'unread'})
+        unread = next(e for e in events if e['event'] == 'unread')
+        self.assertEqual(unread['data']['unread_notification_count'], 1)
+
+    def test_unwatched_owners_cost_nothing(self):
+        with self.assertNumQueries(0):
+            callbacks = []
+            with mock.patch('core.events.transaction.on_commit', callbacks.append):
+                publish(self.alice.id, 'unread', lambda: unread_event(self.alice.id))
+            callbacks[0]()
+
+    def test_asgi_stream_sends_snapshot_then_events(self):
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 2:
+                self.broker.publish(self.alice.id, {'event': 'message', 'data': {'sender': 'bob'}})
+            elif len(sent) == 3:
+                disconnect.set()
+
+        owner_lookup = mock.AsyncMock(return_value=self.alice.id)
+        with mock.patch('core.sse.owner_for_scope', owner_lookup), \
+                mock.patch('core.sse.unread_event', return_value={'unread_message_count': 2}):
+            self.loop.run_until_complete(event_stream_app({'type': 'http', 'headers': []}, receive, send))
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'event: unread', sent[1]['body'])
+        self.assertIn(b'"unread_message_count": 2', sent[1]['body'])
+        self.assertIn(b'event: message', sent[2]['body'])
+        self.assertFalse(self.broker.has_subscribers(self.alice.id))
+
+    def test_wsgi_fallback_returns_snapshot(self):
+        client = Client()
+        client.login(username='alice', password='testpass123')
+        response = client.get(reverse('event_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b'retry: ', response.content)
+        self.assertIn(b'event: unread', response.content)
+
+
+class InboxTestCase(TestCase):
+    """Test the conversation rows behind the inbox"""
+
+    def setUp(self):
+        self.me = User.objects.create_user(username='me', password='testpass123').owner
+        self.friends = [
+            User.objects.create_user(username=f'pal{i}', password='testpass123').owner
+            for i in range(5)
+        ]
+        for friend in self.friends:
+            Message.objects.create(sender=self.me, receiver=friend, content='Hey')
+            Message.objects.create(sender=friend, receiver=self.me, content=f'Hi from {friend}')
+        self.client = Client()
+        self.client.login(username='me', password='testpass123')
+
+    def test_conversations_track_last_message_and_unread(self):
+        self.assertEqual(Conversation.objects.count(), 5)
+        mine = ConversationParticipant.objects.get(owner=self.me, partner=self.friends[0])
+        theirs = ConversationParticipant.objects.get(owner=self.friends[0], partner=self.me)
+        self.assertEqual((mine.unread_count, theirs.unread_count), (1, 1))
+        self.assertEqual(mine.conversation.last_message.content, 'Hi from pal0')
+
+        self.client.get(reverse('conversation', args=['pal0']))
+        mine.refresh_from_db()
+        self.assertEqual(mine.unread_count, 0)
+        self.assertEqual(reconcile_conversations(), 0)
+
+    def test_inbox_is_one_query_and_ordered(self):
+        with self.assertNumQueries(1):
+            conversations, cursor = load_inbox_page(self.me)
+            [conv.partner.user.username for conv in conversations]
+            [conv.last_message.content for conv in conversations]
+        self.assertEqual(conversations[0].partner, self.friends[-1])
+        self.assertIsNone(cursor)
+
+        Message.objects.create(sender=self.friends[0], receiver=self.me, content='Bump')
+        conversations, _ = load_inbox_page(self.me)
+        self.assertEqual(conversations[0].partner, self.friends[0])
+        self.assertEqual(conversations[0].unread_count, 2)
+
+    def test_inbox_pages_by_cursor(self):
+        first, cursor = load_inbox_page(self.me, limit=3)
+        response = self.client.get(reverse('inbox_page'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        html = response.json()['html']
+        self.assertIn('pal1', html)
+        self.assertNotIn('pal4', html)
+
+        response = self.client.get(reverse('inbox'))
+        self.assertContains(response, 'Hi from pal4')
+
+
+class ConversationHistoryTestCase(TestCase):
+    """Test paging through a long chat"""
+
+    def setUp(self):
+        self.me = User.objects.create_user(username='me', password='testpass123').owner
+        self.pal = User.objects.create_user(username='pal', password='testpass123').owner
+        start = timezone.now() - timedelta(days=1)
+        for i in range(7):
+            sender, receiver = (self.me, self.pal) if i % 2 else (self.pal, self.me)
+            Message.objects.create(
+                sender=sender, receiver=receiver, content=f'msg-{i}', created_at=start + timedelta(minutes=i)
+            )
+        self.client = Client()
+        self.client.login(username='me', password='testpass123')
+
+    def test_pages_walk_back_in_time(self):
+        page, cursor = load_message_page(self.me, self.pal, limit=3)
+        self.assertEqual([m.content for m in page], ['msg-4', 'msg-5', 'msg-6'])
+
+        seen = [m.content for m in page]
+        while cursor:
+            page, cursor = load_message_page(self.me, self.pal, before=decode_cursor(cursor), limit=3)
+            seen = [m.content for m in page] + seen
+        self.assertEqual(seen, [f'msg-{i}' for i in range(7)])
+
+    def test_conversation_view_renders_latest_page(self):
+        response = self.client.get(reverse('conversation', args=['pal']))
+        self.assertContains(response, 'msg-0')
+        self.assertContains(response, 'msg-6')
+
+        _, cursor = load_message_page(self.me, self.pal, limit=3)
+
+        response = self.client.get(reverse('conversation_page', args=['pal']), {'cursor': cursor})
+        data = response.json()
+        self.assertIn('msg-3', data['html'])
+        self.assertNotIn('msg-4', data['html'])
+        self.assertEqual(
+            self.client.get(reverse('conversation_page', args=['pal']), {'cursor': 'bogus'}).status_code, 400
+        )
+
+
+class ReadWatermarkTestCase(TestCase):
+    """Test read state kept as one watermark per conversation side"""
+
+    def setUp(self):
+        self.me = User.objects.create_user(username='me', password='testpass123').owner
+        self.pal = User.objects.create_user(username='pal', password='testpass123').owner
+        self.received = [
+            Message.objects.create(sender=self.pal, receiver=self.me, content=f'in-{i}') for i in range(3)
+        ]
+        self.sent = Message.objects.create(sender=self.me, receiver=self.pal, content='out')
+        self.client = Client()
+        self.client.login(username='me', password='testpass123')
+
+    def participant(self, owner):
+        return ConversationParticipant.objects.get(owner=owner)
+
+    def test_mark_as_read_moves_watermark(self):
+        self.received[1].mark_as_read()
+        self.assertTrue(self.received[1].is_read)
+        self.assertIsNotNone(self.received[1].read_at)
+        self.assertTrue(Message.objects.get(pk=self.received[0].pk).is_read)
+        self.assertFalse(Message.objects.get(pk=self.received[2].pk).is_read)
+        self.assertEqual(self.participant(self.me).unread_count, 1)
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.unread_message_count, 1)
+
+        # Older messages never move the watermark back
+        self.received[0].mark_as_read()
+        self.assertEqual(self.participant(self.me).read_through_id, self.received[1].pk)
+
+    def test_admin_changelist_reads_watermarks_in_bulk(self):
+        User.objects.create_superuser(username='root', password='testpass123')
+        self.client.login(username='root', password='testpass123')
+        url = reverse('admin:core_message_changelist')
+        self.received[1].mark_as_read()
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(5):
+            Message.objects.create(sender=self.pal, receiver=self.me, content=f'more-{i}')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+
+        self.assertEqual(self.client.get(url, {'is_read': '1'}).context['cl'].result_count, 2)
+        self.assertEqual(self.client.get(url, {'is_read': '0'}).context['cl'].result_count, 7)
+
+    def test_opening_chat_is_one_watermark_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            mark_conversation_read(self.me.id, self.pal.id)
+        writes = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 2)
+        self.assertFalse(any('core_message' in sql for sql in writes))
+        participant = self.participant(self.me)
+        self.assertEqual((participant.unread_count, participant.read_through_id), (0, self.received[-1].pk))
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.unread_message_count, 0)
+        self.assertEqual(reconcile_owner_counters(), 0)
+        self.assertEqual(reconcile_conversations(), 0)
+
+        Message.objects.create(sender=self.pal, receiver=self.me, content='new')
+        self.assertEqual(self.participant(self.me).unread_count, 1)
+        self.assertEqual(reconcile_conversations(), 0)
+
+    def test_read_receipts_render_from_partner_watermark(self):
+        response = self.client.get(reverse('conversation', args=['pal']))
+        self.assertNotContains(response, 'title="Read"')
+
+        Message.objects.create(sender=self.pal, receiver=self.me, content='reply')
+        self.client.login(username='pal', password='testpass123')
+        self.client.get(reverse('conversation', args=['me']))
+        self.client.login(username='me', password='testpass123')
+        response = self.client.get(reverse('conversation', args=['pal']))
+        self.assertContains(response, 'title="Read"')
+
+
+class MediaStorageTestCase(TestCase):
+    """Test content-addressed deduplication of uploads"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        override = self.settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.sender = User.objects.create_user(username='sender', password='testpass123').owner
+        self.friends = [
+            User.objects.create_user(username=f'friend{i}', password='testpass123').owner
+            for i in range(3)
+        ]
+
+    def send(self, receiver, data=b'%PDF-1.4 same meme'):
+        return Message.objects.create(
+            sender=self.sender, receiver=receiver, attachment=SimpleUploadedFile('meme.pdf', data)
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        sent = [self.send(friend) for friend in self.friends]
+        self.assertEqual(len({m.attachment.name for m in sent}), 3)
+        self.assertTrue(all(m.attachment.name.startswith('message_attachments/meme') for m in sent))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 3)
+        inodes = {os.stat(m.attachment.path).st_ino for m in sent}
+        self.assertEqual(len(inodes), 1)
+        with sent[0].attachment.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 same meme')
+
+        self.send(self.friends[0], b'something else')
+        self.assertEqual(MediaBlob.objects.count(), 2)
+
+    def test_blob_removed_with_last_reference(self):
+        first, second = self.send(self.friends[0]), self.send(self.friends[1])
+        blob = MediaBlob.objects.get()
+        blob_path = first.attachment.storage.path(first.attachment.storage.blob_name(blob.digest))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertFalse(os.path.exists(first.attachment.path))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(os.path.exists(blob_path))
+
+    def test_deleting_unlinked_copy_keeps_blob_reference(self):
+        message = self.send(self.friends[0])
+        storage = message.attachment.storage
+        blob = MediaBlob.objects.get()
+        # A file stored before deduplication with the same bytes, never adopted
+        legacy = os.path.join(self.media_root, 'message_attachments', 'legacy.pdf')
+        with open(legacy, 'wb') as f:
+            f.write(b'%PDF-1.4 same meme')
+
+        storage.delete('message_attachments/legacy.pdf')
+        self.assertFalse(os.path.exists(legacy))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(storage.path(storage.blob_name(blob.digest))))
+
+    def test_concurrent_blob_write_leaves_no_orphan(self):
+        first = self.send(self.friends[0])
+        storage = first.attachment.storage
+        blob_dir = os.path.dirname(storage.path(storage.blob_name(MediaBlob.objects.get().digest)))
+        # Another upload of the same new digest won the race after the exists() check
+        exists = ContentAddressedStorage.exists
+        with mock.patch.object(
+            ContentAddressedStorage, 'exists',
+            lambda storage, name: not name.startswith('blobs') and exists(storage, name)
+        ):
+            second = self.send(self.friends[1])
+        self.assertEqual(os.listdir(blob_dir), [MediaBlob.objects.get().digest])
+        self.assertTrue(os.path.samefile(first.attachment.path, second.attachment.path))
+
+    def test_dedupe_command_adopts_existing_files(self):
+        for i, friend in enumerate(self.friends):
+            path = os.path.join(self.media_root, 'message_attachments', f'legacy{i}.pdf')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'legacy bytes')
+            Message.objects.bulk_create([Message(
+                sender=self.sender, receiver=friend, content='old', attachment=f'message_attachments/legacy{i}.pdf'
+            )])
+
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Moved 3 files', out.getvalue())
+        self.assertEqual(MediaBlob.objects.get().ref_count, 3)
+        call_command('dedupe_media', stdout=StringIO())
+        self.assertEqual(MediaBlob.objects.get().ref_count, 3)
+
+
+class MediaServingTestCase(TestCase):
+    """Test range, conditional and offloaded media responses"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        override = self.settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.media_root, 'message_attachments'))
+        with open(os.path.join(self.media_root, 'message_attachments', 'clip.mp4'), 'wb') as f:
+            f.write(bytes(range(100)))
+        self.url = '/media/message_attachments/clip.mp4'
+        self.sender = User.objects.create_user(username='sender', password='testpass123')
+        self.receiver = User.objects.create_user(username='receiver', password='testpass123')
+        Message.objects.create(
+            sender=self.sender.owner, receiver=self.receiver.owner, content='Clip',
+            attachment='message_attachments/clip.mp4'
+        )
+        self.client.login(username='receiver', password='testpass123')
+
+    def test_attachments_and_blobs_are_not_public(self):
+        self.assertEqual(self.client.get(self.url)['Cache-Control'], f'private, max-age={7 * 24 * 3600}')
+
+        User.objects.create_user(username='stranger', password='testpass123')
+        self.client.login(username='stranger', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get('/media/post_images/../message_attachments/clip.mp4').status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        os.makedirs(os.path.join(self.media_root, 'blobs', 'ab', 'cd'))
+        with open(os.path.join(self.media_root, 'blobs', 'ab', 'cd', 'abcd'), 'wb') as f:
+            f.write(b'secret')
+        self.assertEqual(self.client.get('/media/blobs/ab/cd/abcd').status_code, 404)
+        self.assertEqual(self.client.get('/media/post_images/../blobs/ab/cd/abcd').status_code, 404)
+
+    def test_full_and_conditional_responses(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(100)))
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/message_attachments/missing.mp4').status_code, 404)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(95, 100)))
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+        # A stale If-Range gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_offload_to_proxy(self):
+        with mock.patch('core.media.MEDIA_OFFLOAD', 'x-accel-redirect'):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/message_attachments/clip.mp4')
+        self.assertEqual(response.content, b'')
+
+        with mock.patch('core.media.MEDIA_OFFLOAD', 'x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertTrue(response['X-Sendfile'].endswith(os.path.join('message_attachments', 'clip.mp4')))
+
+
+class PeopleSearchTestCase(TestCase):
+    """Test the trigram index behind find_friend"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='seeker', password='testpass123')
+        self.alice = User.objects.create_user(
+            username='alice_w', password='testpass123', first_name='Alice', last_name='Wonder'
+        ).owner
+        self.bob = User.objects.create_user(
+            username='bobby', password='testpass123', first_name='Bob', last_name='Builder'
+        ).owner
+        self.client = Client()
+        self.client.login(username='seeker', password='testpass123')
+
+    def test_index_follows_profile_edits(self):
+        self.assertIn('ali', set(self.alice.search_trigrams.values_list('trigram', flat=True)))
+        self.assertEqual(candidate_ids('alice'), [self.alice.id])
+        self.assertEqual(candidate_ids('alcie'), [self.alice.id])
+
+        self.bob.location = 'Dhaka'
+        self.bob.save()
+        self.assertEqual(candidate_ids('dhaka'), [self.bob.id])
+
+        self.client.post(reverse('profile_edit'), {
+            'first_name': 'Zed', 'last_name': 'Zulu', 'email': 'z@example.com', 'bio': 'Painter in Dhaka'
+        })
+        self.assertEqual(set(candidate_ids('dhaka')), {self.bob.id, self.viewer.owner.id})
+        self.assertEqual(candidate_ids('zulu'), [self.viewer.owner.id])
+
+    def test_find_friend_scores_only_candidates(self):
+        with mock.patch('core.people_search.score_people', return_value=[0.5]) as scorer:
+            response = self.client.get(reverse('find_friend'), {'q': 'bob builder'})
+        self.assertEqual([p.id for p in scorer.call_args[0][0]], [self.bob.id])
+        self.assertEqual(response.context['results'][0]['person'], self.bob)
+
+    def test_rebuild_matches_incremental_index(self):
+        before = set(SearchTrigram.objects.values_list('owner_id', 'trigram'))
+        SearchTrigram.objects.all().delete()
+        call_command('rebuild_people_index', stdout=StringIO())
+        self.assertEqual(set(SearchTrigram.objects.values_list('owner_id', 'trigram')), before)
+
+
+class BatchScoringTestCase(TestCase):
+    """Test the vectorized people scorer against the scalar reference"""
+
+    def test_vectorized_matches_reference(self):
+        texts = ['', 'a', 'alice wonder', 'alcie', 'bob the builder', 'ållice', 'x' * 80, 'wonderland alice']
+        for pattern in ['a', 'alice', 'alice wonder', 'é', 'q' * 64, 'q' * 70]:
+            expected = [fuzzy_string_match(text, pattern) for text in texts]
+            for got, want in zip(fuzzy_match_batch(texts, pattern), expected):
+                self.assertAlmostEqual(got, want, places=12)
+
+        for s1, s2 in [('kitten', 'sitting'), ('', 'abc'), ('flaw', 'lawn'), ('alice', 'alice')]:
+            codes, lengths = encode_block([s1])
+            self.assertEqual(myers_distance_block(codes, lengths, s2)[0], edit_distance(s1, s2))
+
+    def test_benchmark_command_checks_ranking(self):
+        out = StringIO()
+        call_command('benchmark_people_search', candidates=300, stdout=out)
+        self.assertIn('identical ranking', out.getvalue())
+
+
+class SearchFeaturesTestCase(TestCase):
+    """Test precomputed ranking inputs for people search"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='seeker', password='testpass123').owner
+        self.client = Client()
+        self.client.login(username='seeker', password='testpass123')
+
+    def make_people(self, count):
+        start = User.objects.count()
+        people = [
+            User.objects.create_user(username=f'runner{i}', password='testpass123', first_name='Runner').owner
+            for i in range(start, start + count)
+        ]
+        for person in people:
+            Post.objects.create(owner=person, content='Morning run')
+            UserFollow.objects.create(follower=person, following=people[0], status='accepted')
+        return people
+
+    def search_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('find_friend'), {'q': 'runner'})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_posts_update_features_incrementally(self):
+        author = self.make_people(1)[0]
+        features = SearchFeatures.objects.get(owner=author)
+        self.assertEqual(features.recent_post_count, 1)
+        self.assertAlmostEqual(features.activity_score, 0.05)
+
+        Post.objects.create(owner=author, content='Second run')
+        features.refresh_from_db()
+        self.assertEqual(features.recent_post_count, 2)
+
+        # Deleting a post older than the window leaves the count alone
+        Post.objects.filter(content='Morning run').update(created_at=timezone.now() - timedelta(days=90))
+        Post.objects.filter(owner=author, content='Morning run').delete()
+        Post.objects.filter(owner=author, content='Second run').delete()
+        features.refresh_from_db()
+        self.assertEqual(features.recent_post_count, 1)
+        self.assertEqual(refresh_features([author.id])[author.id].recent_post_count, 0)
+
+    def test_search_costs_constant_queries(self):
+        self.make_people(2)
+        small, _ = self.search_queries()
+        self.make_people(12)
+        large, response = self.search_queries()
+        self.assertEqual(small, large)
+        top = response.context['results'][0]
+        self.assertEqual(top['recent_posts'], 1)
+
+    def test_stale_features_are_recounted(self):
+        author = self.make_people(1)[0]
+        SearchFeatures.objects.filter(owner=author).update(
+            recent_post_count=7, refreshed_at=timezone.now() - timedelta(days=2)
+        )
+        out = StringIO()
+        call_command('refresh_search_features', stdout=out)
+        self.assertEqual(SearchFeatures.objects.get(owner=author).recent_post_count, 1)
+
+
+class PeopleSuggestTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.viewer = User.objects.create_user(username='viewer', password='testpass123')
+        for username, first, last, followers in [
+            ('anna', 'Anna', 'Karim', 3),
+            ('annabel', 'Annabel', 'Lee', 10),
+            ('rahim', 'Rahim', 'Annan', 7),
+            ('bob', 'Bob', 'Stone', 50),
+        ]:
+            owner = User.objects.create_user(
+                username=username, password='testpass123', first_name=first, last_name=last
+            ).owner
+            Owner.objects.filter(pk=owner.pk).update(follower_count=followers)
+        self.index = get_suggest_index(rebuild=True)
+
+    def usernames(self, query, **kwargs):
+        return [entry['username'] for entry in self.index.lookup(query, **kwargs)]
+
+    def test_prefix_matches_usernames_and_name_words_by_followers(self):
+        self.assertEqual(self.usernames('ann'), ['annabel', 'rahim', 'anna'])
+        self.assertEqual(self.usernames('  RAHIM  ann'), ['rahim'])
+        self.assertEqual(self.usernames('annab'), ['annabel'])
+        self.assertEqual(self.usernames('zed'), [])
+        self.assertEqual(self.usernames(''), [])
+
+    def test_nodes_keep_only_the_best_entries(self):
+        rows = [
+            {'username': f'user{i}', 'name': '', 'followers': i, 'url': '', 'avatar': None}
+            for i in range(20)
+        ]
+        index = SuggestIndex(rows, limit=3)
+        self.assertEqual([entry['username'] for entry in index.lookup('user')], ['user19', 'user18', 'user17'])
+        self.assertEqual([entry['username'] for entry in index.lookup('user1', limit=2)], ['user19', 'user18'])
+
+    def test_suggest_endpoint_answers_without_queries(self):
+        self.client.login(username='viewer', password='testpass123')
+        self.client.get(reverse('find_friend_suggest'), {'q': 'a'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('find_friend_suggest'), {'q': 'vie'})
+        self.assertEqual(response.status_code, 200)
+        # The viewer is left out of their own suggestions
+        self.assertEqual(response.json()['results'], [])
+        # Only the session and user lookups of the auth middleware remain
+        self.assertFalse([q for q in queries.captured_queries if 'core_owner' in q['sql']])
+
+        results = self.client.get(reverse('find_friend_suggest'), {'q': 'Bo'}).json()['results']
+        self.assertEqual(results[0]['username'], 'bob')
+        self.assertEqual(results[0]['url'], reverse('profile_user', args=['bob']))
+
+
+class PostSearchTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.viewer = User.objects.create_user(username='viewer', password='testpass123').owner
+        self.author = User.objects.create_user(username='author', password='testpass123').owner
+        self.private = User.objects.create_user(username='private', password='testpass123').owner
+        Owner.objects.filter(pk=self.private.pk).update(is_private=True)
+
+    def titles(self, query, **kwargs):
+        posts, _ = search_posts(self.viewer, query, **kwargs)
+        return [post.title for post in posts]
+
+    def test_results_are_ranked_and_highlighted(self):
+        Post.objects.create(owner=self.author, title='Garden notes', content='Planted some tomatoes today')
+        Post.objects.create(owner=self.author, title='Tomatoes', content='Tomatoes, tomatoes and more tomatoes')
+        Post.objects.create(owner=self.author, title='Unrelated', content='Nothing to see here')
+
+        self.assertEqual(self.titles('tomatoes'), ['Tomatoes', 'Garden notes'])
+        # The last word also matches as a prefix, so results show up while typing
+        self.assertEqual(self.titles('plant'), ['Garden notes'])
+        self.assertEqual(self.titles('"tomato" OR'), [])
+
+        posts, _ = search_posts(self.viewer, 'garden <b>')
+        self.assertEqual(posts, [])
+        posts, _ = search_posts(self.viewer, 'planted')
+        self.assertIn('<mark>Planted</mark>', posts[0].search_snippet)
+
+    def test_snippets_escape_post_html(self):
+        Post.objects.create(owner=self.author, title='Markup', content='<script>alert(1)</script> hello')
+        posts, _ = search_posts(self.viewer, 'hello')
+        self.assertNotIn('<script>', posts[0].search_snippet)
+        self.assertIn('&lt;script&gt;', posts[0].search_snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(owner=self.author, title='Draft', content='Original words')
+        post.content = 'Rewritten entirely'
+        post.save()
+        self.assertEqual(self.titles('original'), [])
+        self.assertEqual(self.titles('rewritten'), ['Draft'])
+
+        post.delete()
+        self.assertEqual(self.titles('rewritten'), [])
+
+        Post.objects.create(owner=self.author, title='Again', content='Rebuilt index')
+        self.assertEqual(rebuild_post_index(), 1)
+        self.assertEqual(self.titles('rebuilt'), ['Again'])
+
+    def test_private_posts_need_an_accepted_follow(self):
+        Post.objects.create(owner=self.private, title='Secret', content='Hidden plans')
+        self.assertEqual(self.titles('plans'), [])
+
+        follow = UserFollow.objects.create(follower=self.viewer, following=self.private, status='pending')
+        self.assertEqual(self.titles('plans'), [])
+        follow.status = 'accepted'
+        follow.save()
+        self.assertEqual(self.titles('plans'), ['Secret'])
+
+        posts, _ = search_posts(self.private, 'plans')
+        self.assertEqual(len(posts), 1)
+
+    def test_pages_follow_the_rank_cursor(self):
+        for i in range(5):
+            Post.objects.create(owner=self.author, title=f'Run {i}', content='running ' * (i + 1))
+
+        seen = []
+        cursor = None
+        while True:
+            posts, cursor = search_posts(
+                self.viewer, 'running', after=decode_rank_cursor(cursor), limit=2
+            )
+            seen.extend(post.title for post in posts)
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.titles('running', limit=10))
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_search_views(self):
+        for i in range(12):
+            Post.objects.create(owner=self.author, title=f'Hike {i}', content='Mountain hike')
+        self.client.login(username='viewer', password='testpass123')
+
+        response = self.client.get(reverse('post_search'), {'q': 'mountain'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['posts']), 10)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+        page = self.client.get(
+            reverse('post_search_page'), {'q': 'mountain', 'cursor': response.context['next_cursor']}
+        ).json()
+        self.assertEqual(page['html'].count('View Post'), 2)
+        self.assertIsNone(page['next_cursor'])
+
+        bad = self.client.get(reverse('post_search_page'), {'q': 'mountain', 'cursor': 'nope'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_match_expression_quotes_terms(self):
+        self.assertEqual(match_expression('Hello, world'), '"hello" "world"*')
+        self.assertEqual(match_expression('  ?! '), '')
 
-# Create your tests here.
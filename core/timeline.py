@@ -0,0 +1,158 @@
+"""
+Hybrid push/pull home timeline for the Barta social media application.
+Posts by regular authors are pushed into the timeline of their author and
+accepted followers, so most of the home feed is a single indexed range read
+on (viewer, created_at). Posts by high-fanout authors are only pushed into
+the author's own timeline and are pulled at read time, then merged in.
+"""
+
+import heapq
+
+from django.conf import settings
+
+from .models import Owner, Post, TimelineEntry, UserFollow
+from .pagination import keyset_before
+
+
+# How many of an author's most recent posts are copied into a new follower's timeline
+TIMELINE_BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 100)
+
+# Follower count above which an author is pulled instead of fanned out
+FEED_FANOUT_THRESHOLD = getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+
+
+def fan_out_post(post):
+    """Push a freshly created post into its author's and followers' timelines"""
+    viewer_ids = [post.owner_id]
+    if not post.owner.is_high_fanout:
+        viewer_ids += UserFollow.objects.filter(
+            following_id=post.owner_id,
+            status='accepted'
+        ).values_list('follower_id', flat=True)
+
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                owner_id=viewer_id,
+                post=post,
+                author_id=post.owner_id,
+                created_at=post.created_at
+            )
+            for viewer_id in viewer_ids
+        ],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+def backfill_timeline(viewer, author, limit=TIMELINE_BACKFILL_LIMIT):
+    """Copy the author's most recent posts into the viewer's timeline"""
+    if author.is_high_fanout and author.id != viewer.id:
+        # Pulled at read time, nothing to materialize
+        return
+
+    recent_posts = Post.objects.filter(
+        owner=author
+    ).order_by('-created_at').values_list('id', 'created_at')[:limit]
+
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                owner=viewer,
+                post_id=post_id,
+                author=author,
+                created_at=created_at
+            )
+            for post_id, created_at in recent_posts
+        ],
+        ignore_conflicts=True
+    )
+
+
+def trim_timeline(viewer, author):
+    """Remove every post by the author from the viewer's timeline"""
+    TimelineEntry.objects.filter(owner=viewer, author=author).delete()
+
+
+def rebuild_timeline(viewer):
+    """Rebuild a viewer's timeline from scratch out of their accepted follows"""
+    TimelineEntry.objects.filter(owner=viewer).delete()
+    backfill_timeline(viewer, viewer)
+    followed = UserFollow.objects.filter(
+        follower=viewer,
+        status='accepted'
+    ).select_related('following')
+    for follow in followed:
+        backfill_timeline(viewer, follow.following)
+
+
+def set_fanout_mode(author, high_fanout):
+    """
+    Switch an author between push and pull delivery.
+    Promoting drops the author's posts from followers' timelines (they are
+    pulled from now on); demoting backfills them.
+    """
+    if author.is_high_fanout == high_fanout:
+        return False
+
+    author.is_high_fanout = high_fanout
+    author.save(update_fields=['is_high_fanout'])
+
+    if high_fanout:
+        TimelineEntry.objects.filter(author=author).exclude(owner=author).delete()
+    else:
+        followers = UserFollow.objects.filter(
+            following=author,
+            status='accepted'
+        ).select_related('follower')
+        for follow in followers:
+            backfill_timeline(follow.follower, author)
+    return True
+
+
+def get_timeline_posts(viewer, limit=10, before=None):
+    """
+    Return the viewer's newest timeline posts, newest first.
+    before is an optional (created_at, id) keyset position to page from.
+    """
+    entries = keyset_before(
+        TimelineEntry.objects.filter(owner=viewer),
+        before,
+        id_field='post_id'
+    ).select_related('post__owner__user').order_by('-created_at', '-post_id')[:limit]
+    pushed = [entry.post for entry in entries]
+
+    pulled_author_ids = list(
+        Owner.objects.filter(
+            is_high_fanout=True,
+            followers__follower=viewer,
+            followers__status='accepted'
+        ).exclude(id=viewer.id).values_list('id', flat=True)
+    )
+    if not pulled_author_ids:
+        return pushed
+
+    # One newest-first stream per pulled author, k-way merged with the pushed stream
+    pulled = keyset_before(
+        Post.objects.filter(owner_id__in=pulled_author_ids),
+        before
+    ).select_related('owner__user').order_by('-created_at', '-id')[:limit]
+    streams = {author_id: [] for author_id in pulled_author_ids}
+    for post in pulled:
+        streams[post.owner_id].append(post)
+
+    posts = []
+    seen_ids = set()
+    merged = heapq.merge(
+        pushed, *streams.values(),
+        key=lambda post: (post.created_at, post.id),
+        reverse=True
+    )
+    for post in merged:
+        if post.id in seen_ids:
+            continue
+        seen_ids.add(post.id)
+        posts.append(post)
+        if len(posts) == limit:
+            break
+    return posts
@@ -0,0 +1,27 @@
+"""
+Viewer-state loading for the Barta social media application.
+Resolves per-viewer state for a whole page of posts in one query, so card
+rendering cost does not depend on how many likes a post has.
+"""
+
+from .models import PostLike
+
+
+def annotate_viewer_reactions(posts, viewer):
+    """
+    Set post.viewer_reaction on every post to the viewer's reaction_type,
+    or None if the viewer has not reacted. Returns the posts for chaining.
+    """
+    posts = list(posts)
+    reactions = {}
+    if viewer is not None and posts:
+        reactions = dict(
+            PostLike.objects.filter(
+                owner=viewer,
+                post_id__in=[post.id for post in posts]
+            ).values_list('post_id', 'reaction_type')
+        )
+
+    for post in posts:
+        post.viewer_reaction = reactions.get(post.id)
+    return posts
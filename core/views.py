@@ -1,12 +1,29 @@
-from random import random
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db import models
-from django.utils import timezone
-from .models import Owner, Post, UserFollow, PostLike, PostComment, Notification, Message
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from .comments import decode_path_cursor, load_comment_page, load_reply_page
+from .conversations import load_inbox_page, load_message_page, mark_conversation_read
+from .counters import (
+    adjust_follow_counts, adjust_owner_posts, adjust_post_comments, adjust_unread_notifications,
+)
+from .events import unread_event
+from .media import normalize_name, serve_file
+from .models import Owner, Post, UserFollow, PostComment, Notification, Message, OutboxEvent
+from .pagination import FEED_PAGE_SIZE, decode_cursor, keyset_before, next_cursor
+from .people_search import search_people
+from .post_search import decode_rank_cursor, search_posts
+from .reaction_buffer import get_reaction_buffer
+from .reactions import ReactionConflict, apply_reaction, reaction_summary
+from .sse import SSE_FALLBACK_RETRY_MS, format_event
+from .suggest import get_suggest_index
+from .timeline import get_timeline_posts
+from .viewer import annotate_viewer_reactions
 
 @login_required
 def home(request):
@@ -14,23 +31,20 @@ def home(request):
     if request.user.is_authenticated:
         try:
             current_user_owner = request.user.owner
-            followed_user_ids = list(
-                UserFollow.objects.filter(
-                    follower=current_user_owner,
-                    status='accepted'
-                ).values_list('following_id', flat=True)
-            )
-
-            # include own posts in the feed
-            followed_user_ids.append(current_user_owner.id)
 
-            posts = Post.objects.filter(
-                owner_id__in=followed_user_ids
-            ).select_related('owner__user').order_by('-created_at')[:10]
+            # Read the materialized timeline (own posts + accepted follows)
+            posts = get_timeline_posts(current_user_owner, limit=FEED_PAGE_SIZE)
+            annotate_viewer_reactions(posts, current_user_owner)
 
             # Get suggested users (users not followed by current user)
+            followed_user_ids = UserFollow.objects.filter(
+                follower=current_user_owner,
+                status='accepted'
+            ).values('following_id')
             suggested_users = Owner.objects.exclude(
                 id__in=followed_user_ids
+            ).exclude(
+                id=current_user_owner.id
             )[:5]
         except Owner.DoesNotExist:
             current_user_owner = None
@@ -43,11 +57,36 @@ def home(request):
     
     context = {
         'posts': posts,
+        'next_cursor': next_cursor(posts, FEED_PAGE_SIZE),
         'current_user_owner': current_user_owner,
         'suggested_users': suggested_users,
     }
     return render(request, 'core/home.html', context)
 
+@login_required
+def home_feed_page(request):
+    """Return the next page of the home feed as an HTML fragment for infinite scroll"""
+    position = decode_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    try:
+        current_user_owner = request.user.owner
+    except Owner.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=404)
+
+    posts = get_timeline_posts(current_user_owner, limit=FEED_PAGE_SIZE, before=position)
+    annotate_viewer_reactions(posts, current_user_owner)
+    html = render_to_string('core/partials/feed_page.html', {
+        'posts': posts,
+        'current_user_owner': current_user_owner,
+    }, request=request)
+
+    return JsonResponse({
+        'html': html,
+        'next_cursor': next_cursor(posts, FEED_PAGE_SIZE),
+    })
+
 def signup_view(request):
     if request.user.is_authenticated:
         return redirect('home')
@@ -86,7 +125,11 @@ def signup_view(request):
             first_name=first_name,
             last_name=last_name
         )
-        owner = Owner.objects.create(user=user, bio=bio, profile_picture=profile_picture)
+        # The Owner row already exists (core.signals); fill in the profile fields
+        owner = user.owner
+        owner.bio = bio
+        owner.profile_picture = profile_picture
+        owner.save()
         
         login(request, user)
         messages.success(request, 'Account created successfully! Welcome to Barta 2.0!')
@@ -132,11 +175,11 @@ def profile_view(request, username=None):
         user = request.user
         
     owner = get_object_or_404(Owner, user=user)
-    posts = Post.objects.filter(owner=owner).order_by('-created_at')
-    
-    # Count followers and following with accepted status
-    followers = UserFollow.objects.filter(following=owner, status='accepted').count()
-    following = UserFollow.objects.filter(follower=owner, status='accepted').count()
+    owner_posts = Post.objects.filter(owner=owner)
+    posts = annotate_viewer_reactions(
+        owner_posts.order_by('-created_at', '-id')[:FEED_PAGE_SIZE],
+        getattr(request.user, 'owner', None)
+    )
     
     # Check if current user is following this profile
     is_following = False
@@ -157,9 +200,10 @@ def profile_view(request, username=None):
         'profile_user': user,
         'owner': owner,
         'posts': posts,
-        'post_count': posts.count(),
-        'followers_count': followers,
-        'following_count': following,
+        'next_cursor': next_cursor(posts, FEED_PAGE_SIZE),
+        'post_count': owner.post_count,
+        'followers_count': owner.follower_count,
+        'following_count': owner.following_count,
         'is_own_profile': user == request.user,
         'is_following': is_following,
         'follow_status': follow_status
@@ -167,6 +211,39 @@ def profile_view(request, username=None):
     
     return render(request, 'core/profile.html', context)
 
+@login_required
+def profile_posts_page(request, username):
+    """Return the next page of a profile's posts as an HTML fragment for infinite scroll"""
+    position = decode_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    owner = get_object_or_404(Owner.objects.select_related('user'), user__username=username)
+    is_own_profile = owner.user_id == request.user.id
+    if owner.is_private and not is_own_profile:
+        is_following = UserFollow.objects.filter(
+            follower__user=request.user,
+            following=owner,
+            status='accepted'
+        ).exists()
+        if not is_following:
+            return JsonResponse({'error': 'This account is private'}, status=403)
+
+    posts = annotate_viewer_reactions(
+        keyset_before(Post.objects.filter(owner=owner), position)
+        .order_by('-created_at', '-id')[:FEED_PAGE_SIZE],
+        getattr(request.user, 'owner', None)
+    )
+    html = render_to_string('core/partials/profile_page.html', {
+        'posts': posts,
+        'is_own_profile': is_own_profile,
+    }, request=request)
+
+    return JsonResponse({
+        'html': html,
+        'next_cursor': next_cursor(posts, FEED_PAGE_SIZE),
+    })
+
 @login_required
 def profile_edit(request):
     owner = get_object_or_404(Owner, user=request.user)
@@ -238,13 +315,15 @@ def create_post(request):
         if content and content.strip():
             try:
                 owner = request.user.owner
-                post = Post.objects.create(
-                    owner=owner,
-                    title=title.strip() if title else None,
-                    content=content.strip(),
-                    image=image,
-                    location=location.strip() if location else None
-                )
+                with transaction.atomic():
+                    post = Post.objects.create(
+                        owner=owner,
+                        title=title.strip() if title else None,
+                        content=content.strip(),
+                        image=image,
+                        location=location.strip() if location else None
+                    )
+                    adjust_owner_posts(owner.id, 1)
                 messages.success(request, 'Post created successfully!')
                 return redirect('home')
             except Owner.DoesNotExist:
@@ -257,32 +336,54 @@ def create_post(request):
             
     return render(request, 'core/create_post.html')
 
+def wants_json(request):
+    """True for fetch()/XHR callers that expect a JSON answer instead of a redirect"""
+    return (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest' or
+        'application/json' in request.headers.get('accept', '')
+    )
+
+def notify_new_reaction(owner, post, previous, reaction):
+    """Queue a notification for the post owner about a brand new reaction (not switches or removals)"""
+    if previous is None and reaction is not None:
+        OutboxEvent.notify(
+            post.owner_id, Notification.LIKE, actor_id=owner.id, target=post, related_post_id=post.id
+        )
+
+def record_reaction(owner, post, reaction_type, toggle=True):
+    """
+    Apply a reaction through the write buffer when it is enabled, inline otherwise.
+    Returns (new_reaction, counts) where counts already include buffered writes.
+    """
+    buffer = get_reaction_buffer()
+    if buffer is not None:
+        _, reaction = buffer.submit(owner, post, reaction_type, toggle=toggle)
+        return reaction, buffer.pending_summary(post.id, reaction_summary(post.id))
+    
+    with transaction.atomic():
+        previous, reaction = apply_reaction(owner, post, reaction_type, toggle=toggle)
+        notify_new_reaction(owner, post, previous, reaction)
+    return reaction, reaction_summary(post.id)
+
 @login_required
 def like_post(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     
     try:
         owner = request.user.owner
-        like, created = PostLike.objects.get_or_create(owner=owner, post=post)
-        
-        if not created:
-            # User already liked the post, so unlike it
-            like.delete()
-            liked = False
-        else:
-            liked = True
-            
-        # Create notification for post owner if someone else liked their post
-        if liked and post.owner != owner:
-            Notification.objects.create(
-                owner=post.owner,
-                content=f"{owner.user.username} liked your post",
-                related_post=post,
-                is_read=False
-            )
+        # Toggle a plain like; repeating it removes the reaction
+        reaction, counts = record_reaction(owner, post, 'like')
     except Owner.DoesNotExist:
         messages.error(request, 'User profile not found.')
         return redirect('home')
+    except ReactionConflict:
+        if wants_json(request):
+            return JsonResponse({'error': 'Please try again'}, status=409)
+        messages.error(request, 'Your reaction could not be saved. Please try again.')
+        return redirect('post_detail', post_id=post_id)
+    
+    if wants_json(request):
+        return JsonResponse({'reaction': reaction, **counts})
     
     # Get the referring page to redirect back to it
     referer = request.META.get('HTTP_REFERER')
@@ -291,51 +392,89 @@ def like_post(request, post_id):
     else:
         return redirect('home')
 
-
+@login_required
+def react_post(request, post_id):
+    """Set, switch or clear the viewer's reaction and return the new counts as JSON"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    
+    post = get_object_or_404(Post, id=post_id)
+    reaction_type = request.POST.get('reaction', 'like')
+    toggle = request.POST.get('toggle', '1') != '0'
+    if reaction_type in ('', 'none'):
+        reaction_type = None
+    
+    try:
+        owner = request.user.owner
+        reaction, counts = record_reaction(owner, post, reaction_type, toggle=toggle)
+    except Owner.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=404)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ReactionConflict:
+        return JsonResponse({'error': 'Please try again'}, status=409)
+    
+    return JsonResponse({'reaction': reaction, **counts})
 
 
 @login_required
 def post_detail(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     
-    # Get all comments for this post, including replies
-    all_comments = PostComment.objects.filter(
-        post=post
-    ).select_related('owner__user').prefetch_related('replies').order_by('created_at')
-    
-    # Separate top-level comments and replies
-    top_level_comments = all_comments.filter(parent_comment=None).order_by('-created_at')
-    
-    # Create a dictionary to organize comments with their replies
-    comments_with_replies = []
-    for comment in top_level_comments:
-        comment_data = {
-            'comment': comment,
-            'replies': comment.replies.all().order_by('created_at')
-        }
-        comments_with_replies.append(comment_data)
+    # First page of top-level comments, each with a preview of its replies
+    comments, comments_cursor = load_comment_page(post)
     
     try:
-        owner = request.user.owner
-        is_liked = PostLike.objects.filter(owner=owner, post=post).exists()
-        current_user_owner = owner
+        current_user_owner = request.user.owner
     except (Owner.DoesNotExist, AttributeError):
-        is_liked = False
         current_user_owner = None
+    annotate_viewer_reactions([post], current_user_owner)
     
     context = {
         'post': post,
-        'comments_with_replies': comments_with_replies,
-        'total_comments_count': all_comments.count(),
-        'is_liked': is_liked,
-        'likes_count': post.likes.count(),
+        'comments': comments,
+        'comments_cursor': comments_cursor,
+        'total_comments_count': post.comment_count,
+        'is_liked': post.viewer_reaction is not None,
+        'viewer_reaction': post.viewer_reaction,
+        'likes_count': post.like_count,
         'current_user_owner': current_user_owner,
     }
     
     return render(request, 'core/post_detail.html', context)
 
-# Keep the random import at the top (it's already there)
-# from random import random
+@login_required
+def comment_page(request, post_id):
+    """Return an older page of top-level comments as an HTML fragment"""
+    post = get_object_or_404(Post, id=post_id)
+    position = decode_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    comments, cursor = load_comment_page(post, before=position)
+    html = render_to_string('core/partials/comment_page.html', {
+        'post': post,
+        'comments': comments,
+    }, request=request)
+
+    return JsonResponse({'html': html, 'next_cursor': cursor})
+
+@login_required
+def reply_page(request, post_id, comment_id):
+    """Return the next page of a top-level comment's thread as an HTML fragment"""
+    comment = get_object_or_404(PostComment, id=comment_id, post_id=post_id, parent_comment=None)
+    position = decode_path_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    replies, cursor = load_reply_page(comment, after=position)
+    html = render_to_string('core/partials/reply_page.html', {
+        'post': comment.post,
+        'replies': replies,
+    }, request=request)
+
+    return JsonResponse({'html': html, 'next_cursor': cursor})
+
 
 # Fix the comment_post function - just complete the line with None for top-level comments
 @login_required
@@ -349,20 +488,20 @@ def comment_post(request, post_id):
             try:
                 owner = request.user.owner                
                                
-                comment = PostComment.objects.create(
-                    owner=owner,
-                    post=post,
-                    content=content.strip(),
-                    parent_comment=None  # Always None for top-level comments
-                )
-                
-                # Regular comment notification - notify post owner only
-                if post.owner != owner:
-                    Notification.objects.create(
-                        owner=post.owner,
-                        content=f"{owner.user.username} commented on your post",
-                        related_post=post,
-                        is_read=False
+                with transaction.atomic():
+                    comment = PostComment.objects.create(
+                        owner=owner,
+                        post=post,
+                        content=content.strip(),
+                        parent_comment=None  # Always None for top-level comments
+                    )
+                    adjust_post_comments(post.id, 1)
+                    
+                    # Regular comment notification - notify post owner only; keyed on the
+                    # post so comments from several people fold into one row
+                    OutboxEvent.notify(
+                        post.owner_id, Notification.COMMENT, actor_id=owner.id, target=post,
+                        related_post_id=post.id
                     )
                 
                 messages.success(request, 'Comment added successfully!')
@@ -380,34 +519,36 @@ def reply_comment(request, post_id, comment_id):
     post = get_object_or_404(Post, id=post_id)
     parent_comment = get_object_or_404(PostComment, id=comment_id, post=post)
     
+    # Past the deepest level, keep the conversation going as a sibling reply
+    if parent_comment.depth >= PostComment.MAX_DEPTH:
+        parent_comment = parent_comment.parent_comment
+    
     if request.method == 'POST':
         content = request.POST.get('content')
         
         if content and content.strip():
             try:
                 owner = request.user.owner
-                reply = PostComment.objects.create(
-                    owner=owner,
-                    post=post,
-                    content=content.strip(),
-                    parent_comment=parent_comment
-                )
-                
-                # Create notifications
-                if parent_comment.owner != owner:
-                    Notification.objects.create(
-                        owner=parent_comment.owner,
-                        content=f"{owner.user.username} replied to your comment",
-                        related_post=post,
-                        is_read=False
+                with transaction.atomic():
+                    reply = PostComment.objects.create(
+                        owner=owner,
+                        post=post,
+                        content=content.strip(),
+                        parent_comment=parent_comment
                     )
-                if post.owner != owner and post.owner != parent_comment.owner:
-                    Notification.objects.create(
-                        owner=post.owner,
-                        content=f"{owner.user.username} replied to a comment on your post",
-                        related_post=post,
-                        is_read=False
+                    adjust_post_comments(post.id, 1)
+                    
+                    # Queue notifications for the parent comment's and the post's owners
+                    OutboxEvent.notify(
+                        parent_comment.owner_id, Notification.REPLY, actor_id=owner.id, target=reply,
+                        related_post_id=post.id
                     )
+                    if post.owner_id != parent_comment.owner_id:
+                        OutboxEvent.notify(
+                            post.owner_id, Notification.REPLY, actor_id=owner.id, target=reply,
+                            related_post_id=post.id,
+                            content=f"{request.user.username} replied to a comment on your post"
+                        )
                 
                 messages.success(request, 'Reply added successfully!')
             except Owner.DoesNotExist:
@@ -451,7 +592,9 @@ def delete_post(request, post_id):
     if request.method == 'POST':
         # Get the username for redirect
         username = post.owner.user.username
-        post.delete()
+        with transaction.atomic():
+            post.delete()
+            adjust_owner_posts(post.owner_id, -1)
         messages.success(request, 'Post deleted successfully!')
         
         # Check if request came from profile page
@@ -478,24 +621,26 @@ def follow_user(request, username):
         following = get_object_or_404(Owner, user=user_to_follow)
         follower = get_object_or_404(Owner, user=current_user)
         
-        follow, created = UserFollow.objects.get_or_create(
-            follower=follower,
-            following=following
-        )
+        with transaction.atomic():
+            follow, created = UserFollow.objects.get_or_create(
+                follower=follower,
+                following=following
+            )
+            
+            if not created:
+                # User is already following, so unfollow
+                follow.delete()
+                if follow.is_accepted:
+                    adjust_follow_counts(follower.id, following.id, -1)
+            else:
+                if follow.is_accepted:
+                    adjust_follow_counts(follower.id, following.id, 1)
+                OutboxEvent.notify(following.id, Notification.FOLLOW, actor_id=follower.id, target=follow)
         
         if not created:
-            # User is already following, so unfollow
-            follow.delete()
             messages.success(request, f"You have unfollowed {user_to_follow.first_name} {user_to_follow.last_name}.")
         else:
             messages.success(request, f"You are now following {user_to_follow.first_name} {user_to_follow.last_name}.")
-            
-            # Create notification
-            Notification.objects.create(
-                owner=following,
-                content=f"{current_user.username} started following you",
-                is_read=False
-            )
     except Owner.DoesNotExist:
         messages.error(request, 'User profile not found')
     
@@ -528,15 +673,13 @@ def remove_follower(request, username):
         ).first()
         
         if follow:
-            follow.delete()
+            with transaction.atomic():
+                follow.delete()
+                adjust_follow_counts(follower_owner.id, current_user_owner.id, -1)
+                OutboxEvent.notify(
+                    follower_owner.id, Notification.FOLLOWER_REMOVED, actor_id=current_user_owner.id
+                )
             messages.success(request, f"You have removed {follower_user.first_name} {follower_user.last_name} from your followers.")
-            
-            # Optional: Create notification for the removed follower
-            Notification.objects.create(
-                owner=follower_owner,
-                content=f"{current_user.username} removed you from their followers",
-                is_read=False
-            )
         else:
             messages.error(request, f"{follower_user.first_name} {follower_user.last_name} is not following you.")
     
@@ -599,49 +742,12 @@ def inbox_view(request):
     try:
         user_owner = request.user.owner
         
-        # Get unique users who have conversations with the current user
-        conversations = Message.objects.filter(
-            sender=user_owner
-        ).values_list('receiver_id', flat=True).distinct()
-        
-        received_conversations = Message.objects.filter(
-            receiver=user_owner
-        ).values_list('sender_id', flat=True).distinct()
-        
-        # Combine and remove duplicates
-        all_conversation_ids = set(list(conversations) + list(received_conversations))
-        
-        # Get those users' profiles
-        conversation_partners = Owner.objects.filter(id__in=all_conversation_ids).select_related('user')
-        
-        # For each conversation partner, get their most recent message
-        partners_with_last_message = []
-        for partner in conversation_partners:
-            last_message = Message.objects.filter(
-                (models.Q(sender=user_owner) & models.Q(receiver=partner)) | 
-                (models.Q(sender=partner) & models.Q(receiver=user_owner))
-            ).order_by('-created_at').first()
-            
-            unread_count = Message.objects.filter(
-                sender=partner, 
-                receiver=user_owner, 
-                is_read=False
-            ).count()
-            
-            partners_with_last_message.append({
-                'partner': partner,
-                'last_message': last_message,
-                'unread_count': unread_count
-            })
-        
-        # Sort by the most recent message
-        partners_with_last_message.sort(
-            key=lambda x: x['last_message'].created_at if x['last_message'] else timezone.now(), 
-            reverse=True
-        )
+        # One indexed query: the owner's conversations, latest activity first
+        conversations, conversations_cursor = load_inbox_page(user_owner)
         
         context = {
-            'conversations': partners_with_last_message
+            'conversations': conversations,
+            'next_cursor': conversations_cursor,
         }
         
         return render(request, 'core/inbox.html', context)
@@ -649,6 +755,28 @@ def inbox_view(request):
         messages.error(request, 'User profile not found')
         return redirect('home')
 
+@login_required
+def inbox_page(request):
+    """Return the next page of the inbox as an HTML fragment for infinite scroll"""
+    position = decode_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    try:
+        user_owner = request.user.owner
+    except Owner.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=404)
+    
+    conversations, conversations_cursor = load_inbox_page(user_owner, before=position)
+    html = render_to_string('core/partials/inbox_page.html', {
+        'conversations': conversations,
+    }, request=request)
+    
+    return JsonResponse({
+        'html': html,
+        'next_cursor': conversations_cursor,
+    })
+
 
 @login_required
 def find_friend(request):
@@ -661,173 +789,24 @@ def find_friend(request):
         try:
             current_user_owner = request.user.owner
             
-            # Get all potential users (excluding current user and already followed)
-            followed_ids = UserFollow.objects.filter(
-                follower=current_user_owner
-            ).values_list('following_id', flat=True)
-            
-            potential_users = Owner.objects.exclude(
-                id__in=followed_ids
-            ).exclude(
-                id=current_user_owner.id
-            ).select_related('user')
+            # Candidates come from the trigram index; only they are fuzzy-scored
+            scored_users = search_people(current_user_owner, query)
             
-            # Fuzzy matching algorithm
-            def calculate_fuzzy_score(person, query):
-                """Calculate fuzzy matching score based on multiple criteria"""
-                score = 0.0
-                query_lower = query.lower()
-                
-                # Name matching (40% weight)
-                full_name = f"{person.user.first_name} {person.user.last_name}".lower()
-                username = person.user.username.lower()
-                
-                # Exact name match gets highest score
-                if query_lower in full_name:
-                    score += 0.4 * (len(query_lower) / len(full_name))
-                
-                # Username match
-                if query_lower in username:
-                    score += 0.3 * (len(query_lower) / len(username))
-                
-                # Fuzzy string matching for names
-                def fuzzy_string_match(text, pattern):
-                    """Simple fuzzy string matching algorithm"""
-                    if not pattern or not text:
-                        return 0.0
-                    
-                    # Character frequency matching
-                    pattern_chars = set(pattern.lower())
-                    text_chars = set(text.lower())
-                    common_chars = len(pattern_chars.intersection(text_chars))
-                    char_similarity = common_chars / max(len(pattern_chars), len(text_chars))
-                    
-                    # Subsequence matching
-                    subseq_score = 0.0
-                    pattern_idx = 0
-                    for char in text.lower():
-                        if pattern_idx < len(pattern) and char == pattern[pattern_idx]:
-                            pattern_idx += 1
-                    subseq_score = pattern_idx / len(pattern)
-                    
-                    # Levenshtein-like distance (simplified)
-                    def edit_distance(s1, s2):
-                        if len(s1) < len(s2):
-                            return edit_distance(s2, s1)
-                        if len(s2) == 0:
-                            return len(s1)
-                        
-                        previous_row = list(range(len(s2) + 1))
-                        for i, c1 in enumerate(s1):
-                            current_row = [i + 1]
-                            for j, c2 in enumerate(s2):
-                                insertions = previous_row[j + 1] + 1
-                                deletions = current_row[j] + 1
-                                substitutions = previous_row[j] + (c1 != c2)
-                                current_row.append(min(insertions, deletions, substitutions))
-                            previous_row = current_row
-                        
-                        return previous_row[-1]
-                    
-                    edit_dist = edit_distance(text.lower(), pattern.lower())
-                    max_len = max(len(text), len(pattern))
-                    edit_similarity = 1 - (edit_dist / max_len) if max_len > 0 else 0
-                    
-                    # Combine all similarity measures
-                    return (char_similarity * 0.3 + subseq_score * 0.4 + edit_similarity * 0.3)
-                
-                # Apply fuzzy matching to full name
-                name_fuzzy = fuzzy_string_match(full_name, query_lower)
-                score += 0.2 * name_fuzzy
-                
-                # Apply fuzzy matching to username
-                username_fuzzy = fuzzy_string_match(username, query_lower)
-                score += 0.1 * username_fuzzy
-                
-                # Location matching (10% weight)
-                if person.location:
-                    location_lower = person.location.lower()
-                    if query_lower in location_lower:
-                        score += 0.1 * (len(query_lower) / len(location_lower))
-                
-                # Bio matching (15% weight)
-                if person.bio:
-                    bio_lower = person.bio.lower()
-                    if query_lower in bio_lower:
-                        score += 0.15 * (len(query_lower) / len(bio_lower))
-                    
-                    # Fuzzy bio matching
-                    bio_fuzzy = fuzzy_string_match(bio_lower, query_lower)
-                    score += 0.05 * bio_fuzzy
-                
-                # Social connection boost (15% weight)
-                # Users with more followers/following get slight boost
-                follower_count = UserFollow.objects.filter(following=person).count()
-                following_count = UserFollow.objects.filter(follower=person).count()
-                social_score = min((follower_count + following_count) / 100, 1.0)  # Cap at 1.0
-                score += 0.15 * social_score
-                
-                # Mutual connections boost (10% weight)
-                current_user_following = set(UserFollow.objects.filter(
-                    follower=current_user_owner
-                ).values_list('following_id', flat=True))
-                
-                person_followers = set(UserFollow.objects.filter(
-                    following=person
-                ).values_list('follower_id', flat=True))
-                
-                mutual_connections = len(current_user_following.intersection(person_followers))
-                mutual_score = min(mutual_connections / 10, 1.0)  # Cap at 1.0
-                score += 0.1 * mutual_score
-                
-                # Recent activity boost (5% weight)
-                # Users with recent posts get slight boost
-                recent_posts = Post.objects.filter(
-                    owner=person,
-                    created_at__gte=timezone.now() - timezone.timedelta(days=30)
-                ).count()
-                activity_score = min(recent_posts / 20, 1.0)  # Cap at 1.0
-                score += 0.05 * activity_score
-                
-                return min(score, 1.0)  # Cap total score at 1.0
-            
-            # Calculate scores for all potential users
-            scored_users = []
-            for person in potential_users:
-                score = calculate_fuzzy_score(person, query)
-                if score > 0.1:  # Only include users with meaningful similarity
-                    scored_users.append((person, score))
-            
-            # Sort by score (descending) and get top 5
-            scored_users.sort(key=lambda x: x[1], reverse=True)
+            # Already sorted by score (descending); keep the top 5
             top_5_results = scored_users[:5]
             
-            # Prepare results with additional info
-            results = []
-            for person, score in top_5_results:
-                # Get mutual connections count
-                current_user_following = set(UserFollow.objects.filter(
-                    follower=current_user_owner
-                ).values_list('following_id', flat=True))
-                person_followers = set(UserFollow.objects.filter(
-                    following=person
-                ).values_list('follower_id', flat=True))
-                mutual_count = len(current_user_following.intersection(person_followers))
-                
-                # Get recent activity
-                recent_posts_count = Post.objects.filter(
-                    owner=person,
-                    created_at__gte=timezone.now() - timezone.timedelta(days=30)
-                ).count()
-                
-                results.append({
+            # Prepare results with additional info, all precomputed by search_people
+            results = [
+                {
                     'person': person,
                     'score': round(score * 100, 1),  # Convert to percentage
-                    'mutual_connections': mutual_count,
-                    'recent_posts': recent_posts_count,
-                    'followers_count': UserFollow.objects.filter(following=person).count(),
-                    'following_count': UserFollow.objects.filter(follower=person).count(),
-                })
+                    'mutual_connections': person.mutual_count,
+                    'recent_posts': person.recent_post_count,
+                    'followers_count': person.follower_count,
+                    'following_count': person.following_count,
+                }
+                for person, score in top_5_results
+            ]
             
             context = {
                 'results': results,
@@ -847,6 +826,51 @@ def find_friend(request):
     return render(request, 'core/find_friend.html', {'results': [], 'query': ''})
 
 
+@login_required
+def post_search(request):
+    """Full-text search over the posts the user may see, best match first"""
+    query = request.GET.get('q', '').strip()
+    try:
+        current_user_owner = request.user.owner
+    except Owner.DoesNotExist:
+        messages.error(request, 'User profile not found')
+        return redirect('home')
+    
+    posts, results_cursor = search_posts(current_user_owner, query) if query else ([], None)
+    return render(request, 'core/post_search.html', {
+        'query': query,
+        'posts': posts,
+        'next_cursor': results_cursor,
+    })
+
+@login_required
+def post_search_page(request):
+    """Return the next page of post search results as an HTML fragment"""
+    position = decode_rank_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    try:
+        current_user_owner = request.user.owner
+    except Owner.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=404)
+    
+    posts, results_cursor = search_posts(current_user_owner, request.GET.get('q', ''), after=position)
+    html = render_to_string('core/partials/post_search_page.html', {'posts': posts}, request=request)
+    
+    return JsonResponse({
+        'html': html,
+        'next_cursor': results_cursor,
+    })
+
+
+@login_required
+def find_friend_suggest(request):
+    """Typeahead for find_friend: people whose names start with q, from the in-memory trie"""
+    query = request.GET.get('q', '')
+    suggestions = get_suggest_index().lookup(query, exclude_username=request.user.username)
+    return JsonResponse({'query': query, 'results': suggestions})
+
 
 @login_required
 def conversation_view(request, username):
@@ -856,19 +880,11 @@ def conversation_view(request, username):
         partner_user = get_object_or_404(User, username=username)
         partner_owner = get_object_or_404(Owner, user=partner_user)
         
-        # Get all messages between these users
-        conversation_messages = Message.objects.filter(
-            (models.Q(sender=user_owner) & models.Q(receiver=partner_owner)) | 
-            (models.Q(sender=partner_owner) & models.Q(receiver=user_owner))
-        ).order_by('created_at')
+        # Only the latest page is rendered; older history is fetched by cursor
+        conversation_messages, messages_cursor = load_message_page(user_owner, partner_owner)
         
-        # Mark all received messages as read
-        unread_messages = Message.objects.filter(
-            sender=partner_owner, 
-            receiver=user_owner, 
-            is_read=False
-        )
-        unread_messages.update(is_read=True, read_at=timezone.now())
+        # Mark all received messages as read by moving the read watermark
+        mark_conversation_read(user_owner.id, partner_owner.id)
         
         if request.method == 'POST':
             content = request.POST.get('content', '').strip()
@@ -915,23 +931,23 @@ def conversation_view(request, username):
             
             try:
                 # Create message with content and/or attachment
-                message = Message.objects.create(
-                    sender=user_owner,
-                    receiver=partner_owner,
-                    content=content if content else '',  # Allow empty content if there's an attachment
-                    attachment=attachment
-                )
-                
-                # Create notification for the receiver
-                notification_content = f"{user_owner.user.first_name} {user_owner.user.last_name} sent you a message"
+                notification_content = f"{request.user.first_name} {request.user.last_name} sent you a message"
                 if attachment:
                     notification_content += f" with attachment: {attachment.name}"
                 
-                Notification.objects.create(
-                    owner=partner_owner,
-                    content=notification_content,
-                    is_read=False
-                )
+                with transaction.atomic():
+                    message = Message.objects.create(
+                        sender=user_owner,
+                        receiver=partner_owner,
+                        content=content if content else '',  # Allow empty content if there's an attachment
+                        attachment=attachment
+                    )
+                    
+                    # Queue a notification for the receiver
+                    OutboxEvent.notify(
+                        partner_owner.id, Notification.MESSAGE, actor_id=user_owner.id, target=message,
+                        content=notification_content
+                    )
                 
                 messages.success(request, 'Message sent successfully!')
                 return redirect('conversation', username=username)
@@ -944,6 +960,7 @@ def conversation_view(request, username):
         context = {
             'partner': partner_owner,
             'messages': conversation_messages,
+            'messages_cursor': messages_cursor,
             'current_user_owner': user_owner,
         }
         
@@ -952,6 +969,30 @@ def conversation_view(request, username):
         messages.error(request, 'User profile not found')
         return redirect('home')
 
+@login_required
+def conversation_page(request, username):
+    """Return an older page of a conversation as an HTML fragment, oldest message first"""
+    position = decode_cursor(request.GET.get('cursor'))
+    if position is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    try:
+        user_owner = request.user.owner
+    except Owner.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=404)
+    partner_owner = get_object_or_404(Owner, user__username=username)
+    
+    conversation_messages, messages_cursor = load_message_page(user_owner, partner_owner, before=position)
+    html = render_to_string('core/partials/message_page.html', {
+        'messages': conversation_messages,
+        'current_user_owner': user_owner,
+    }, request=request)
+    
+    return JsonResponse({
+        'html': html,
+        'next_cursor': messages_cursor,
+    })
+
 @login_required
 def start_chat_view(request, username):
     """View to start a new chat with another user"""
@@ -996,6 +1037,14 @@ def start_chat_view(request, username):
         messages.error(request, f"Error starting conversation: {str(e)}")
         return redirect('profile_user', username=username)
 
+# Notification verbs shown under each filter tab
+NOTIFICATION_TABS = {
+    'likes': [Notification.LIKE],
+    'comments': [Notification.COMMENT, Notification.REPLY],
+    'follows': [Notification.FOLLOW],
+    'messages': [Notification.MESSAGE],
+}
+
 @login_required
 def notifications_view(request):
     """View to display user's notifications with filtering options"""
@@ -1004,17 +1053,15 @@ def notifications_view(request):
         filter_type = request.GET.get('filter', '')
         
         # Base queryset
-        notifications = Notification.objects.filter(owner=user_owner).order_by('-created_at')
+        notifications = Notification.objects.filter(owner=user_owner).select_related(
+            'actor__user', 'related_post'
+        ).order_by('-created_at')
         
-        # Apply filters
+        # Apply filters; each tab is a range of the (owner, verb, is_read, created_at) index
         if filter_type == 'unread':
             notifications = notifications.filter(is_read=False)
-        elif filter_type == 'likes':
-            notifications = notifications.filter(content__icontains='liked')
-        elif filter_type == 'comments':
-            notifications = notifications.filter(content__icontains='comment')
-        elif filter_type == 'follows':
-            notifications = notifications.filter(content__icontains='following')
+        elif filter_type in NOTIFICATION_TABS:
+            notifications = notifications.filter(verb__in=NOTIFICATION_TABS[filter_type])
         
         # Get counts for tabs
         total_count = Notification.objects.filter(owner=user_owner).count()
@@ -1037,13 +1084,15 @@ def mark_notification_read(request, notification_id):
     """Mark a specific notification as read"""
     if request.method == 'POST':
         try:
+            owner = request.user.owner
             notification = get_object_or_404(
                 Notification, 
                 id=notification_id, 
-                owner=request.user.owner
+                owner=owner
             )
-            notification.is_read = True
-            notification.save()
+            with transaction.atomic():
+                if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+                    adjust_unread_notifications(owner.id, -1)
             messages.success(request, 'Notification marked as read')
         except Notification.DoesNotExist:
             messages.error(request, 'Notification not found')
@@ -1056,10 +1105,12 @@ def mark_all_notifications_read(request):
     if request.method == 'POST':
         try:
             user_owner = request.user.owner
-            updated_count = Notification.objects.filter(
-                owner=user_owner, 
-                is_read=False
-            ).update(is_read=True)
+            with transaction.atomic():
+                updated_count = Notification.objects.filter(
+                    owner=user_owner, 
+                    is_read=False
+                ).update(is_read=True)
+                adjust_unread_notifications(user_owner.id, -updated_count)
             
             if updated_count > 0:
                 messages.success(request, f'Marked {updated_count} notifications as read')
@@ -1070,6 +1121,23 @@ def mark_all_notifications_read(request):
     
     return redirect('notifications')
 
+@login_required
+def event_stream(request):
+    """
+    Fallback for the live event stream when served over WSGI.
+    Under ASGI this path is answered by core.sse; here the client gets the
+    current unread counts and is told to reconnect later, i.e. slow polling.
+    """
+    try:
+        owner = request.user.owner
+    except Owner.DoesNotExist:
+        return HttpResponse(status=403)
+    
+    body = f"retry: {SSE_FALLBACK_RETRY_MS}\n\n".encode() + format_event('unread', unread_event(owner.id))
+    response = HttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 @login_required
 def friends_view(request):
     """View to display friends, followers, following, and suggestions"""
@@ -1135,15 +1203,11 @@ def friends_view(request):
                     search_query.lower() in person.user.username.lower())
             ]
         
-        # Get counts for tabs
-        following_count = UserFollow.objects.filter(follower=user_owner).count()
-        followers_count = UserFollow.objects.filter(following=user_owner).count()
-        
         context = {
             'people': people,
             'tab': tab,
-            'following_count': following_count,
-            'followers_count': followers_count,
+            'following_count': user_owner.following_count,
+            'followers_count': user_owner.follower_count,
             'search_query': search_query,
         }
         
@@ -1152,3 +1216,18 @@ def friends_view(request):
         messages.error(request, 'User profile not found')
         return redirect('home')
 
+def serve_media(request, path):
+    """Serve an uploaded file with Range, ETag and cache support"""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=405)
+    
+    name = normalize_name(path)
+    # Message attachments are only served to the two people in the conversation
+    if name.startswith(Message._meta.get_field('attachment').upload_to):
+        allowed = request.user.is_authenticated and Message.objects.filter(
+            Q(sender__user=request.user) | Q(receiver__user=request.user), attachment=name
+        ).exists()
+        if not allowed:
+            raise Http404('Media file not found')
+        return serve_file(request, name, private=True)
+    return serve_file(request, name)
@@ -53,7 +53,11 @@ document.addEventListener('DOMContentLoaded', function() {
     // Add loading state to buttons on form submission
     const submitButtons = document.querySelectorAll('button[type="submit"]');
     submitButtons.forEach(button => {
-        button.closest('form').addEventListener('submit', function() {
+        const form = button.closest('form');
+        if (!form || form.hasAttribute('data-reaction-form')) {
+            return;
+        }
+        form.addEventListener('submit', function() {
             button.disabled = true;
             button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Processing...';
         });
@@ -178,6 +182,183 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log('Searching for:', query);
     }
 
+    // Typeahead: inputs with data-suggest-url list matching people while the user types
+    document.querySelectorAll('[data-suggest-url]').forEach(input => {
+        const list = document.querySelector(input.dataset.suggestList);
+        let latest = 0;
+
+        const suggest = debounce(function() {
+            const query = input.value.trim();
+            const request = ++latest;
+            if (!query) {
+                list.classList.add('d-none');
+                return;
+            }
+            fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(query), {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                credentials: 'same-origin'
+            })
+                .then(response => response.json())
+                .then(data => {
+                    // Answers to older keystrokes may arrive late
+                    if (request !== latest) {
+                        return;
+                    }
+                    list.replaceChildren(...data.results.map(person => {
+                        const item = document.createElement('a');
+                        item.href = person.url;
+                        item.className = 'list-group-item list-group-item-action';
+                        item.textContent = (person.name || person.username) + ' @' + person.username;
+                        return item;
+                    }));
+                    list.classList.toggle('d-none', data.results.length === 0);
+                });
+        }, 100);
+
+        input.addEventListener('input', suggest);
+        input.addEventListener('blur', () => setTimeout(() => list.classList.add('d-none'), 200));
+    });
+
+    // Infinite scroll: sentinels carry the page endpoint, the keyset cursor and the container to append to
+    const scrollSentinels = document.querySelectorAll('[data-infinite-scroll]');
+    scrollSentinels.forEach(sentinel => {
+        const target = document.querySelector(sentinel.dataset.target);
+        let loading = false;
+
+        const pageObserver = new IntersectionObserver(function(entries) {
+            if (!entries[0].isIntersecting || loading || !sentinel.dataset.cursor) {
+                return;
+            }
+            loading = true;
+
+            // Search pages carry their query in data-url already
+            const separator = sentinel.dataset.url.includes('?') ? '&' : '?';
+            const url = sentinel.dataset.url + separator + 'cursor=' + encodeURIComponent(sentinel.dataset.cursor);
+            fetch(url, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                credentials: 'same-origin'
+            })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.html) {
+                        target.insertAdjacentHTML('beforeend', data.html);
+                    }
+                    if (data.next_cursor) {
+                        sentinel.dataset.cursor = data.next_cursor;
+                    } else {
+                        pageObserver.disconnect();
+                        sentinel.remove();
+                    }
+                })
+                .catch(() => showToast('Could not load more posts', 'error'))
+                .finally(() => {
+                    loading = false;
+                });
+        }, { rootMargin: '0px 0px 400px 0px' });
+
+        pageObserver.observe(sentinel);
+    });
+
+    // "Load more" buttons page through the same cursor endpoints on click (e.g. comment replies)
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('[data-load-more]');
+        if (!button || button.disabled) {
+            return;
+        }
+        e.preventDefault();
+        button.disabled = true;
+
+        const target = document.querySelector(button.dataset.target);
+        const url = button.dataset.url + '?cursor=' + encodeURIComponent(button.dataset.cursor);
+        fetch(url, {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            credentials: 'same-origin'
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.html) {
+                    // Older chat history goes above what is already shown
+                    target.insertAdjacentHTML(button.dataset.insert || 'beforeend', data.html);
+                    target.classList.remove('d-none');
+                }
+                if (data.next_cursor) {
+                    button.dataset.cursor = data.next_cursor;
+                    button.disabled = false;
+                } else {
+                    button.remove();
+                }
+            })
+            .catch(() => {
+                button.disabled = false;
+                showToast('Could not load more', 'error');
+            });
+    });
+
+    // Reactions are sent in the background and the counts are patched in place
+    document.addEventListener('submit', function(e) {
+        const form = e.target.closest('[data-reaction-form]');
+        if (!form) {
+            return;
+        }
+        e.preventDefault();
+
+        const button = form.querySelector('button[type="submit"]');
+        button.disabled = true;
+        fetch(form.dataset.url, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            credentials: 'same-origin'
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    showToast(data.error, 'error');
+                    return;
+                }
+                document.querySelectorAll('[data-like-count="' + form.dataset.postId + '"]').forEach(el => {
+                    el.textContent = data.like_count;
+                });
+                const label = form.querySelector('[data-reaction-label]');
+                if (label) {
+                    label.textContent = data.reaction ? 'Unlike' : 'Like';
+                }
+                button.classList.toggle('liked', Boolean(data.reaction));
+            })
+            .catch(() => showToast('Could not update reaction', 'error'))
+            .finally(() => {
+                button.disabled = false;
+            });
+    });
+
+    // Live updates: unread badges, new notifications and messages over Server-Sent Events
+    const streamUrl = document.body.dataset.eventStream;
+    if (streamUrl && window.EventSource) {
+        const stream = new EventSource(streamUrl);
+
+        function setBadge(id, count) {
+            const badge = document.getElementById(id);
+            if (!badge || count === undefined) {
+                return;
+            }
+            badge.textContent = count;
+            badge.classList.toggle('d-none', !(count > 0));
+        }
+
+        stream.addEventListener('unread', function(e) {
+            const data = JSON.parse(e.data);
+            setBadge('message-count', data.unread_message_count);
+            setBadge('notification-count', data.unread_notification_count);
+        });
+        stream.addEventListener('notification', function(e) {
+            showToast(JSON.parse(e.data).content, 'info');
+        });
+        stream.addEventListener('message', function(e) {
+            const data = JSON.parse(e.data);
+            showToast('New message from ' + data.sender, 'info');
+        });
+    }
+
     // Make functions globally available
     window.copyToClipboard = copyToClipboard;
     window.showToast = showToast;